@@ -0,0 +1,190 @@
+# --- START OF FILE benchmarks/bench_archindex.py ---
+"""
+Micro-benchmark cho các bước xử lý trong components/archindex.py.
+
+So sánh bản duyệt từng pixel cũ với bản vector hóa trên các file CSV mẫu trong data/
+và trên một chồng N ma trận (N,H,W). Trước khi đo, script kiểm tra hai bản cho kết quả
+giống hệt nhau.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.bench_archindex
+    python -m benchmarks.bench_archindex --batch 500 --repeat 5
+"""
+
+import argparse
+import glob
+import os
+import timeit
+
+import numpy as np
+
+from components import archindex, sensor_geometry
+
+DATA_DIR = "data"
+
+
+def load_samples(raw: bool = False) -> list[np.ndarray]:
+    """Đọc các ma trận 60x60 mẫu trong data/ (raw=False: chuyển sang thang 0-255)."""
+    samples = []
+    for path in sorted(glob.glob(os.path.join(DATA_DIR, "*.csv"))):
+        if os.path.basename(path).startswith("foot_shape_data_"):
+            continue # bản xuất dạng bảng (x, y, giá trị), không phải ma trận
+        matrix = archindex.load_csv_data(path)
+        if matrix is None or matrix.shape != (60, 60):
+            continue
+        samples.append(matrix if raw else archindex.convert_values(matrix, input_max=5.0))
+    if not samples:
+        # Không có dữ liệu mẫu -> tạo dữ liệu giả để vẫn đo được
+        rng = np.random.default_rng(0)
+        fake = (rng.random((60, 60)) < 0.4) * rng.random((60, 60)) * 5.0
+        samples.append(fake if raw else archindex.convert_values(fake, input_max=5.0))
+    return samples
+
+
+def best_time(func, repeat: int, number: int) -> float:
+    """Thời gian tốt nhất (giây) cho một lần gọi func."""
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number
+
+
+def bench_pair(name: str, loop_func, vector_func, samples: list[np.ndarray], stack: np.ndarray, repeat: int):
+    """Đo và in kết quả cho một cặp (bản loop, bản vector hóa)."""
+    for sample in samples:
+        if not np.array_equal(loop_func(sample), vector_func(sample)):
+            raise AssertionError(f"{name}: kết quả vector hóa khác bản loop")
+    batched = vector_func(stack)
+    for i in range(stack.shape[0]):
+        if not np.array_equal(batched[i], loop_func(stack[i])):
+            raise AssertionError(f"{name}: kết quả batch khác bản loop tại phần tử {i}")
+
+    sample = samples[0]
+    t_loop = best_time(lambda: loop_func(sample), repeat, 20)
+    t_vec = best_time(lambda: vector_func(sample), repeat, 200)
+    t_loop_batch = best_time(lambda: [loop_func(m) for m in stack], repeat, 1)
+    t_vec_batch = best_time(lambda: vector_func(stack), repeat, 5)
+
+    n = stack.shape[0]
+    print(f"{name}")
+    print(f"  1 ma trận  : loop {t_loop * 1e3:8.3f} ms | vector {t_vec * 1e3:8.3f} ms | x{t_loop / t_vec:7.1f}")
+    print(f"  batch N={n:<4}: loop {t_loop_batch * 1e3:8.1f} ms | vector {t_vec_batch * 1e3:8.1f} ms | x{t_loop_batch / t_vec_batch:7.1f}"
+          f" | {n / t_vec_batch:,.0f} ma trận/s")
+
+
+def chained_arch_index(matrix: np.ndarray, params: dict) -> dict:
+    """Cách tính cũ trong gui/create.py: gọi lần lượt từng hàm, mỗi bước một bản sao."""
+    processed = archindex.convert_values(matrix, input_max=params["input_max"])
+    processed = archindex.Isolated_point_removal(processed)
+    processed = archindex.toes_remove(processed, threshold=params["toes_threshold"], rows_to_check=params["rows_to_check"])
+    processed = archindex.toes_remain_removes(processed, params["start_row"], params["end_row"],
+                                              params["connectivity_threshold"])
+    return archindex.compute_arch_index(processed, params["segmentation"], params["midfoot_offset"])
+
+
+def bench_pipeline(raw_samples: list[np.ndarray], batch: int, repeat: int, profile: str = archindex.DEFAULT_PROFILE):
+    """So sánh chuỗi hàm từng bước với ArchIndexPipeline.process_batch theo một profile tham số."""
+    pipeline = archindex.ArchIndexPipeline.from_profile(profile)
+    params = pipeline.params()
+    for sample in raw_samples:
+        if pipeline.process(sample) != chained_arch_index(sample, params):
+            raise AssertionError(f"ArchIndexPipeline ({profile}): kết quả khác chuỗi hàm từng bước")
+
+    raw_stack = np.stack([raw_samples[i % len(raw_samples)] for i in range(batch)])
+    t_chain = best_time(lambda: [chained_arch_index(m, params) for m in raw_stack], repeat, 1)
+    pipeline.reset_stats()
+    t_pipe = best_time(lambda: pipeline.process_batch(raw_stack), repeat, 5)
+    print(f"ArchIndexPipeline (toàn bộ chuỗi, profile '{profile}')")
+    print(f"  batch N={batch:<4}: từng bước {t_chain * 1e3:8.1f} ms | pipeline {t_pipe * 1e3:8.1f} ms | x{t_chain / t_pipe:7.1f}"
+          f" | {batch / t_pipe:,.0f} scan/s")
+    total = sum(pipeline.stage_times.values())
+    print("  thời gian theo bước: " + ", ".join(f"{k} {v / total:.0%}" for k, v in pipeline.stage_times.items()))
+
+
+def bench_segmentation(raw_samples: list[np.ndarray], batch: int, repeat: int, toes_threshold: int = 15):
+    """So sánh hai cách tách bàn chân của compute_arch_index: gán nhãn thành phần liên thông và chia đôi cũ."""
+    raw_stack = np.stack([raw_samples[i % len(raw_samples)] for i in range(batch)])
+    print("Tách bàn chân (bước arch_index)")
+    for segmentation in archindex.SEGMENTATIONS:
+        pipeline = archindex.ArchIndexPipeline(input_max=5.0, toes_threshold=toes_threshold, segmentation=segmentation)
+        table = pipeline.process_batch(raw_stack)
+        pipeline.reset_stats()
+        best_time(lambda: pipeline.process_batch(raw_stack), repeat, 5)
+        per_scan = pipeline.stage_times["arch_index"] / pipeline.scans_processed
+        print(f"  {segmentation:<10}: {per_scan * 1e6:8.1f} µs/scan | AI mẫu đầu: "
+              f"trái {table['left_AI'][0]:.4f}, phải {table['right_AI'][0]:.4f}")
+    processed = [archindex.toes_remain_removes(archindex.toes_remove(archindex.Isolated_point_removal(
+                     archindex.convert_values(m, input_max=5.0)), threshold=toes_threshold)) for m in raw_samples]
+    feet = archindex.find_feet(np.stack(processed))
+    found = int(np.count_nonzero(feet["orientation"] != archindex.FOOT_AXIS_NONE))
+    print(f"  find_feet tách được hai chân ở {found}/{len(raw_samples)} mẫu (còn lại dùng cách chia đôi)")
+
+
+def bench_metrics(raw_samples: list[np.ndarray], batch: int, repeat: int, toes_threshold: int = 15):
+    """So sánh process_metrics_batch (AI + chỉ số theo áp lực) với process_batch (chỉ AI)."""
+    raw_stack = np.stack([raw_samples[i % len(raw_samples)] for i in range(batch)])
+    pipeline = archindex.ArchIndexPipeline(input_max=5.0, toes_threshold=toes_threshold)
+    table = pipeline.process_batch(raw_stack)
+    metrics = pipeline.process_metrics_batch(raw_stack)
+    for side, key in enumerate(("left", "right")):
+        if not (np.array_equal(table[f"{key}_AI"], metrics["contact_AI"][:, side], equal_nan=True)
+                and np.array_equal(table[f"{key}_type"], metrics["type"][:, side])):
+            raise AssertionError("process_metrics_batch: contact_AI khác process_batch")
+    t_ai = best_time(lambda: pipeline.process_batch(raw_stack), repeat, 5)
+    t_metrics = best_time(lambda: pipeline.process_metrics_batch(raw_stack), repeat, 5)
+    first = metrics[0, 0]
+    print("Chỉ số theo áp lực (process_metrics_batch)")
+    print(f"  batch N={batch:<4}: chỉ AI {t_ai * 1e3:8.1f} ms | AI + áp lực {t_metrics * 1e3:8.1f} ms"
+          f" | mẫu đầu (trái): AI {first['contact_AI']:.4f}, AI áp lực {first['pressure_AI']:.4f},"
+          f" tâm áp lực ({first['cop_row']:.1f}, {first['cop_col']:.1f})")
+
+
+def bench_resample(raw_samples: list[np.ndarray], batch: int, repeat: int,
+                   mats: tuple = ((30, 30), (64, 128), (120, 120), (90, 45))):
+    """
+    Lưới cảm biến khác 60x60: resample() (đường nhanh reshape/mean, lặp khối kiểu np.kron) khớp phép
+    trung bình theo diện tích tổng quát, và thời gian của pipeline có bước resample về lưới 60x60.
+    """
+    raw_stack = np.stack([raw_samples[i % len(raw_samples)] for i in range(batch)])
+    pipeline = archindex.ArchIndexPipeline(input_max=5.0, toes_threshold=15,
+                                           analysis_shape=sensor_geometry.ANALYSIS_GEOMETRY.shape)
+    t_base = best_time(lambda: pipeline.process_batch(raw_stack), repeat, 5)
+    print(f"Lưới cảm biến khác 60x60 (resample về 60x60), batch N={batch}: pipeline trên 60x60 {t_base * 1e3:8.1f} ms")
+    for shape in mats:
+        stack = sensor_geometry.resample(raw_stack, shape) # dữ liệu mẫu đưa sang lưới của thảm
+        for source, target in ((raw_stack.shape[1:], shape), (shape, raw_stack.shape[1:])):
+            data = raw_stack if source == raw_stack.shape[1:] else stack
+            general = (sensor_geometry._area_weights(source[0], target[0]) @ data
+                       @ sensor_geometry._area_weights(source[1], target[1]).T)
+            if not np.allclose(sensor_geometry.resample(data, target), general):
+                raise AssertionError(f"resample {source} -> {target}: khác phép trung bình theo diện tích")
+        t_resample = best_time(lambda: sensor_geometry.resample(stack, (60, 60)), repeat, 5)
+        pipeline.reset_stats()
+        t_pipe = best_time(lambda: pipeline.process_batch(stack), repeat, 5)
+        label = f"{shape[0]}x{shape[1]}"
+        print(f"  {label:<8}: resample {t_resample * 1e3:7.2f} ms | pipeline {t_pipe * 1e3:8.1f} ms"
+              f" | {t_pipe / batch / (shape[0] * shape[1]) * 1e9:6.1f} ns/pixel đầu vào")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark các kernel archindex (loop vs vector hóa).")
+    parser.add_argument("--batch", type=int, default=200, help="Số ma trận trong chồng batch (mặc định 200).")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần lặp đo, lấy thời gian tốt nhất.")
+    args = parser.parse_args()
+
+    samples = load_samples()
+    stack = np.stack([samples[i % len(samples)] for i in range(args.batch)])
+    print(f"{len(samples)} ma trận mẫu, batch {stack.shape}, dtype {stack.dtype}\n")
+
+    bench_pair("Isolated_point_removal", archindex._isolated_point_removal_loop,
+               archindex.Isolated_point_removal, samples, stack, args.repeat)
+    bench_pair("toes_remain_removes", archindex._toes_remain_removes_loop,
+               archindex.toes_remain_removes, samples, stack, args.repeat)
+    for profile in archindex.ANALYSIS_PROFILES:
+        bench_pipeline(load_samples(raw=True), args.batch, args.repeat, profile)
+    bench_segmentation(load_samples(raw=True), args.batch, args.repeat)
+    bench_metrics(load_samples(raw=True), args.batch, args.repeat)
+    bench_resample(load_samples(raw=True), args.batch, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
+
+# --- END OF FILE benchmarks/bench_archindex.py ---
@@ -0,0 +1,142 @@
+# --- START OF FILE benchmarks/bench_archindex_backends.py ---
+"""
+Đối chiếu và đo hai backend của các bước duyệt pixel trong components/archindex.py:
+"numpy" (vector hóa) và "numba" (kernel @njit trong components/archindex_jit.py).
+
+Trước khi đo, script kiểm tra kernel cho kết quả giống hệt bản NumPy trên các CSV mẫu trong data/
+và trên ma trận ngẫu nhiên (uint8 và float, 60x60 và các lưới lớn hơn), rồi kiểm tra toàn bộ
+ArchIndexPipeline với cả hai backend. Không có numba thì kernel chạy như Python thường: vẫn đối
+chiếu được (trên ít ma trận hơn) nhưng bỏ qua phần đo tốc độ.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.bench_archindex_backends
+    python -m benchmarks.bench_archindex_backends --sizes 60 120 240 --batch 100
+"""
+
+import argparse
+
+import numpy as np
+
+from components import archindex, archindex_jit
+from benchmarks.bench_archindex import best_time, load_samples
+
+TOES_THRESHOLD = 15
+
+
+def numpy_steps() -> dict:
+    """Các bước tiền xử lý với backend NumPy, mỗi hàm nhận một ma trận (H,W) hoặc chồng (N,H,W)."""
+    def toes(matrix):
+        if matrix.ndim == 2:
+            return archindex.toes_remove(matrix, threshold=TOES_THRESHOLD)
+        return np.stack([archindex.toes_remove(m, threshold=TOES_THRESHOLD) for m in matrix])
+    return {"Isolated_point_removal": archindex.Isolated_point_removal,
+            "toes_remove": toes,
+            "toes_remain_removes": archindex.toes_remain_removes}
+
+
+def kernel_steps() -> dict:
+    """Cùng các bước, gọi thẳng kernel của archindex_jit (đã biên dịch hoặc Python thường)."""
+    def isolated(matrix):
+        out = matrix.copy()
+        archindex_jit.isolated_point_removal(archindex_jit.as_stack(matrix), archindex_jit.as_stack(out),
+                                             archindex_jit.is_unsigned(matrix))
+        return out
+
+    def toes(matrix):
+        out = matrix.copy()
+        stack = archindex_jit.as_stack(out)
+        archindex_jit.toes_remove(stack, TOES_THRESHOLD, 5, np.empty(stack.shape[0], dtype=bool))
+        return out
+
+    def toes_remain(matrix):
+        out = matrix.copy()
+        archindex_jit.toes_remain_removes(archindex_jit.as_stack(out), 5, 12, 15)
+        return out
+    return {"Isolated_point_removal": isolated, "toes_remove": toes, "toes_remain_removes": toes_remain}
+
+
+def random_matrices(rng, count: int, size: int, dtype) -> np.ndarray:
+    """Chồng ma trận thưa ngẫu nhiên (pixel nhiễu đơn lẻ, cụm ngắn) trên thang 0-255."""
+    density = 0.05 + 0.95 * rng.random((count, 1, 1)) # không có ma trận trống (toes_remove trả về lỗi)
+    stack = (rng.random((count, size, size)) < density) * rng.random((count, size, size)) * 255
+    if np.issubdtype(dtype, np.integer):
+        stack = np.ceil(stack) # giữ các giá trị nhỏ khác 0
+    return stack.astype(dtype)
+
+
+def check_equivalence(sizes: list[int], count: int, rng) -> int:
+    """So sánh kernel với bản NumPy từng ma trận. Trả về số ma trận đã kiểm tra."""
+    reference, kernels = numpy_steps(), kernel_steps()
+    cases = [("data/", np.stack(load_samples()))]
+    for size in sizes:
+        for dtype in (np.uint8, np.float64):
+            cases.append((f"{size}x{size} {np.dtype(dtype).name}", random_matrices(rng, count, size, dtype)))
+    checked = 0
+    for label, stack in cases:
+        for name, func in reference.items():
+            expected = func(stack)
+            if not np.array_equal(kernels[name](stack), expected):
+                raise AssertionError(f"{name}: kernel khác bản NumPy ({label}, batch)")
+            for i, matrix in enumerate(stack):
+                if not np.array_equal(kernels[name](matrix), expected[i]):
+                    raise AssertionError(f"{name}: kernel khác bản NumPy ({label}, ma trận {i})")
+        checked += stack.shape[0]
+    return checked
+
+
+def check_pipeline(raw_samples: list[np.ndarray], batch: int):
+    """ArchIndexPipeline cho cùng bảng kết quả với cả hai backend."""
+    raw_stack = np.stack([raw_samples[i % len(raw_samples)] for i in range(batch)])
+    tables = {}
+    for backend in archindex.BACKENDS:
+        previous = archindex.set_backend(backend)
+        try:
+            tables[backend] = archindex.ArchIndexPipeline(toes_threshold=TOES_THRESHOLD).process_batch(raw_stack)
+        finally:
+            archindex.set_backend(previous)
+    if not np.array_equal(tables[archindex.BACKEND_NUMPY], tables[archindex.BACKEND_NUMBA]):
+        raise AssertionError("ArchIndexPipeline: kết quả khác nhau giữa hai backend")
+
+
+def bench_backends(sizes: list[int], batch: int, repeat: int, rng):
+    """Thời gian từng bước trên chồng N ma trận uint8 với mỗi backend."""
+    steps = numpy_steps()
+    for size in sizes:
+        stack = random_matrices(rng, batch, size, np.uint8)
+        print(f"Lưới {size}x{size}, batch N={batch}")
+        for name, func in steps.items():
+            times = {}
+            for backend in archindex.BACKENDS:
+                previous = archindex.set_backend(backend)
+                try:
+                    func(stack) # lần đầu: biên dịch kernel
+                    times[backend] = best_time(lambda: func(stack), repeat, 3)
+                finally:
+                    archindex.set_backend(previous)
+            t_numpy, t_numba = times[archindex.BACKEND_NUMPY], times[archindex.BACKEND_NUMBA]
+            print(f"  {name:<24}: numpy {t_numpy * 1e3:8.2f} ms | numba {t_numba * 1e3:8.2f} ms | x{t_numpy / t_numba:6.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đối chiếu và benchmark backend numpy / numba của archindex.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[60, 120, 240], help="Kích thước lưới cảm biến.")
+    parser.add_argument("--batch", type=int, default=200, help="Số ma trận mỗi chồng khi đo.")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần lặp đo, lấy thời gian tốt nhất.")
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    if not archindex_jit.AVAILABLE:
+        checked = check_equivalence(args.sizes[:1], 5, rng)
+        print(f"numba chưa được cài: kernel (chạy như Python thường) khớp bản NumPy trên {checked} ma trận."
+              " Bỏ qua phần đo tốc độ.")
+        return
+    checked = check_equivalence(args.sizes, 50, rng)
+    check_pipeline(load_samples(raw=True), args.batch)
+    print(f"Kernel numba khớp bản NumPy trên {checked} ma trận; ArchIndexPipeline khớp với cả hai backend.\n")
+    bench_backends(args.sizes, args.batch, args.repeat, rng)
+
+
+if __name__ == "__main__":
+    main()
+
+# --- END OF FILE benchmarks/bench_archindex_backends.py ---
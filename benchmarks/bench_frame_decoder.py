@@ -0,0 +1,123 @@
+# --- START OF FILE benchmarks/bench_frame_decoder.py ---
+"""
+Benchmark giải mã frame serial dạng ASCII (components/frame_decoder.py).
+
+So sánh cách cũ (readline + split + int() từng ô) với decode_frame/AsciiFrameAssembler trên một
+luồng bytes đã ghi lại từ cổng serial. Không có file ghi thì tạo luồng giả gồm các frame ngẫu nhiên.
+Cùng các frame đó được đóng gói theo giao thức nhị phân để so sánh kích thước gói và tốc độ
+BinaryFrameReader.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.bench_frame_decoder
+    python -m benchmarks.bench_frame_decoder --capture capture.bin --rows 30 --cols 30
+"""
+
+import argparse
+import io
+
+import numpy as np
+
+from components import frame_decoder
+from benchmarks.bench_archindex import best_time
+
+
+def make_stream(frames: int, rows: int, cols: int, bad_rows: float = 0.05, seed: int = 0) -> bytes:
+    """Tạo luồng bytes giống firmware: '-----' rồi rows dòng CSV, giá trị 0-4095, tỉ lệ bad_rows dòng có ô lỗi."""
+    rng = np.random.default_rng(seed)
+    out = io.BytesIO()
+    for _ in range(frames):
+        out.write(b"-----\r\n")
+        matrix = rng.integers(0, 4096, (rows, cols)) * (rng.random((rows, cols)) < 0.4)
+        for row in matrix:
+            cells = [str(v) for v in row]
+            if rng.random() < bad_rows:
+                cells[rng.integers(cols)] = "x" # ô lỗi -> 0
+            out.write((",".join(cells) + "\r\n").encode())
+    return out.getvalue()
+
+
+def legacy_decode_stream(stream: bytes, rows: int, cols: int) -> list[np.ndarray]:
+    """Cách cũ trong SerialHeatmapWindow.update_heatmap: từng dòng, từng ô."""
+    frames = []
+    reading_frame = False
+    data_buffer = []
+    for line_bytes in io.BytesIO(stream):
+        line = line_bytes.decode('utf-8', errors='ignore').strip()
+        if "-----" in line:
+            reading_frame = True
+            data_buffer = []
+            continue
+        if not reading_frame or not line:
+            continue
+        data_buffer.append(frame_decoder.parse_row(line, cols))
+        if len(data_buffer) == rows:
+            frames.append(np.array(data_buffer, dtype=int))
+            reading_frame = False
+            data_buffer = []
+    return frames
+
+
+def assembler_decode_stream(stream: bytes, rows: int, cols: int, chunk_size: int) -> list[np.ndarray]:
+    assembler = frame_decoder.AsciiFrameAssembler(rows, cols)
+    frames = []
+    for start in range(0, len(stream), chunk_size):
+        frames.extend(assembler.feed(stream[start:start + chunk_size]))
+    return frames
+
+
+def binary_decode_stream(stream: bytes, rows: int, cols: int) -> list[np.ndarray]:
+    reader = frame_decoder.BinaryFrameReader(io.BytesIO(stream), rows, cols)
+    frames = []
+    while (frame := reader.read_frame()) is not None:
+        frames.append(frame)
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark giải mã frame serial ASCII.")
+    parser.add_argument("--capture", help="File bytes thô ghi từ cổng serial (mặc định: tạo luồng giả).")
+    parser.add_argument("--frames", type=int, default=300, help="Số frame của luồng giả.")
+    parser.add_argument("--rows", type=int, default=30)
+    parser.add_argument("--cols", type=int, default=30)
+    parser.add_argument("--bad-rows", type=float, default=0.05, help="Tỉ lệ dòng có ô lỗi trong luồng giả.")
+    parser.add_argument("--chunk-size", type=int, default=4096, help="Kích thước mỗi lần đọc serial giả lập.")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.capture:
+        with open(args.capture, "rb") as f:
+            stream = f.read()
+    else:
+        stream = make_stream(args.frames, args.rows, args.cols, args.bad_rows)
+
+    legacy = legacy_decode_stream(stream, args.rows, args.cols)
+    decoded = assembler_decode_stream(stream, args.rows, args.cols, args.chunk_size)
+    if len(legacy) != len(decoded) or not all(np.array_equal(a, b) for a, b in zip(legacy, decoded)):
+        raise AssertionError("AsciiFrameAssembler: kết quả khác cách giải mã cũ")
+    n = len(decoded)
+    print(f"{len(stream) / 1e6:.2f} MB, {n} frame {args.rows}x{args.cols}\n")
+
+    t_legacy = best_time(lambda: legacy_decode_stream(stream, args.rows, args.cols), args.repeat, 1)
+    t_new = best_time(lambda: assembler_decode_stream(stream, args.rows, args.cols, args.chunk_size), args.repeat, 1)
+    print(f"  cũ (từng ô)     : {t_legacy * 1e3:8.1f} ms | {n / t_legacy:10,.0f} frame/s | {len(stream) / t_legacy / 1e6:6.1f} MB/s")
+    print(f"  frame_decoder   : {t_new * 1e3:8.1f} ms | {n / t_new:10,.0f} frame/s | {len(stream) / t_new / 1e6:6.1f} MB/s"
+          f" | x{t_legacy / t_new:.1f}")
+
+    binary_stream = b"".join(frame_decoder.encode_binary_frame(frame, i) for i, frame in enumerate(decoded))
+    binary = binary_decode_stream(binary_stream, args.rows, args.cols)
+    if len(binary) != n or not all(np.array_equal(a, b) for a, b in zip(binary, decoded)):
+        raise AssertionError("BinaryFrameReader: kết quả khác frame gốc")
+    t_binary = best_time(lambda: binary_decode_stream(binary_stream, args.rows, args.cols), args.repeat, 1)
+    print(f"  binary          : {t_binary * 1e3:8.1f} ms | {n / t_binary:10,.0f} frame/s |"
+          f" {len(binary_stream) / t_binary / 1e6:6.1f} MB/s | x{t_legacy / t_binary:.1f}")
+
+    # 115200 baud, 8N1 ~ 11.5 kB/s: số frame tối đa cổng serial có thể gửi
+    ascii_size, binary_size = len(stream) / max(n, 1), len(binary_stream) / max(n, 1)
+    print(f"\n  Kích thước frame: ASCII {ascii_size:,.0f} B, binary {binary_size:,.0f} B"
+          f" -> 115200 baud: {11520 / ascii_size:.1f} vs {11520 / binary_size:.1f} frame/s")
+
+
+if __name__ == "__main__":
+    main()
+
+# --- END OF FILE benchmarks/bench_frame_decoder.py ---
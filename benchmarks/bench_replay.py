@@ -0,0 +1,122 @@
+# --- START OF FILE benchmarks/bench_replay.py ---
+"""
+Benchmark chuỗi đọc serial -> ghép frame -> vẽ heatmap bằng một phiên đã ghi (components/serial_replay.py),
+không cần thảm cảm biến.
+
+Phiên được phát lại qua ReplaySerial với cùng bộ giải mã như SerialReaderThread (ASCII hoặc nhị phân).
+speed=max đo thông lượng tối đa của bộ giải mã; speed=1 (thời gian thực) cho biết pipeline có theo kịp
+cổng serial không. --render vẽ thêm từng frame bằng BlitHeatmapRenderer trên canvas Agg (không cần màn hình).
+Không có file ghi thì tạo một phiên giả từ luồng ASCII của bench_frame_decoder với nhịp 115200 baud.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.bench_replay
+    python -m benchmarks.bench_replay --capture recordings/serial_20250327_000100.smrec --speed max --render
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from components import frame_decoder, serial_replay
+from benchmarks.bench_frame_decoder import make_stream
+
+SERIAL_BYTES_PER_S = 11520 # 115200 baud, 8N1
+READ_CHUNK = 256            # Giống kích thước khối đọc thường gặp của bộ đệm USB-serial
+
+
+def make_recording(path: str, frames: int, rows: int, cols: int, protocol: str):
+    """Tạo phiên giả: bytes đến theo nhịp 115200 baud, mỗi bản ghi READ_CHUNK bytes."""
+    stream = make_stream(frames, rows, cols)
+    if protocol == frame_decoder.PROTOCOL_BINARY:
+        decoded = frame_decoder.AsciiFrameAssembler(rows, cols).feed(stream)
+        stream = b"".join(frame_decoder.encode_binary_frame(frame, i) for i, frame in enumerate(decoded))
+    records = [((start + READ_CHUNK) / SERIAL_BYTES_PER_S, stream[start:start + READ_CHUNK])
+               for start in range(0, len(stream), READ_CHUNK)]
+    serial_replay.write_recording(path, records)
+
+
+def replay_frames(port, rows: int, cols: int, protocol: str, on_frame=None) -> int:
+    """Đọc hết phiên như SerialReaderThread (_run_ascii / _run_binary). Trả về số frame."""
+    count = 0
+    if protocol == frame_decoder.PROTOCOL_BINARY:
+        reader = frame_decoder.BinaryFrameReader(port, rows, cols)
+        while not port.exhausted:
+            frame = reader.read_frame()
+            if frame is not None:
+                count += 1
+                if on_frame is not None:
+                    on_frame(frame)
+        return count
+    assembler = frame_decoder.AsciiFrameAssembler(rows, cols)
+    while not port.exhausted:
+        for frame in assembler.feed(port.read(port.in_waiting or 1)):
+            count += 1
+            if on_frame is not None:
+                on_frame(frame)
+    return count
+
+
+def make_renderer(rows: int, cols: int):
+    """Figure Agg giống SerialHeatmapWindow + BlitHeatmapRenderer."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from gui.heatmap_renderer import BlitHeatmapRenderer
+
+    figure = Figure(figsize=(6, 6))
+    canvas = FigureCanvasAgg(figure)
+    ax = figure.add_subplot(111)
+    image = ax.imshow(np.zeros((rows, cols)), cmap='jet', origin='lower', vmin=0, vmax=1)
+    cbar = figure.colorbar(image, ax=ax)
+    ax.set_xticks([])
+    ax.set_yticks([])
+    canvas.draw()
+    return BlitHeatmapRenderer(canvas, ax, image, cbar)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark phát lại phiên serial đã ghi.")
+    parser.add_argument("--capture", help="File ghi .smrec (mặc định: tạo phiên giả).")
+    parser.add_argument("--speed", default="max", help="Hệ số tốc độ phát lại: 1, 4, ... hoặc max.")
+    parser.add_argument("--protocol", default=frame_decoder.PROTOCOL_ASCII,
+                        choices=(frame_decoder.PROTOCOL_ASCII, frame_decoder.PROTOCOL_BINARY),
+                        help="Giao thức của phiên (phiên nhị phân ghi ở chế độ auto: dòng 'OK BIN' được bỏ qua khi tìm sync).")
+    parser.add_argument("--frames", type=int, default=100, help="Số frame của phiên giả.")
+    parser.add_argument("--rows", type=int, default=30)
+    parser.add_argument("--cols", type=int, default=30)
+    parser.add_argument("--render", action="store_true", help="Vẽ từng frame bằng BlitHeatmapRenderer (Agg).")
+    args = parser.parse_args()
+
+    path = args.capture
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix=serial_replay.RECORDING_EXTENSION)
+        os.close(fd)
+        make_recording(path, args.frames, args.rows, args.cols, args.protocol)
+
+    try:
+        renderer = make_renderer(args.rows, args.cols) if args.render else None
+        # timeout=0: hết dữ liệu thì trả về ngay thay vì chờ như cổng thật
+        port = serial_replay.ReplaySerial(path, speed=args.speed, timeout=0)
+        start = time.perf_counter()
+        frames = replay_frames(port, args.rows, args.cols, args.protocol,
+                               on_frame=renderer.update if renderer is not None else None)
+        elapsed = time.perf_counter() - start
+    finally:
+        if args.capture is None:
+            os.remove(path)
+
+    size = port.size
+    speed = "max" if port.speed == serial_replay.SPEED_MAX else f"x{port.speed:g}"
+    print(f"{path if args.capture else 'phiên giả'}: {size / 1e3:,.1f} kB, ghi trong {port.duration:.2f} s, phát lại {speed}")
+    print(f"  {frames} frame trong {elapsed * 1e3:,.1f} ms | {frames / elapsed:,.0f} frame/s | {size / elapsed / 1e6:.2f} MB/s"
+          + (f" | {renderer.full_redraws} lần vẽ lại toàn bộ" if renderer is not None else ""))
+    if port.duration:
+        print(f"  Thời gian thực của phiên: {frames / port.duration:.1f} frame/s")
+
+
+if __name__ == "__main__":
+    main()
+
+# --- END OF FILE benchmarks/bench_replay.py ---
@@ -1,14 +1,18 @@
+import sys
 import serial
 import numpy as np
 import matplotlib.pyplot as plt
 
+# Lưới của thảm: tham số dòng lệnh dạng 64x128, mặc định 30x30 (xem components/sensor_geometry.py)
+ROWS, COLS = (int(v) for v in (sys.argv[1] if len(sys.argv) > 1 else "30x30").lower().split("x"))
+
 ser = serial.Serial("/dev/ttyACM0", 115200, timeout=1)
 
 plt.ion()
 
 while True:
     data = []
-    for _ in range(30):
+    for _ in range(ROWS):
         line = ser.readline().decode('utf-8', errors='ignore').strip()
         if "-----" in line:
             break
@@ -16,11 +20,11 @@ while True:
             continue
 
         parts = line.split(",")
-        if len(parts) == 30 and all(part.strip().isdigit() for part in parts):
+        if len(parts) == COLS and all(part.strip().isdigit() for part in parts):
             values = list(map(int, parts))
             data.append(values)
 
-    if len(data) == 30:
+    if len(data) == ROWS:
         matrix = np.array(data)
 
         # Xử lý nhiễu (nếu muốn bật lại)
@@ -32,7 +36,7 @@ while True:
         # Vẽ heatmap
         plt.imshow(matrix, cmap="jet", interpolation="gaussian", origin="lower", vmin=0)
         plt.colorbar()
-        plt.title("FSR Heatmap (16x16)")
+        plt.title(f"FSR Heatmap ({ROWS}x{COLS})")
         plt.pause(0.1)
         
         plt.clf()
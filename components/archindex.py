@@ -4,6 +4,7 @@
 import serial
 import csv
 import os
+import time
 from datetime import datetime
 import numpy as np
 import pandas as pd
@@ -11,6 +12,31 @@ import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 from matplotlib import style
 
+from components import archindex_jit
+from components.sensor_geometry import ANALYSIS_GEOMETRY, resample
+
+# Backend cho các bước duyệt pixel (Isolated_point_removal, toes_remove, toes_remain_removes):
+# "numba" dùng kernel @njit trong archindex_jit (mặc định khi numba được cài), "numpy" dùng bản vector hóa.
+BACKEND_NUMPY = "numpy"
+BACKEND_NUMBA = "numba"
+BACKENDS = (BACKEND_NUMPY, BACKEND_NUMBA)
+_backend = BACKEND_NUMBA if archindex_jit.AVAILABLE else BACKEND_NUMPY
+
+
+def get_backend() -> str:
+    return _backend
+
+
+def set_backend(name: str):
+    """Chọn backend cho các bước duyệt pixel. Trả về backend trước đó."""
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend: {name}")
+    if name == BACKEND_NUMBA and not archindex_jit.AVAILABLE:
+        raise ValueError("numba is not installed")
+    previous, _backend = _backend, name
+    return previous
+
 # load file csv
 def load_csv_data(file_path: str) -> np.ndarray | None: # Thêm | None vào type hint
     """
@@ -69,32 +95,66 @@ def convert_values(matrix: np.ndarray, input_max: float = 5.0) -> np.ndarray: #
     return scaled_matrix.astype(np.uint8)
 
 
+# Thứ tự 9 ô của cửa sổ 3x3 sau khi flatten (giống gray_image[i-1:i+2, j-1:j+2].flatten())
+_WINDOW_OFFSETS = [(-1, -1), (-1, 0), (-1, 1),
+                   (0, -1), (0, 0), (0, 1),
+                   (1, -1), (1, 0), (1, 1)]
+
+def _isolated_point_mask(gray_image: np.ndarray) -> np.ndarray:
+    """
+    Tính mask các điểm nhiễu đơn lẻ cho phần trong (bỏ viền) của ảnh 2D hoặc chồng ảnh (N,H,W).
+    Dùng 9 view dịch chuyển thay vì duyệt từng pixel. Tổng cửa sổ được cộng theo đúng thứ tự
+    pairwise mà np.sum dùng cho 9 phần tử ((a0+a1)+(a2+a3))+((a4+a5)+(a6+a7))+a8, nên kết quả
+    khớp từng bit với cách tính cũ kể cả với dữ liệu float.
+    """
+    rows, cols = gray_image.shape[-2:]
+    acc_dtype = np.add.reduce(np.zeros(1, dtype=gray_image.dtype)).dtype # dtype mà np.sum sẽ dùng
+    v = [gray_image[..., 1 + di:rows - 1 + di, 1 + dj:cols - 1 + dj].astype(acc_dtype, copy=False)
+         for di, dj in _WINDOW_OFFSETS]
+    window_sum = ((v[0] + v[1]) + (v[2] + v[3])) + ((v[4] + v[5]) + (v[6] + v[7]))
+    window_sum += v[8]
+    center = gray_image[..., 1:rows - 1, 1:cols - 1]
+    neighbor_sum_excluding_center = window_sum - center
+    return (center > 0) & (neighbor_sum_excluding_center == 0)
+
 # loai bo diem nhieu don le trong ma tran 60x60 su dung thuan toán 8-neighborhood
 def Isolated_point_removal(gray_image: np.ndarray) -> np.ndarray:
-    """Removes isolated noise points using 8-neighborhood algorithm."""
+    """
+    Removes isolated noise points using 8-neighborhood algorithm.
+    Chấp nhận ma trận 2D (H,W) hoặc chồng ma trận (N,H,W); kết quả giống hệt bản duyệt từng pixel.
+    """
     filtered_image = gray_image.copy()
-    rows, cols = gray_image.shape
+    rows, cols = gray_image.shape[-2:]
 
     # Thêm kiểm tra kích thước để tránh lỗi index nếu ảnh quá nhỏ
     if rows < 3 or cols < 3:
         print("Warning: Image too small for isolated point removal.")
         return filtered_image
 
-    # Duyệt qua từng điểm ảnh trừ viền ngoài
+    if _backend == BACKEND_NUMBA:
+        archindex_jit.isolated_point_removal(archindex_jit.as_stack(gray_image), archindex_jit.as_stack(filtered_image),
+                                             archindex_jit.is_unsigned(gray_image))
+        return filtered_image
+
+    # Mask được tính hoàn toàn từ ảnh gốc nên có thể gán 0 một lần cho phần trong
+    filtered_image[..., 1:rows - 1, 1:cols - 1][_isolated_point_mask(gray_image)] = 0
+    return filtered_image
+
+def _isolated_point_removal_loop(gray_image: np.ndarray) -> np.ndarray:
+    """Bản duyệt từng pixel cũ của Isolated_point_removal, giữ lại để đối chiếu và benchmark."""
+    filtered_image = gray_image.copy()
+    rows, cols = gray_image.shape
+
+    if rows < 3 or cols < 3:
+        return filtered_image
+
     for i in range(1, rows - 1):
         for j in range(1, cols - 1):
-            # Chỉ xét điểm ảnh có giá trị (không phải nền)
             if gray_image[i, j] > 0:
-                # Lấy 8 điểm lân cận
                 neighbors = gray_image[i-1:i+2, j-1:j+2].flatten()
-                # Kiểm tra xem tất cả lân cận (trừ điểm trung tâm) có bằng 0 không
-                # Tạo một mask để loại trừ điểm trung tâm khi kiểm tra
-                center_index = 4 # Index của điểm [i,j] trong mảng 3x3 phẳng
                 neighbor_sum_excluding_center = np.sum(neighbors) - gray_image[i,j]
-
-                # Nếu tổng các lân cận (không tính điểm đang xét) là 0 -> điểm nhiễu
                 if neighbor_sum_excluding_center == 0:
-                    filtered_image[i, j] = 0 # Loại bỏ điểm nhiễu
+                    filtered_image[i, j] = 0
 
     return filtered_image
 
@@ -108,6 +168,12 @@ def toes_remove(foot_matrix, threshold=10, rows_to_check=5):
     Returns:
         Ma trận đã loại bỏ phần ngón chân.
     """
+    if _backend == BACKEND_NUMBA:
+        filtered_matrix = foot_matrix.copy()
+        has_foot = np.empty(1, dtype=bool)
+        archindex_jit.toes_remove(filtered_matrix[None], threshold, rows_to_check, has_foot)
+        return filtered_matrix if has_foot[0] else (None, "No foot detected in this half")
+
      # Tìm hàng đầu tiên và hàng cuối cùng có pixel bàn chân
     row_indices = np.where(foot_matrix > 0)[0]
     if len(row_indices) == 0:
@@ -133,9 +199,64 @@ def toes_remove(foot_matrix, threshold=10, rows_to_check=5):
 
     return filtered_matrix
 
+# --- RUN-LENGTH ENCODING THEO HÀNG ---
+def find_row_runs(mask: np.ndarray):
+    """
+    Tìm tất cả các đoạn (run) liên tiếp giá trị True theo từng hàng của mask (...,W) trong một lần.
+    Args:
+        mask: Mảng bool, trục cuối là cột. Có thể là (H,W) hoặc (N,H,W).
+    Returns:
+        tuple: (index, starts, ends)
+            index: tuple các mảng chỉ số cho các trục phía trước (ví dụ (hàng,) hoặc (ảnh, hàng)).
+            starts: cột bắt đầu của mỗi run.
+            ends: cột kết thúc (không bao gồm) của mỗi run; độ dài run = ends - starts.
+    """
+    padded = np.zeros(mask.shape[:-1] + (mask.shape[-1] + 2,), dtype=np.int8)
+    padded[..., 1:-1] = mask
+    edges = np.diff(padded, axis=-1)
+    # np.nonzero trả về theo thứ tự C nên điểm bắt đầu và kết thúc của cùng một run luôn khớp cặp
+    start_idx = np.nonzero(edges == 1)
+    end_cols = np.nonzero(edges == -1)[-1]
+    return start_idx[:-1], start_idx[-1], end_cols
+
+def _runs_to_mask(shape: tuple, index: tuple, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Dựng lại mask bool (shape) từ danh sách run bằng mảng hiệu + cumsum (không lặp Python)."""
+    delta = np.zeros(shape[:-1] + (shape[-1] + 1,), dtype=np.int32)
+    np.add.at(delta, index + (starts,), 1)
+    np.add.at(delta, index + (ends,), -1)
+    return np.cumsum(delta, axis=-1)[..., :-1] > 0
+
+def _short_run_mask(foot_matrix: np.ndarray, start_row: int, end_row: int, connectivity_threshold: int) -> np.ndarray:
+    """Mask các cụm pixel ngang ngắn hơn connectivity_threshold trong các hàng start_row..end_row-1."""
+    band = foot_matrix[..., start_row:end_row, :]
+    index, starts, ends = find_row_runs(band > 0)
+    short = (ends - starts) < connectivity_threshold
+    return _runs_to_mask(band.shape, tuple(i[short] for i in index), starts[short], ends[short])
+
 # loại bỏ phần còn lại của ngón chân khỏi cảm biến
 def toes_remain_removes(foot_matrix, start_row=5, end_row=12, connectivity_threshold=15):
-    """Loại bỏ các cụm pixel nhỏ còn sót lại ở vùng ngón chân."""
+    """
+    Loại bỏ các cụm pixel nhỏ còn sót lại ở vùng ngón chân.
+    Tìm mọi cụm ngang trong các hàng start_row..end_row bằng run-length encoding rồi xóa
+    các cụm ngắn hơn connectivity_threshold trong một lần gán. Hỗ trợ (H,W) hoặc (N,H,W).
+    """
+    filtered_matrix = foot_matrix.copy()
+    rows = foot_matrix.shape[-2]
+    actual_start_row = min(start_row, rows)
+    actual_end_row = min(end_row, rows)
+    if actual_start_row >= actual_end_row:
+        return filtered_matrix
+    if _backend == BACKEND_NUMBA:
+        archindex_jit.toes_remain_removes(archindex_jit.as_stack(filtered_matrix), actual_start_row, actual_end_row,
+                                          connectivity_threshold)
+        return filtered_matrix
+
+    short_mask = _short_run_mask(foot_matrix, actual_start_row, actual_end_row, connectivity_threshold)
+    filtered_matrix[..., actual_start_row:actual_end_row, :][short_mask] = 0
+    return filtered_matrix
+
+def _toes_remain_removes_loop(foot_matrix, start_row=5, end_row=12, connectivity_threshold=15):
+    """Bản state machine theo từng cột cũ của toes_remain_removes, giữ lại để đối chiếu và benchmark."""
     filtered_matrix = foot_matrix.copy()
     rows, cols = foot_matrix.shape
     actual_start_row = min(start_row, rows)
@@ -147,75 +268,126 @@ def toes_remain_removes(foot_matrix, start_row=5, end_row=12, connectivity_thres
         current_cluster_count = 0
         for col in range(cols):
             if filtered_matrix[row, col] > 0:
-                if not in_cluster: # Bắt đầu một cụm mới
+                if not in_cluster:
                     in_cluster = True
                     cluster_start_col = col
                     current_cluster_count = 1
-                else: # Đang trong một cụm
+                else:
                     current_cluster_count += 1
-            else: # Gặp pixel 0
-                if in_cluster: # Kết thúc một cụm
-                    # Nếu cụm vừa kết thúc quá nhỏ, xóa nó
+            else:
+                if in_cluster:
                     if current_cluster_count < connectivity_threshold:
                         filtered_matrix[row, cluster_start_col:col] = 0
-                    # Reset lại trạng thái
                     in_cluster = False
                     cluster_start_col = -1
                     current_cluster_count = 0
-        # Xử lý trường hợp cụm kéo dài đến hết hàng
         if in_cluster and current_cluster_count < connectivity_threshold:
              filtered_matrix[row, cluster_start_col:cols] = 0
 
     return filtered_matrix
 
+# --- GÁN NHÃN THÀNH PHẦN LIÊN THÔNG (UNION-FIND TRÊN RUN) ---
+def _label_runs(mask: np.ndarray, connectivity: int = 8):
+    """
+    Gán nhãn thành phần liên thông cho các run của mask (H,W) hoặc (N,H,W) mà không duyệt từng pixel.
+    Hai run ở hai hàng liền nhau được nối nếu chồng cột (connectivity=4) hoặc chạm chéo (8).
+    Các cặp run chồng nhau được tìm bằng searchsorted trên khóa (hàng, cột) nối liền, rồi hợp nhất
+    bằng union-find dạng "nhãn nhỏ nhất + nhảy con trỏ" trên cả mảng.
+    Returns:
+        tuple: (index, starts, ends, run_labels, count) với index/starts/ends như find_row_runs,
+               run_labels (1..count) theo thứ tự run đầu tiên của mỗi thành phần.
+    """
+    if connectivity not in (4, 8):
+        raise ValueError(f"connectivity must be 4 or 8, got {connectivity}")
+    index, starts, ends = find_row_runs(mask)
+    n_runs = starts.size
+    if n_runs == 0:
+        return index, starts, ends, np.zeros(0, dtype=np.int64), 0
+
+    rows, cols = mask.shape[-2:]
+    row = index[-1].astype(np.int64)
+    if len(index) > 1:
+        # Các ảnh trong chồng cách nhau một hàng trống nên không bao giờ nối với nhau
+        row = row + np.ravel_multi_index(index[:-1], mask.shape[:-2]) * (rows + 1)
+    stride = cols + 2 # khóa của hàng r nằm trong [r*stride, r*stride + cols], không chồng hàng khác
+    start_key = row * stride + starts
+    end_key = row * stride + ends
+    reach = 1 if connectivity == 8 else 0
+    prev_row_key = (row - 1) * stride
+    # Run a ở hàng trước chồng run b khi a.end > b.start - reach và a.start < b.end + reach
+    lo = np.searchsorted(end_key, prev_row_key + starts - reach, side="right")
+    hi = np.searchsorted(start_key, prev_row_key + ends + reach, side="left")
+    pair_counts = np.maximum(hi - lo, 0)
+    b = np.repeat(np.arange(n_runs), pair_counts)
+    a = np.repeat(lo - np.cumsum(pair_counts) + pair_counts, pair_counts) + np.arange(b.size)
+
+    parent = np.arange(n_runs)
+    while b.size:
+        root_a, root_b = parent[a], parent[b]
+        if np.array_equal(root_a, root_b):
+            break
+        low = np.minimum(root_a, root_b)
+        np.minimum.at(parent, root_a, low)
+        np.minimum.at(parent, root_b, low)
+        while True: # nén đường đi cho tới khi mọi run trỏ thẳng tới gốc
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+    roots, run_labels = np.unique(parent, return_inverse=True)
+    return index, starts, ends, run_labels.reshape(-1) + 1, roots.size
+
+def label_components(mask: np.ndarray, connectivity: int = 8):
+    """
+    Gán nhãn các vùng pixel liên thông (giống scipy.ndimage.label) cho mask (H,W) hoặc (N,H,W).
+    Args:
+        mask: Mảng bool (hoặc ma trận, pixel > 0 được tính).
+        connectivity: 8 (mặc định, tính cả láng giềng chéo) hoặc 4.
+    Returns:
+        tuple: (labels, count) - labels int32 cùng kích thước mask (0 = nền); với chồng ảnh,
+               nhãn được đánh liên tục qua các ảnh.
+    """
+    mask = np.asarray(mask) > 0
+    index, starts, ends, run_labels, count = _label_runs(mask, connectivity)
+    return _paint_runs(mask.shape, index, starts, ends, run_labels), count
+
+def _paint_runs(shape: tuple, index: tuple, starts: np.ndarray, ends: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Dựng ảnh int32 (shape) với mỗi run mang giá trị của nó (các run không chồng nhau), nền 0."""
+    delta = np.zeros(shape[:-1] + (shape[-1] + 1,), dtype=np.int32)
+    np.add.at(delta, index + (starts,), values)
+    np.add.at(delta, index + (ends,), -values)
+    return np.cumsum(delta, axis=-1, dtype=np.int32)[..., :-1]
+
 # --- HÀM PHỤ TRỢ TÍNH AI CHO MỘT NỬA BÀN CHÂN ---
-def _calculate_single_foot_ai(single_foot_matrix: np.ndarray):
+def _calculate_single_foot_ai(single_foot_matrix: np.ndarray, midfoot_offset: int = 0):
     """
     Tính toán chỉ số Arch Index (AI) cho một ma trận bàn chân đơn lẻ (trái hoặc phải).
     Args:
         single_foot_matrix: Ma trận NumPy chứa ảnh xám (0-255) của một nửa bàn chân.
+        midfoot_offset: Số pixel trừ vào diện tích vùng giữa (profile "reverse" dùng 60).
     Returns:
         tuple: (AI_value, foot_type) hoặc (None, error_message)
     """
     if not check_data(single_foot_matrix):
         return None, "Invalid data for single foot"
-    
-    single = single_foot_matrix[::-1, ::-1] # Đảo ngược thứ tự cột
-    height, width = single_foot_matrix.shape
 
-    # Tìm hàng đầu tiên và hàng cuối cùng có pixel bàn chân
-    row_indices = np.where(single_foot_matrix > 0)[0]
-    if len(row_indices) == 0:
+    # Prefix số pixel theo hàng: hàng đầu/cuối và diện tích 3 vùng lấy ra không cần quét lại ma trận
+    stats = FootRegionStats(np.count_nonzero(single_foot_matrix, axis=1))
+    if not stats.has_foot:
         return None, "No foot detected in this half"
 
-    top_row = row_indices.min()
-    bottom_row = row_indices.max()
-    foot_length = bottom_row - top_row + 1
-
     # Xử lý trường hợp foot_length quá nhỏ (ví dụ: < 3 hàng)
-    if foot_length < 3:
+    if stats.length < 3:
         return None, "Detected foot area is too small"
 
-    # Xác định khoảng cách chia 3 phần
-    third = foot_length // 3
-    # Đảm bảo các vùng không bị chồng chéo hoặc bỏ sót pixel do làm tròn
-    row_div1 = top_row + third
-    row_div2 = top_row + 2 * third
-
-    # Xác định 3 vùng (đảm bảo index hợp lệ)
-    heel_region = single_foot_matrix[top_row : row_div1, :]
-    midfoot_region = single_foot_matrix[row_div1 : row_div2, :]
-    forefoot_region = single_foot_matrix[row_div2 : bottom_row + 1, :]
-
-    # Tính tổng số pixel có giá trị trong từng vùng
-    S_heel = np.count_nonzero(heel_region)
-    S_midfoot = np.count_nonzero(midfoot_region)
-    S_forefoot = np.count_nonzero(forefoot_region)
+    # Tổng số pixel có giá trị trong gót / giữa / mũi bàn chân
+    S_heel, S_midfoot, S_forefoot = stats.band_areas(3)
+    S_midfoot = S_midfoot - midfoot_offset
 
     # Tính AI
     total_area = S_heel + S_midfoot + S_forefoot
     if total_area == 0:
-        # Trường hợp này không nên xảy ra nếu row_indices không rỗng, nhưng kiểm tra lại
+        # Trường hợp này không nên xảy ra nếu có pixel bàn chân, nhưng kiểm tra lại
         return None, "No valid pixels found after region splitting"
 
     AI = S_midfoot / total_area
@@ -231,7 +403,7 @@ def _calculate_single_foot_ai(single_foot_matrix: np.ndarray):
     return AI, foot_type
 
 # --- HÀM CHÍNH ĐÃ SỬA ĐỔI ---
-def compute_arch_index(foot_matrix_processed: np.ndarray):
+def compute_arch_index(foot_matrix_processed: np.ndarray, segmentation: str = "components", midfoot_offset: int = 0):
     """
     Tính toán chỉ số Arch Index (AI) riêng biệt cho chân trái và chân phải
     từ ma trận bàn chân 60x60 đã được xử lý.
@@ -239,6 +411,10 @@ def compute_arch_index(foot_matrix_processed: np.ndarray):
     Args:
         foot_matrix_processed: Ma trận NumPy (60x60) đã qua các bước xử lý
                                (convert_values, noise removal, toes removal).
+        segmentation: "components" (mặc định): tìm hai bàn chân bằng find_feet và tính AI trên
+                      từng bàn chân, không phụ thuộc vị trí đặt chân; "halves": chia đôi theo cột,
+                      xoay ma trận rồi tính lại khi một bên có AI = 0 (cách cũ).
+        midfoot_offset: Số pixel trừ vào diện tích vùng giữa trước khi tính AI (xem ANALYSIS_PROFILES).
     Returns:
         dict: Dictionary chứa kết quả AI và loại bàn chân cho 'left' và 'right'.
               Ví dụ: {'left': {'AI': 0.25, 'type': 'Normal Foot'},
@@ -248,6 +424,12 @@ def compute_arch_index(foot_matrix_processed: np.ndarray):
     if not check_data(foot_matrix_processed):
         return {"left": {"AI": None, "type": "Invalid input data"},
                 "right": {"AI": None, "type": "Invalid input data"}}
+    if segmentation == SEGMENT_COMPONENTS:
+        out = np.zeros(1, dtype=AI_RESULT_DTYPE)
+        _arch_index_batch(foot_matrix_processed[None], out, SEGMENT_COMPONENTS, midfoot_offset)
+        return result_to_dict(out[0])
+    if segmentation != SEGMENT_HALVES:
+        raise ValueError(f"Unknown segmentation: {segmentation}")
     foot_matrix_processed = np.flip(foot_matrix_processed,axis = 0)
     foot_matrix_processed = foot_matrix_processed[::-1, ::-1] # Đảo ngược thứ tự cột
     rows, cols = foot_matrix_processed.shape
@@ -258,15 +440,15 @@ def compute_arch_index(foot_matrix_processed: np.ndarray):
     right_foot_matrix = foot_matrix_processed[:, mid_col:] # Cột 30 đến 59
 
     # Tính toán AI cho từng nửa
-    left_ai, left_type = _calculate_single_foot_ai(left_foot_matrix)
-    right_ai, right_type = _calculate_single_foot_ai(right_foot_matrix)
+    left_ai, left_type = _calculate_single_foot_ai(left_foot_matrix, midfoot_offset)
+    right_ai, right_type = _calculate_single_foot_ai(right_foot_matrix, midfoot_offset)
     if left_ai == 0 or right_ai == 0:
         # foot_matrix_processed_spin=spin_matrix(foot_matrix_processed)
         # left_foot_matrix = foot_matrix_processed_spin[:, :mid_col] # Cột 0 đến 29
         # right_foot_matrix = foot_matrix_processed_spin[:, mid_col:]
         # left_ai, left_type = _calculate_single_foot_ai(left_foot_matrix)
         # right_ai, right_type = _calculate_single_foot_ai(right_foot_matrix) 
-        return compute_arch_index(spin_matrix(foot_matrix_processed)) # Gọi lại hàm để tính toán lại
+        return compute_arch_index(spin_matrix(foot_matrix_processed), SEGMENT_HALVES, midfoot_offset) # Gọi lại hàm để tính toán lại
     # Trả về kết quả dưới dạng dictionary
    
 
@@ -350,6 +532,782 @@ def reverse_matrix(matrix: np.ndarray) -> np.ndarray:
     reversed_matrix = np.flip(matrix)
     return reversed_matrix
 
+# === PIPELINE TÍNH ARCH INDEX MỘT LẦN QUA (HỖ TRỢ BATCH) ===
+
+# Kiểu dữ liệu kết quả của ArchIndexPipeline.process_batch (AI = NaN nếu không tính được)
+AI_RESULT_DTYPE = np.dtype([("left_AI", "f8"), ("right_AI", "f8"),
+                            ("left_type", "U48"), ("right_type", "U48")])
+
+# Chỉ số mở rộng của từng bàn chân (foot_metrics_batch), dạng (N,2): [:, 0] chân 'left', [:, 1] chân 'right'.
+# contact_AI: AI theo diện tích như compute_arch_index; pressure_AI: tải vùng giữa / tổng tải, cùng ba vùng;
+# cop_row/cop_col: tâm áp lực (hàng, cột của ma trận); peak: giá trị pixel lớn nhất; load: tổng giá trị pixel;
+# area: số pixel; region_load: tỉ lệ tải của gót, giữa, mũi. Giá trị không tính được là NaN.
+FOOT_METRICS_DTYPE = np.dtype([("contact_AI", "f8"), ("pressure_AI", "f8"), ("cop_row", "f8"), ("cop_col", "f8"),
+                               ("peak", "f8"), ("load", "f8"), ("area", "i8"), ("region_load", "f8", (3,)),
+                               ("type", "U48")])
+
+PIPELINE_STAGES = ("resample", "convert", "isolated", "toes", "toes_remain", "arch_index")
+
+# compute_arch_index xoay 90 độ rồi tính lại khi một bên có AI = 0; sau 4 lần xoay sẽ lặp lại
+_MAX_ORIENTATIONS = 4
+
+# Tách hai bàn chân (find_feet)
+SEGMENT_COMPONENTS = "components" # gán nhãn thành phần liên thông, tính AI trên từng bàn chân
+SEGMENT_HALVES = "halves"         # chia đôi ma trận theo cột, xoay rồi tính lại nếu một bên có AI = 0 (cách cũ)
+SEGMENTATIONS = (SEGMENT_COMPONENTS, SEGMENT_HALVES)
+MIN_COMPONENT_AREA = 4   # Thành phần nhỏ hơn (nhiễu còn sót) không thuộc bàn chân nào
+MIN_COMPONENT_EXTENT = 3 # Thành phần cao hoặc rộng dưới 3 pixel (vd. một hàng cảm biến lỗi) bị bỏ
+MIN_FOOT_AREA = 20       # Nhóm nhỏ hơn không được coi là một bàn chân
+FOOT_AXIS_NONE, FOOT_AXIS_ROWS, FOOT_AXIS_COLS = -1, 0, 1
+
+# Bộ tham số đặt tên cho ArchIndexPipeline (chọn bằng ArchIndexPipeline.from_profile):
+#   "default": tham số mặc định của các hàm trong module này.
+#   "reverse": cấu hình của data/reverse.py trước đây - không bỏ hàng ngón chân (toes_remove threshold=0),
+#              bỏ cụm ngón chân sót lại ngắn hơn 20 pixel, trừ 60 pixel vào diện tích vùng giữa và chia
+#              đôi ma trận như compute_arch_index cũ.
+#   "clinic":  "default" với toes_threshold=15 - dùng ở trang Create/Load và mặc định của reanalyze, để
+#              kết quả lưu kèm lần đo (trường "arch_index", khóa bằng hash tham số) dùng lại được khi xem.
+# Các tham số tính theo pixel của lưới 60x60 nên cả hai profile resample ma trận về lưới này trước khi tính.
+DEFAULT_PROFILE = "default"
+CLINIC_PROFILE = "clinic"
+ANALYSIS_PROFILES = {
+    "default": {"input_max": 5.0, "toes_threshold": 10, "rows_to_check": 5, "start_row": 5, "end_row": 12,
+                "connectivity_threshold": 15, "midfoot_offset": 0, "segmentation": SEGMENT_COMPONENTS,
+                "analysis_shape": ANALYSIS_GEOMETRY.shape},
+    "clinic": {"input_max": 5.0, "toes_threshold": 15, "rows_to_check": 5, "start_row": 5, "end_row": 12,
+               "connectivity_threshold": 15, "midfoot_offset": 0, "segmentation": SEGMENT_COMPONENTS,
+               "analysis_shape": ANALYSIS_GEOMETRY.shape},
+    "reverse": {"input_max": 5.0, "toes_threshold": 0, "rows_to_check": 5, "start_row": 5, "end_row": 12,
+                "connectivity_threshold": 20, "midfoot_offset": 60, "segmentation": SEGMENT_HALVES,
+                "analysis_shape": ANALYSIS_GEOMETRY.shape},
+}
+
+
+def _classify_ai(ai: np.ndarray) -> np.ndarray:
+    """Phân loại bàn chân theo AI (giống _calculate_single_foot_ai), AI NaN -> chuỗi rỗng."""
+    return np.select([ai < 0.21, ai <= 0.26, ai > 0.26],
+                     ["High Arch Foot", "Normal Foot", "Flat Foot"], default="")
+
+
+class FootRegionStats:
+    """
+    Tổng tích lũy (prefix sum) số pixel theo từng hàng dọc chiều dài bàn chân, tính một lần cho
+    một bàn chân, hai bàn chân hoặc cả batch. Diện tích của bất kỳ đoạn hàng nào (gót / giữa / mũi,
+    hoặc chia N vùng) là hiệu hai giá trị prefix, không phải quét lại ma trận.
+
+    profiles có dạng (..., L): ví dụ (L,) cho một bàn chân, (N,2,L) cho hai chân của N scan
+    (xem foot_profiles). Mọi kết quả có dạng (...) hoặc (..., bands).
+
+    Ví dụ:
+        stats = FootRegionStats.from_matrix(processed)   # hai chân của một scan, dạng (2, L)
+        heel, midfoot, forefoot = stats.band_areas(3).T  # diện tích 3 vùng của chân trái/phải
+        zones = stats.band_fractions(5)                  # tỉ lệ diện tích 5 vùng
+    """
+
+    def __init__(self, profiles: np.ndarray):
+        profiles = np.asarray(profiles)
+        length = profiles.shape[-1]
+        self.prefix = np.zeros(profiles.shape[:-1] + (length + 1,), dtype=np.result_type(profiles.dtype, np.int64))
+        np.cumsum(profiles, axis=-1, out=self.prefix[..., 1:])
+        occupied = profiles > 0
+        self.has_foot = occupied.any(axis=-1)
+        self.top = np.argmax(occupied, axis=-1)
+        self.bottom = length - 1 - np.argmax(occupied[..., ::-1], axis=-1)
+        self.length = np.where(self.has_foot, self.bottom - self.top + 1, 0)
+
+    @classmethod
+    def from_matrix(cls, foot_matrix_processed: np.ndarray, segmentation: str = "components") -> "FootRegionStats":
+        """Tách hai bàn chân của ma trận đã xử lý (H,W) hoặc chồng (N,H,W) rồi tính prefix cho cả hai."""
+        return cls(foot_profiles(foot_matrix_processed, segmentation)[0])
+
+    def _at(self, rows) -> np.ndarray:
+        """prefix tại các hàng: một giá trị cho mỗi bàn chân (...) hoặc k giá trị (..., k)."""
+        rows = np.asarray(rows)
+        batch = self.prefix.shape[:-1]
+        if rows.ndim <= len(batch):
+            return np.take_along_axis(self.prefix, np.broadcast_to(rows, batch)[..., None], axis=-1)[..., 0]
+        return np.take_along_axis(self.prefix, np.broadcast_to(rows, batch + rows.shape[-1:]), axis=-1)
+
+    def area(self, start, stop) -> np.ndarray:
+        """Số pixel trong các hàng [start, stop) (chỉ số tuyệt đối dọc chiều dài chân)."""
+        return self._at(np.asarray(stop)) - self._at(np.asarray(start))
+
+    def band_edges(self, bands: int = 3) -> np.ndarray:
+        """
+        Biên của `bands` vùng từ hàng đầu tới hàng cuối của bàn chân, dạng (..., bands+1).
+        Mỗi vùng cao length // bands hàng, vùng cuối nhận phần dư (với 3 vùng: gót, giữa, mũi
+        giống _calculate_single_foot_ai).
+        """
+        if bands < 1:
+            raise ValueError(f"bands must be >= 1, got {bands}")
+        step = self.length // bands
+        edges = self.top[..., None] + step[..., None] * np.arange(bands + 1)
+        edges[..., -1] = np.where(self.has_foot, self.bottom + 1, self.top)
+        return edges
+
+    def segment_sums(self, edges: np.ndarray) -> np.ndarray:
+        """Tổng giữa các biên liên tiếp (..., k+1) -> (..., k), vd. tải theo biên vùng của một profile khác."""
+        return np.diff(self._at(edges), axis=-1)
+
+    def band_areas(self, bands: int = 3) -> np.ndarray:
+        """Diện tích (số pixel) từng vùng, dạng (..., bands)."""
+        return self.segment_sums(self.band_edges(bands))
+
+    def total_area(self) -> np.ndarray:
+        return self.prefix[..., -1]
+
+    def band_fractions(self, bands: int = 3) -> np.ndarray:
+        """Tỉ lệ diện tích từng vùng trên tổng diện tích bàn chân (NaN nếu không có chân)."""
+        areas = self.band_areas(bands).astype(np.float64)
+        total = self.total_area()[..., None]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(total > 0, areas / total, np.nan)
+
+    def arch_index(self, midfoot_offset: int = 0) -> np.ndarray:
+        """
+        AI = (diện tích vùng giữa - midfoot_offset) / (tổng diện tích - midfoot_offset), NaN nếu không có
+        chân, chân ngắn hơn 3 hàng hoặc mẫu số bằng 0.
+        """
+        if not midfoot_offset:
+            ai = self.band_fractions(3)[..., 1]
+            return np.where(self.length >= 3, ai, np.nan)
+        midfoot = self.band_areas(3)[..., 1] - midfoot_offset
+        total = self.total_area() - midfoot_offset
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where((self.length >= 3) & (total != 0), midfoot / total, np.nan)
+
+    def foot_types(self, ai: np.ndarray | None = None, midfoot_offset: int = 0) -> np.ndarray:
+        """Loại bàn chân theo AI (giống _calculate_single_foot_ai) hoặc thông báo lỗi."""
+        ai = self.arch_index(midfoot_offset) if ai is None else ai
+        foot_type = np.select([self.length < 3, self.total_area() == midfoot_offset],
+                              ["Detected foot area is too small", "No valid pixels found after region splitting"],
+                              default=_classify_ai(ai))
+        return np.where(self.has_foot, foot_type, "No foot detected in this half").astype(AI_RESULT_DTYPE["left_type"])
+
+
+def _halves_profiles(stack: np.ndarray, midfoot_offset: int = 0):
+    """
+    Profile hai nửa theo cách chia đôi của compute_arch_index (N,H,W) -> (N,2,L), kể cả bước xoay
+    ma trận khi một bên có AI = 0. Nửa 'left' là các cột bên trái của ma trận gốc.
+    Returns:
+        tuple: (profiles, unresolved, empty_half, turns) - unresolved: scan mà compute_arch_index gốc sẽ
+               đệ quy vô hạn; empty_half (N,2): nửa không có cột nào (ma trận rộng 1 cột);
+               turns (N,): số lần đã xoay ma trận trước khi chia đôi.
+    """
+    n, rows, cols = stack.shape
+    profiles = np.zeros((n, 2, max(rows, cols)), dtype=np.int64)
+    unresolved = np.zeros(n, dtype=bool)
+    empty_half = np.zeros((n, 2), dtype=bool)
+    turns = np.zeros(n, dtype=np.int64)
+    pending = np.arange(n)
+    oriented = stack
+    for _ in range(_MAX_ORIENTATIONS):
+        height, width = oriented.shape[1:]
+        mid_col = width // 2
+        # compute_arch_index đảo cột trước khi chia đôi: nửa trái sau khi đảo là width-mid_col cột cuối
+        # của ma trận và được trả về dưới khóa 'right'. Đếm pixel theo hàng không phụ thuộc thứ tự cột.
+        counts = np.stack([np.count_nonzero(oriented[:, :, :width - mid_col], axis=2),
+                           np.count_nonzero(oriented[:, :, width - mid_col:], axis=2)], axis=1)
+        profiles[pending] = 0
+        profiles[pending, :, :height] = counts
+        empty_half[pending] = [width - mid_col == 0, mid_col == 0]
+        retry = (FootRegionStats(counts).arch_index(midfoot_offset) == 0).any(axis=1)
+        if not retry.any():
+            return profiles, unresolved, empty_half, turns
+        pending = pending[retry]
+        turns[pending] += 1
+        # Giống compute_arch_index(spin_matrix(...)): đảo cột rồi chuyển vị
+        oriented = np.swapaxes(oriented[retry][:, :, ::-1], 1, 2)
+    turns[pending] -= 1 # Lần xoay cuối không được dùng để chia đôi
+    unresolved[pending] = True
+    return profiles, unresolved, empty_half, turns
+
+
+def _group_intervals(image: np.ndarray, lo: np.ndarray, hi: np.ndarray, span: int) -> np.ndarray:
+    """Gộp các đoạn [lo, hi] chồng nhau trong cùng một ảnh thành nhóm. Trả về mã nhóm (0..G-1) của từng đoạn."""
+    order = np.lexsort((lo, image))
+    base = image[order] * span
+    reach = np.maximum.accumulate(base + hi[order]) # hi lớn nhất đã gặp, mã hóa kèm số ảnh
+    new_group = np.ones(order.size, dtype=bool)
+    new_group[1:] = reach[:-1] < base[1:] + lo[order][1:]
+    groups = np.empty(order.size, dtype=np.int64)
+    groups[order] = np.cumsum(new_group) - 1
+    return groups
+
+
+def find_feet(mask: np.ndarray, min_component_area: int = MIN_COMPONENT_AREA,
+              min_component_extent: int = MIN_COMPONENT_EXTENT, min_foot_area: int = MIN_FOOT_AREA,
+              with_labels: bool = False):
+    """
+    Tìm hai bàn chân trong mask (H,W) hoặc (N,H,W) trong một lần gán nhãn.
+
+    Thành phần liên thông quá nhỏ (ít hơn min_component_area pixel, hoặc cao/rộng dưới
+    min_component_extent như một hàng cảm biến lỗi) bị bỏ. Các thành phần còn lại chồng nhau theo
+    cột được gộp thành một bàn chân (gót, mũi, ngón chân tách rời vẫn thuộc cùng bàn chân). Nếu được
+    ít hơn hai bàn chân thì thử gộp theo hàng (hai chân đặt dọc theo cột của thảm, tương đương bước
+    xoay ma trận của compute_arch_index). Hai nhóm lớn nhất (ít nhất min_foot_area pixel) là hai chân.
+
+    Returns:
+        dict: với N ma trận
+            "orientation": (N,) FOOT_AXIS_ROWS (chiều dài chân theo hàng), FOOT_AXIS_COLS, hoặc
+                           FOOT_AXIS_NONE khi không tách được hai chân;
+            "bbox": (N,2,4) [top, bottom, left, right] (bao gồm) của chân 'left' và 'right'
+                    (chân có tâm nhỏ hơn theo hướng ngang là 'left'), -1 nếu không có;
+            "area": (N,2) số pixel của mỗi chân;
+            "profile": (N,2,L) số pixel theo từng vị trí dọc chiều dài chân, theo đúng chiều
+                       compute_arch_index dùng để chia gót / giữa / mũi;
+            "count": số thành phần liên thông;
+            "component_foot": (count,) bên (0 = 'left', 1 = 'right', -1 = không thuộc chân nào) của từng nhãn;
+            "labels": nhãn thành phần liên thông (như label_components), chỉ khi with_labels=True.
+    """
+    mask = np.asarray(mask) > 0
+    single = mask.ndim == 2
+    stack = mask[None] if single else mask
+    n, rows, cols = stack.shape
+    index, starts, ends, run_labels, count = _label_runs(stack)
+    run_image, run_row = index[0], index[1]
+    run_length = ends - starts
+
+    # Thống kê từng thành phần từ các run (nhãn 1..count -> chỉ số 0..count-1)
+    comp = run_labels - 1
+    area = np.bincount(comp, weights=run_length, minlength=count).astype(np.int64)
+    # Run theo thứ tự (ảnh, hàng): hàng trên cùng / dưới cùng là hàng của run đầu / cuối của thành phần
+    top = np.empty(count, dtype=np.int64); top[comp[::-1]] = run_row[::-1]
+    bottom = np.empty(count, dtype=np.int64); bottom[comp] = run_row
+    left = np.full(count, cols); np.minimum.at(left, comp, starts)
+    right = np.full(count, -1); np.maximum.at(right, comp, ends - 1)
+    comp_image = np.empty(count, dtype=np.int64); comp_image[comp] = run_image
+    keep = ((area >= min_component_area) & (bottom - top + 1 >= min_component_extent)
+            & (right - left + 1 >= min_component_extent))
+
+    orientation = np.full(n, FOOT_AXIS_NONE, dtype=np.int8)
+    foot_of_comp = np.full(count, -1, dtype=np.int64) # vị trí image*2 + bên, -1 nếu không thuộc chân nào
+    bbox = np.full((n, 2, 4), -1, dtype=np.int64)
+    foot_area = np.zeros((n, 2), dtype=np.int64)
+    kept = np.flatnonzero(keep)
+    for axis, lo, hi in ((FOOT_AXIS_ROWS, left, right), (FOOT_AXIS_COLS, top, bottom)):
+        candidates = kept[orientation[comp_image[kept]] == FOOT_AXIS_NONE]
+        if candidates.size == 0:
+            break
+        groups = _group_intervals(comp_image[candidates], lo[candidates], hi[candidates], max(rows, cols) + 1)
+        n_groups = groups.max() + 1
+        group_area = np.bincount(groups, weights=area[candidates], minlength=n_groups)
+        group_image = np.zeros(n_groups, dtype=np.int64); group_image[groups] = comp_image[candidates]
+        group_lo = np.full(n_groups, max(rows, cols)); np.minimum.at(group_lo, groups, lo[candidates])
+        group_hi = np.full(n_groups, -1); np.maximum.at(group_hi, groups, hi[candidates])
+        # Hai nhóm lớn nhất của mỗi ảnh
+        order = np.lexsort((-group_area, group_image))
+        first_of_image = np.ones(n_groups, dtype=bool)
+        first_of_image[1:] = group_image[order][1:] != group_image[order][:-1]
+        rank = np.arange(n_groups) - np.maximum.accumulate(np.where(first_of_image, np.arange(n_groups), 0))
+        chosen = order[(rank < 2) & (group_area[order] >= min_foot_area)]
+        feet_per_image = np.bincount(group_image[chosen], minlength=n)
+        chosen = chosen[feet_per_image[group_image[chosen]] == 2]
+        if chosen.size == 0:
+            continue
+        # Bên trái/phải theo vị trí tâm của nhóm theo hướng ngang
+        chosen = chosen[np.lexsort((group_lo[chosen] + group_hi[chosen], group_image[chosen]))]
+        side = np.tile([0, 1], chosen.size // 2)
+        slot_of_group = np.full(n_groups, -1, dtype=np.int64)
+        slot_of_group[chosen] = group_image[chosen] * 2 + side
+        foot_of_comp[candidates] = slot_of_group[groups]
+        orientation[group_image[chosen]] = axis
+
+    foot_runs = foot_of_comp[comp]
+    in_foot = foot_runs >= 0
+    slot = foot_runs[in_foot]
+    foot_area.reshape(-1)[:] = np.bincount(slot, weights=run_length[in_foot], minlength=2 * n)
+    flat_bbox = bbox.reshape(-1, 4)
+    for k, values, reducer in ((0, run_row, np.minimum), (1, run_row, np.maximum),
+                               (2, starts, np.minimum), (3, ends - 1, np.maximum)):
+        column = np.full(2 * n, rows + cols if reducer is np.minimum else -1, dtype=np.int64)
+        reducer.at(column, slot, values[in_foot])
+        flat_bbox[:, k] = np.where(foot_area.reshape(-1) > 0, column, -1)
+
+    # Profile dọc chiều dài chân: theo hàng, hoặc theo cột đảo ngược khi chân nằm dọc theo cột
+    # (giống compute_arch_index(spin_matrix(M[:, ::-1])) tính trên hàng của ma trận đã xoay)
+    length = max(rows, cols)
+    by_rows = orientation[run_image[in_foot]] == FOOT_AXIS_ROWS
+    profile = np.bincount(slot[by_rows] * length + run_row[in_foot][by_rows], weights=run_length[in_foot][by_rows],
+                          minlength=2 * n * length).astype(np.int64).reshape(2 * n, length)
+    by_cols = ~by_rows
+    if by_cols.any():
+        delta = (np.bincount(slot[by_cols] * (cols + 1) + starts[in_foot][by_cols], minlength=2 * n * (cols + 1))
+                 - np.bincount(slot[by_cols] * (cols + 1) + ends[in_foot][by_cols], minlength=2 * n * (cols + 1)))
+        col_profile = np.cumsum(delta.reshape(2 * n, cols + 1), axis=1)[:, :cols][:, ::-1]
+        transposed = np.repeat(orientation == FOOT_AXIS_COLS, 2)
+        profile[transposed, :cols] = col_profile[transposed]
+
+    result = {"orientation": orientation, "bbox": bbox, "area": foot_area,
+              "profile": profile.reshape(n, 2, length), "count": count,
+              "component_foot": np.where(foot_of_comp >= 0, foot_of_comp % 2, -1)}
+    if with_labels:
+        result["labels"] = _paint_runs(stack.shape, index, starts, ends, run_labels)
+    if single:
+        for key in ("orientation", "bbox", "area", "profile", "labels"):
+            if key in result:
+                result[key] = result[key][0]
+    return result
+
+
+def foot_profiles(foot_matrix_processed: np.ndarray, segmentation: str = "components", midfoot_offset: int = 0):
+    """
+    Số pixel theo từng hàng dọc chiều dài của hai bàn chân, dạng (N,2,L) (hoặc (2,L) với một ma trận).
+    segmentation như compute_arch_index; với "components", scan không tách được hai chân dùng cách chia đôi
+    (midfoot_offset ảnh hưởng tới bước xoay của cách chia đôi).
+    Returns:
+        tuple: (profiles, unresolved) - unresolved (N,) đánh dấu scan không xác định được hướng chân.
+    """
+    stack = np.asarray(foot_matrix_processed)
+    single = stack.ndim == 2
+    profiles, unresolved, _ = _foot_profiles(stack[None] if single else stack, segmentation, midfoot_offset)
+    return (profiles[0], unresolved[0]) if single else (profiles, unresolved)
+
+
+def _foot_profiles(stack: np.ndarray, segmentation: str, midfoot_offset: int = 0):
+    if segmentation == SEGMENT_HALVES:
+        return _halves_profiles(stack, midfoot_offset)[:3]
+    if segmentation != SEGMENT_COMPONENTS:
+        raise ValueError(f"Unknown segmentation: {segmentation}")
+    feet = find_feet(stack)
+    profiles = feet["profile"]
+    unresolved = np.zeros(stack.shape[0], dtype=bool)
+    empty_half = np.zeros((stack.shape[0], 2), dtype=bool)
+    fallback = feet["orientation"] == FOOT_AXIS_NONE
+    if fallback.any():
+        profiles[fallback], unresolved[fallback], empty_half[fallback], _ = _halves_profiles(stack[fallback], midfoot_offset)
+    return profiles, unresolved, empty_half
+
+
+def _arch_index_batch(stack: np.ndarray, out: np.ndarray, segmentation: str, midfoot_offset: int = 0):
+    """compute_arch_index cho cả batch: tách hai chân một lần, AI lấy từ prefix theo hàng."""
+    profiles, unresolved, empty_half = _foot_profiles(stack, segmentation, midfoot_offset)
+    stats = FootRegionStats(profiles)
+    ai = stats.arch_index(midfoot_offset)
+    foot_type = stats.foot_types(ai, midfoot_offset)
+    foot_type[empty_half] = "Invalid data for single foot"
+    for side, key in enumerate(("left", "right")):
+        out[f"{key}_AI"] = ai[:, side]
+        out[f"{key}_type"] = foot_type[:, side]
+    out["left_AI"][unresolved] = out["right_AI"][unresolved] = np.nan
+    out["left_type"][unresolved] = out["right_type"][unresolved] = "Could not determine foot orientation"
+
+
+# Sau k lần xoay của _halves_profiles, chiều dài chân nằm theo (trục, đảo chiều) của ma trận gốc
+_TURN_AXES = ((FOOT_AXIS_ROWS, False), (FOOT_AXIS_COLS, True), (FOOT_AXIS_ROWS, True), (FOOT_AXIS_COLS, False))
+
+
+def _halves_sides(rows: int, cols: int) -> np.ndarray:
+    """Bên (0/1) của từng pixel (rows, cols) sau k = 0.._MAX_ORIENTATIONS-1 lần xoay của _halves_profiles, dạng (K,rows,cols)."""
+    sides = np.empty((_MAX_ORIENTATIONS, rows, cols), dtype=np.int8)
+    for k in range(_MAX_ORIENTATIONS):
+        height, width = (rows, cols) if k % 2 == 0 else (cols, rows)
+        side = np.broadcast_to(np.arange(width) >= width - width // 2, (height, width))
+        for _ in range(k): # Ngược lại bước xoay: X = Y.T[:, ::-1]
+            side = side.T[:, ::-1]
+        sides[k] = side
+    return sides
+
+
+def _foot_metrics_batch(stack: np.ndarray, out: np.ndarray, segmentation: str, midfoot_offset: int = 0):
+    """
+    Chỉ số mở rộng cho cả batch (N,H,W) -> out (N,2) FOOT_METRICS_DTYPE. Mỗi pixel được gán bên như
+    cách tách của _foot_profiles; với mỗi bên, tổng theo hàng và theo cột của số pixel và của giá trị
+    pixel cho ra profile diện tích / tải dọc chiều dài chân, tâm áp lực và tổng tải trong cùng một lần.
+    """
+    n, rows, cols = stack.shape
+    length = max(rows, cols)
+    unresolved = np.zeros(n, dtype=bool)
+    empty_half = np.zeros((n, 2), dtype=bool)
+    axis = np.full(n, FOOT_AXIS_ROWS, dtype=np.int8)
+    reverse = np.zeros(n, dtype=bool)
+    if segmentation == SEGMENT_HALVES:
+        side_map = np.empty(stack.shape, dtype=np.int8)
+        fallback = np.ones(n, dtype=bool)
+    elif segmentation == SEGMENT_COMPONENTS:
+        feet = find_feet(stack, with_labels=True)
+        side_of_label = np.concatenate(([-1], feet["component_foot"])).astype(np.int8)
+        side_map = side_of_label[feet["labels"]]
+        by_cols = feet["orientation"] == FOOT_AXIS_COLS
+        axis[by_cols], reverse[by_cols] = FOOT_AXIS_COLS, True
+        fallback = feet["orientation"] == FOOT_AXIS_NONE
+    else:
+        raise ValueError(f"Unknown segmentation: {segmentation}")
+    if fallback.any():
+        _, unresolved[fallback], empty_half[fallback], turns = _halves_profiles(stack[fallback], midfoot_offset)
+        side_map[fallback] = _halves_sides(rows, cols)[turns]
+        turn_axes = np.array(_TURN_AXES)[turns]
+        axis[fallback], reverse[fallback] = turn_axes[:, 0], turn_axes[:, 1]
+
+    contact_profile = np.zeros((n, 2, length), dtype=np.int64)
+    load_profile = np.zeros((n, 2, length))
+    cop = np.zeros((n, 2, 2))
+    peak = np.zeros((n, 2))
+    nonzero = stack != 0
+    by_cols = axis == FOOT_AXIS_COLS
+    for side in (0, 1):
+        contact = nonzero & (side_map == side)
+        load = np.where(contact, stack, 0)
+        load_rows, load_cols = load.sum(axis=2, dtype=np.float64), load.sum(axis=1, dtype=np.float64)
+        for profile, along_rows, along_cols in ((contact_profile, contact.sum(axis=2), contact.sum(axis=1)),
+                                                (load_profile, load_rows, load_cols)):
+            profile[~by_cols, side, :rows] = along_rows[~by_cols]
+            profile[by_cols, side, :cols] = along_cols[by_cols]
+        cop[:, side, 0] = load_rows @ np.arange(rows)
+        cop[:, side, 1] = load_cols @ np.arange(cols)
+        peak[:, side] = load.max(axis=(1, 2))
+    for profile in (contact_profile, load_profile): # Chiều dài chân ngược chiều trục của ma trận
+        for flipped, size in ((reverse & ~by_cols, rows), (reverse & by_cols, cols)):
+            profile[flipped, :, :size] = profile[flipped, :, size - 1::-1]
+
+    contact = FootRegionStats(contact_profile)
+    load = FootRegionStats(load_profile)
+    total = load.total_area()
+    region_load = load.segment_sums(contact.band_edges(3))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        region_load = np.where(total[..., None] > 0, region_load / total[..., None], np.nan)
+        cop /= total[..., None]
+
+    ai = contact.arch_index(midfoot_offset)
+    foot_type = contact.foot_types(ai, midfoot_offset)
+    foot_type[empty_half] = "Invalid data for single foot"
+    out["contact_AI"] = ai
+    out["pressure_AI"] = np.where(contact.length >= 3, region_load[..., 1], np.nan)
+    out["cop_row"] = cop[..., 0]
+    out["cop_col"] = cop[..., 1]
+    out["peak"] = np.where(contact.has_foot, peak, np.nan)
+    out["load"] = total
+    out["area"] = contact.total_area()
+    out["region_load"] = region_load
+    out["type"] = foot_type
+    _invalidate_metrics(out, unresolved, "Could not determine foot orientation")
+
+
+def _invalidate_metrics(out: np.ndarray, scans: np.ndarray, message: str):
+    """Đánh dấu các scan (mask (N,)) không tính được chỉ số: mọi giá trị NaN / 0, type = message."""
+    rows = out[scans]
+    for name in ("contact_AI", "pressure_AI", "cop_row", "cop_col", "peak", "load", "region_load"):
+        rows[name] = np.nan
+    rows["area"] = 0
+    rows["type"] = message
+    out[scans] = rows
+
+
+def foot_metrics_batch(foot_matrix_processed: np.ndarray, segmentation: str = "components",
+                       midfoot_offset: int = 0) -> np.ndarray:
+    """
+    Chỉ số mở rộng của hai bàn chân cho ma trận đã xử lý (H,W) hoặc chồng (N,H,W): AI theo diện tích
+    (như compute_arch_index), AI theo áp lực, tâm áp lực, áp lực đỉnh và tỉ lệ tải ba vùng.
+    Returns:
+        np.ndarray: Mảng có cấu trúc FOOT_METRICS_DTYPE dạng (N,2) (hoặc (2,) với một ma trận).
+    """
+    stack = np.asarray(foot_matrix_processed)
+    single = stack.ndim == 2
+    stack = stack[None] if single else stack
+    out = np.zeros((stack.shape[0], 2), dtype=FOOT_METRICS_DTYPE)
+    _foot_metrics_batch(stack, out, segmentation, midfoot_offset)
+    return out[0] if single else out
+
+
+def compute_foot_metrics(foot_matrix_processed: np.ndarray, segmentation: str = "components",
+                         midfoot_offset: int = 0) -> dict:
+    """
+    Như compute_arch_index nhưng trả về thêm các chỉ số theo áp lực (xem FOOT_METRICS_DTYPE).
+    Returns:
+        dict: {'left': {'AI', 'type', 'pressure_AI', 'cop', 'peak', 'load', 'area', 'region_load'}, 'right': {...}}
+    """
+    if not check_data(foot_matrix_processed):
+        error = {"AI": None, "type": "Invalid input data"}
+        return {"left": dict(error), "right": dict(error)}
+    return metrics_to_dict(foot_metrics_batch(foot_matrix_processed, segmentation, midfoot_offset))
+
+
+def metrics_to_dict(row) -> dict:
+    """Chuyển hai phần tử FOOT_METRICS_DTYPE (chân 'left', 'right') sang dict, NaN -> None."""
+    def value(x):
+        x = float(x)
+        return None if np.isnan(x) else x
+
+    def side(foot):
+        cop = (value(foot["cop_row"]), value(foot["cop_col"]))
+        return {"AI": value(foot["contact_AI"]), "type": str(foot["type"]),
+                "pressure_AI": value(foot["pressure_AI"]),
+                "cop": None if cop[0] is None else cop,
+                "peak": value(foot["peak"]), "load": value(foot["load"]), "area": int(foot["area"]),
+                "region_load": dict(zip(("heel", "midfoot", "forefoot"), map(value, foot["region_load"])))}
+    return {"left": side(row[0]), "right": side(row[1])}
+
+class ArchIndexPipeline:
+    """
+    Chuỗi convert_values -> Isolated_point_removal -> toes_remove -> toes_remain_removes ->
+    compute_arch_index được gộp lại, cấu hình một lần và chạy trên bộ đệm uint8 cấp phát sẵn.
+
+    Kết quả giống hệt khi gọi lần lượt các hàm trên với cùng tham số. Thời gian mỗi bước được
+    cộng dồn vào stage_times (giây) để đo hiệu năng.
+
+    analysis_shape = (rows, cols): ma trận có lưới khác (vd. thảm 30x30 hoặc 64x128) được resample về
+    lưới này trước convert_values (components/sensor_geometry.py), để các tham số tính theo pixel
+    giữ nguyên ý nghĩa. None: tính trực tiếp trên lưới của dữ liệu.
+
+    Ví dụ:
+        pipeline = ArchIndexPipeline(input_max=5.0, toes_threshold=15)
+        any_mat = ArchIndexPipeline(toes_threshold=15, analysis_shape=(60, 60)) # thảm bất kỳ -> lưới 60x60
+        reverse = ArchIndexPipeline.from_profile("reverse") # tham số của data/reverse.py
+        ai_results = pipeline.process(matrix)        # dict giống compute_arch_index
+        table = pipeline.process_batch(stack)        # mảng có cấu trúc AI_RESULT_DTYPE
+        metrics = pipeline.process_metrics_batch(stack) # (N,2) FOOT_METRICS_DTYPE
+    """
+
+    def __init__(self, input_max: float = 5.0, toes_threshold: int = 10, rows_to_check: int = 5,
+                 start_row: int = 5, end_row: int = 12, connectivity_threshold: int = 15,
+                 segmentation: str = SEGMENT_COMPONENTS, midfoot_offset: int = 0,
+                 analysis_shape: tuple[int, int] | None = None):
+        if segmentation not in SEGMENTATIONS:
+            raise ValueError(f"Unknown segmentation: {segmentation}")
+        if analysis_shape is not None and (len(analysis_shape) != 2 or min(analysis_shape) <= 0):
+            raise ValueError(f"Invalid analysis shape: {analysis_shape}")
+        self.input_max = input_max
+        self.toes_threshold = toes_threshold
+        self.rows_to_check = rows_to_check
+        self.start_row = start_row
+        self.end_row = end_row
+        self.connectivity_threshold = connectivity_threshold
+        self.segmentation = segmentation # cách tách hai bàn chân, xem compute_arch_index
+        self.midfoot_offset = midfoot_offset # số pixel trừ vào diện tích vùng giữa
+        self.analysis_shape = None if analysis_shape is None else tuple(int(v) for v in analysis_shape)
+
+        self._capacity = 0
+        self._frame_shape = None
+        self._scaled = None   # bộ đệm float cho convert_values
+        self._work = None     # bộ đệm uint8 dùng xuyên suốt các bước
+        self._nonzero = None  # bộ đệm bool: pixel > 0
+        self._neighbor = None # bộ đệm bool: có lân cận khác 0
+        self.reset_stats()
+
+    def params(self) -> dict:
+        """Các tham số cấu hình của pipeline (dùng để ghi kèm kết quả AI)."""
+        return {"input_max": float(self.input_max),
+                "toes_threshold": int(self.toes_threshold),
+                "rows_to_check": int(self.rows_to_check),
+                "start_row": int(self.start_row),
+                "end_row": int(self.end_row),
+                "connectivity_threshold": int(self.connectivity_threshold),
+                "segmentation": self.segmentation,
+                "midfoot_offset": int(self.midfoot_offset),
+                "analysis_shape": None if self.analysis_shape is None else list(self.analysis_shape)}
+
+    @classmethod
+    def from_profile(cls, name: str = DEFAULT_PROFILE, **overrides) -> "ArchIndexPipeline":
+        """Tạo pipeline theo một bộ tham số trong ANALYSIS_PROFILES; overrides ghi đè từng tham số."""
+        if name not in ANALYSIS_PROFILES:
+            raise ValueError(f"Unknown analysis profile: {name}")
+        return cls(**{**ANALYSIS_PROFILES[name], **overrides})
+
+    def reset_stats(self):
+        """Đặt lại bộ đếm thời gian từng bước."""
+        self.stage_times = dict.fromkeys(PIPELINE_STAGES, 0.0)
+        self.scans_processed = 0
+
+    def _ensure_buffers(self, n: int, rows: int, cols: int, scaled_dtype: np.dtype):
+        """Cấp phát (hoặc mở rộng) bộ đệm khi batch lớn hơn hoặc kích thước ma trận thay đổi."""
+        if self._frame_shape != (rows, cols) or n > self._capacity:
+            capacity = max(n, self._capacity if self._frame_shape == (rows, cols) else 0)
+            self._work = np.empty((capacity, rows, cols), dtype=np.uint8)
+            self._nonzero = np.empty((capacity, rows, cols), dtype=bool)
+            self._neighbor = np.empty((capacity, max(rows - 2, 0), max(cols - 2, 0)), dtype=bool)
+            self._scaled = None
+            self._capacity = capacity
+            self._frame_shape = (rows, cols)
+        if self._scaled is None or self._scaled.dtype != scaled_dtype:
+            self._scaled = np.empty((self._capacity, rows, cols), dtype=scaled_dtype)
+
+    def _convert(self, stack: np.ndarray, work: np.ndarray, scaled: np.ndarray, invalid: np.ndarray):
+        """convert_values ghi thẳng vào bộ đệm (cùng phép tính nên cùng kết quả)."""
+        if self.input_max == 0:
+            work[...] = 0
+            return
+        np.divide(stack, self.input_max, out=scaled)
+        np.multiply(scaled, 255.0, out=scaled)
+        np.clip(scaled, 0, 255, out=scaled)
+        if invalid.any():
+            scaled[invalid] = 0 # tránh ép kiểu NaN/Inf; các scan này được đánh dấu lỗi
+        np.copyto(work, scaled, casting="unsafe")
+
+    def _isolated(self, work: np.ndarray, nonzero: np.ndarray, neighbor: np.ndarray):
+        """Isolated_point_removal tại chỗ: với dữ liệu uint8, tổng lân cận = 0 khi mọi lân cận = 0."""
+        rows, cols = work.shape[1:]
+        if rows < 3 or cols < 3:
+            return
+        if _backend == BACKEND_NUMBA: # uint8 không âm nên kernel ghi tại chỗ được
+            archindex_jit.isolated_point_removal(work, work, True)
+            return
+        np.greater(work, 0, out=nonzero)
+        inner = (slice(None), slice(1, rows - 1), slice(1, cols - 1))
+        neighbor[...] = False
+        for di, dj in _WINDOW_OFFSETS:
+            if di == 0 and dj == 0:
+                continue
+            np.logical_or(neighbor, nonzero[:, 1 + di:rows - 1 + di, 1 + dj:cols - 1 + dj], out=neighbor)
+        np.logical_not(neighbor, out=neighbor)
+        np.logical_and(neighbor, nonzero[inner], out=neighbor)
+        work[inner][neighbor] = 0
+
+    def _toes(self, work: np.ndarray, has_foot: np.ndarray):
+        """toes_remove cho cả batch: xóa các hàng đầu có ít pixel cho tới hàng đầu tiên đủ ngưỡng."""
+        if _backend == BACKEND_NUMBA:
+            archindex_jit.toes_remove(work, self.toes_threshold, self.rows_to_check, has_foot)
+            return
+        n, rows, _ = work.shape
+        occupied = work.any(axis=2)
+        has_foot[...] = occupied.any(axis=1)
+        top_row = np.argmax(occupied, axis=1)
+        bottom_row = rows - 1 - np.argmax(occupied[:, ::-1], axis=1)
+        # toes_remove chỉ xét min(rows_to_check, chiều cao bàn chân) hàng, tính từ hàng 0 của ma trận
+        rows_checked = np.minimum(self.rows_to_check, bottom_row - top_row + 1)
+        limit = min(self.rows_to_check, rows)
+        if limit <= 0:
+            return
+        counts = np.count_nonzero(work[:, :limit, :], axis=2)
+        row_idx = np.arange(limit)
+        in_range = row_idx[None, :] < rows_checked[:, None]
+        reached = in_range & (counts >= self.toes_threshold)
+        stop_row = np.where(reached.any(axis=1), np.argmax(reached, axis=1), rows_checked)
+        clear = (row_idx[None, :] < stop_row[:, None]) & (counts < self.toes_threshold) & (counts > 0)
+        work[:, :limit, :][clear] = 0
+
+    def _toes_remain(self, work: np.ndarray):
+        """toes_remain_removes tại chỗ (run-length encoding trên cả batch)."""
+        rows = work.shape[1]
+        start_row = min(self.start_row, rows)
+        end_row = min(self.end_row, rows)
+        if start_row >= end_row:
+            return
+        if _backend == BACKEND_NUMBA:
+            archindex_jit.toes_remain_removes(work, start_row, end_row, self.connectivity_threshold)
+            return
+        short_mask = _short_run_mask(work, start_row, end_row, self.connectivity_threshold)
+        work[:, start_row:end_row, :][short_mask] = 0
+
+    def _arch_index(self, work: np.ndarray, out: np.ndarray):
+        """compute_arch_index cho cả batch với cách tách bàn chân đã cấu hình."""
+        _arch_index_batch(work, out, self.segmentation, self.midfoot_offset)
+
+    def _prepare(self, stack: np.ndarray):
+        """
+        Chạy các bước tiền xử lý (resample -> convert -> toes_remain) vào bộ đệm.
+        Returns:
+            tuple: (work, no_foot, invalid) - work (N,H,W) uint8 trên lưới phân tích; no_foot/invalid (N,)
+                   đánh dấu scan không có pixel nào sau toes_remove / có NaN, Inf.
+        """
+        n = stack.shape[0]
+        if np.issubdtype(stack.dtype, np.inexact):
+            invalid = ~np.isfinite(stack).all(axis=(1, 2)) # check_data: NaN / Inf
+        else:
+            invalid = np.zeros(n, dtype=bool)
+        t_start = time.perf_counter()
+        if self.analysis_shape is not None:
+            stack = resample(stack, self.analysis_shape)
+        _, rows, cols = stack.shape
+        scaled_dtype = (np.zeros(1, dtype=stack.dtype) / 1.0).dtype
+        self._ensure_buffers(n, rows, cols, scaled_dtype)
+        work = self._work[:n]
+        has_foot = np.empty(n, dtype=bool)
+
+        t0 = time.perf_counter()
+        self._convert(stack, work, self._scaled[:n], invalid)
+        t1 = time.perf_counter()
+        self._isolated(work, self._nonzero[:n], self._neighbor[:n])
+        t2 = time.perf_counter()
+        self._toes(work, has_foot)
+        t3 = time.perf_counter()
+        self._toes_remain(work)
+        t4 = time.perf_counter()
+        for stage, elapsed in zip(PIPELINE_STAGES, (t0 - t_start, t1 - t0, t2 - t1, t3 - t2, t4 - t3)):
+            self.stage_times[stage] += elapsed
+        # toes_remove trả về lỗi khi không có pixel nào -> không tính được AI cho cả hai chân
+        return work, ~has_foot & ~invalid, invalid
+
+    @staticmethod
+    def _as_stack(stack: np.ndarray) -> np.ndarray:
+        stack = np.asarray(stack)
+        if stack.ndim == 2:
+            stack = stack[None]
+        if stack.ndim != 3:
+            raise ValueError(f"Expected an (N,H,W) stack, got shape {stack.shape}")
+        return stack
+
+    def process_batch(self, stack: np.ndarray) -> np.ndarray:
+        """
+        Xử lý một chồng ma trận cảm biến thô (N,H,W) (hoặc một ma trận (H,W)).
+        Returns:
+            np.ndarray: Mảng có cấu trúc AI_RESULT_DTYPE độ dài N với các trường
+                        (left_AI, right_AI, left_type, right_type). AI = NaN nếu không tính được.
+        """
+        stack = self._as_stack(stack)
+        n, rows, cols = stack.shape
+        out = np.zeros(n, dtype=AI_RESULT_DTYPE)
+        if n == 0:
+            return out
+        if rows == 0 or cols == 0:
+            out["left_AI"] = out["right_AI"] = np.nan
+            out["left_type"] = out["right_type"] = "Invalid input data"
+            return out
+
+        work, no_foot, invalid = self._prepare(stack)
+        t0 = time.perf_counter()
+        self._arch_index(work, out)
+        self.stage_times["arch_index"] += time.perf_counter() - t0
+
+        out["left_AI"][no_foot] = out["right_AI"][no_foot] = np.nan
+        out["left_type"][no_foot] = out["right_type"][no_foot] = "No foot detected in this half"
+        out["left_AI"][invalid] = out["right_AI"][invalid] = np.nan
+        out["left_type"][invalid] = out["right_type"][invalid] = "Invalid input data"
+        self.scans_processed += n
+        return out
+
+    def process(self, matrix: np.ndarray) -> dict:
+        """Xử lý một ma trận và trả về dict giống compute_arch_index (AI = None nếu không tính được)."""
+        return result_to_dict(self.process_batch(matrix)[0])
+
+    def process_metrics_batch(self, stack: np.ndarray) -> np.ndarray:
+        """
+        Như process_batch nhưng trả về chỉ số mở rộng (AI theo diện tích và theo áp lực, tâm áp lực,
+        áp lực đỉnh, tỉ lệ tải ba vùng) trên giá trị 0-255 sau tiền xử lý.
+        Returns:
+            np.ndarray: Mảng có cấu trúc FOOT_METRICS_DTYPE dạng (N,2); contact_AI/type giống process_batch.
+        """
+        stack = self._as_stack(stack)
+        n, rows, cols = stack.shape
+        out = np.zeros((n, 2), dtype=FOOT_METRICS_DTYPE)
+        if n == 0:
+            return out
+        if rows == 0 or cols == 0:
+            _invalidate_metrics(out, np.ones(n, dtype=bool), "Invalid input data")
+            return out
+
+        work, no_foot, invalid = self._prepare(stack)
+        t0 = time.perf_counter()
+        _foot_metrics_batch(work, out, self.segmentation, self.midfoot_offset)
+        self.stage_times["arch_index"] += time.perf_counter() - t0
+
+        _invalidate_metrics(out, no_foot, "No foot detected in this half")
+        _invalidate_metrics(out, invalid, "Invalid input data")
+        self.scans_processed += n
+        return out
+
+    def process_metrics(self, matrix: np.ndarray) -> dict:
+        """Xử lý một ma trận và trả về dict giống compute_foot_metrics."""
+        return metrics_to_dict(self.process_metrics_batch(matrix)[0])
+
+
+def result_to_dict(row) -> dict:
+    """Chuyển một phần tử AI_RESULT_DTYPE sang dict {'left': {'AI', 'type'}, 'right': {...}}."""
+    def side(ai, foot_type):
+        ai = float(ai)
+        return {"AI": None if np.isnan(ai) else ai, "type": str(foot_type)}
+    return {"left": side(row["left_AI"], row["left_type"]),
+            "right": side(row["right_AI"], row["right_type"])}
+
 # ===============================
 
 # if __name__ == '__main__':
@@ -0,0 +1,118 @@
+# --- START OF FILE components/archindex_jit.py ---
+"""
+Kernel duyệt từng pixel cho các bước tiền xử lý của components/archindex.py, biên dịch bằng Numba
+(@njit) khi numba được cài. Không có numba thì AVAILABLE = False, archindex dùng bản vector hóa NumPy
+và các hàm dưới đây vẫn chạy được như Python thường (chậm, chỉ dùng để đối chiếu).
+
+Mọi kernel làm việc trên chồng ma trận (N,H,W) và cho kết quả giống hệt bản NumPy / bản loop cũ:
+    - isolated_point_removal: tổng cửa sổ 3x3 cộng theo đúng thứ tự pairwise của np.sum nên khớp
+      từng bit cả với dữ liệu float; với dữ liệu không dấu (uint8 của pipeline) chỉ cần kiểm tra
+      8 lân cận đều bằng 0, không cộng nên không lo tràn số.
+    - toes_remove: như toes_remove (chỉ xét các hàng đầu của ma trận), ghi tại chỗ.
+    - toes_remain_removes: state machine theo cột như bản cũ, ghi tại chỗ.
+"""
+
+try:
+    import numba
+except ImportError: # numba là tùy chọn
+    numba = None
+
+import numpy as np
+
+AVAILABLE = numba is not None
+
+
+def _jit(func):
+    """@njit(cache=True, nogil=True) khi có numba, giữ nguyên hàm Python nếu không."""
+    return numba.njit(cache=True, nogil=True)(func) if AVAILABLE else func
+
+
+@_jit
+def isolated_point_removal(src, out, unsigned):
+    """
+    out[k, i, j] = 0 với mọi điểm trong (bỏ viền) của src có giá trị > 0 và tổng 8 lân cận = 0.
+    unsigned=True khi src không âm (kiểu không dấu): tổng = 0 đúng khi mọi lân cận = 0.
+    out có thể là chính src khi dữ liệu không âm: điểm bị xóa có mọi lân cận = 0 nên không ảnh
+    hưởng tới phép thử của điểm nào khác.
+    """
+    n, rows, cols = src.shape
+    for k in range(n):
+        for i in range(1, rows - 1):
+            for j in range(1, cols - 1):
+                center = src[k, i, j]
+                if not center > 0: # kể cả NaN, như bản gốc
+                    continue
+                if unsigned:
+                    isolated = True
+                    for di in range(-1, 2):
+                        for dj in range(-1, 2):
+                            if (di != 0 or dj != 0) and src[k, i + di, j + dj] != 0:
+                                isolated = False
+                    if isolated:
+                        out[k, i, j] = 0
+                else:
+                    window_sum = (((src[k, i - 1, j - 1] + src[k, i - 1, j]) + (src[k, i - 1, j + 1] + src[k, i, j - 1]))
+                                  + ((center + src[k, i, j + 1]) + (src[k, i + 1, j - 1] + src[k, i + 1, j])))
+                    window_sum = window_sum + src[k, i + 1, j + 1]
+                    if window_sum - center == 0:
+                        out[k, i, j] = 0
+
+
+@_jit
+def toes_remove(stack, threshold, rows_to_check, has_foot):
+    """toes_remove tại chỗ cho từng ma trận; has_foot[k] = False nếu ma trận k không có pixel > 0."""
+    n, rows, cols = stack.shape
+    for k in range(n):
+        top_row = -1
+        bottom_row = -1
+        for i in range(rows):
+            for j in range(cols):
+                if stack[k, i, j] > 0:
+                    if top_row < 0:
+                        top_row = i
+                    bottom_row = i
+                    break
+        has_foot[k] = top_row >= 0
+        if top_row < 0:
+            continue
+        # Như bản gốc: xét min(rows_to_check, chiều cao bàn chân) hàng, tính từ hàng 0 của ma trận
+        for row in range(min(rows_to_check, bottom_row - top_row + 1)):
+            count = 0
+            for j in range(cols):
+                if stack[k, row, j] != 0:
+                    count += 1
+            if 0 < count < threshold:
+                for j in range(cols):
+                    stack[k, row, j] = 0
+            elif count >= threshold:
+                break
+
+
+@_jit
+def toes_remain_removes(stack, start_row, end_row, connectivity_threshold):
+    """toes_remain_removes tại chỗ: xóa các cụm pixel > 0 liên tiếp ngắn hơn ngưỡng trong hàng start_row..end_row-1."""
+    n, rows, cols = stack.shape
+    for k in range(n):
+        for row in range(min(start_row, rows), min(end_row, rows)):
+            cluster_start = -1
+            for col in range(cols + 1):
+                if col < cols and stack[k, row, col] > 0:
+                    if cluster_start < 0:
+                        cluster_start = col
+                elif cluster_start >= 0:
+                    if col - cluster_start < connectivity_threshold:
+                        for c in range(cluster_start, col):
+                            stack[k, row, c] = 0
+                    cluster_start = -1
+
+
+def is_unsigned(matrix: np.ndarray) -> bool:
+    """Tham số unsigned của isolated_point_removal cho dtype của matrix."""
+    return matrix.dtype == np.bool_ or np.issubdtype(matrix.dtype, np.unsignedinteger)
+
+
+def as_stack(matrix: np.ndarray) -> np.ndarray:
+    """View (N,H,W) của một ma trận (H,W) hoặc chồng ma trận."""
+    return matrix[None] if matrix.ndim == 2 else matrix
+
+# --- END OF FILE components/archindex_jit.py ---
@@ -0,0 +1,141 @@
+# --- START OF FILE components/frame_averager.py ---
+"""
+Làm mượt theo thời gian các frame cảm biến đọc trực tiếp và chọn frame ổn định nhất để chụp.
+
+FrameAverager nhận từng frame (push) và cập nhật tại chỗ một bộ tích lũy float32, không duyệt lại
+lịch sử:
+    - "ema": trung bình mũ với hằng số thời gian tính bằng giây, hệ số alpha = 1 - exp(-dt / tau)
+      theo khoảng thời gian thực giữa hai frame, nên độ mượt không phụ thuộc tốc độ frame.
+    - "window": trung bình của `window` frame gần nhất (tổng trượt: trừ frame cũ, cộng frame mới).
+    - "off": không làm mượt, chỉ theo dõi frame ổn định nhất.
+Đồng thời giữ `best_of` frame gần nhất cùng độ lệch với frame trước/sau (tổng |chênh lệch| chia cho
+tổng áp lực của frame); best_frame() trả về frame có độ lệch nhỏ nhất, tức lúc bàn chân đứng yên nhất.
+"""
+
+import math
+import threading
+import time
+
+import numpy as np
+
+SMOOTHING_OFF = "off"
+SMOOTHING_EMA = "ema"
+SMOOTHING_WINDOW = "window"
+SMOOTHING_MODES = (SMOOTHING_OFF, SMOOTHING_EMA, SMOOTHING_WINDOW)
+
+DEFAULT_TIME_CONSTANT = 0.3 # giây
+DEFAULT_WINDOW = 8
+DEFAULT_BEST_OF = 15
+
+
+class FrameAverager:
+    """
+    Bộ làm mượt frame dùng chung giữa thread đọc serial (push) và GUI (average, best_frame).
+    Mọi thao tác được khóa nên gọi được từ hai thread khác nhau.
+    """
+
+    def __init__(self, shape: tuple[int, int], mode: str = SMOOTHING_EMA, time_constant: float = DEFAULT_TIME_CONSTANT,
+                 window: int = DEFAULT_WINDOW, best_of: int = DEFAULT_BEST_OF):
+        if mode not in SMOOTHING_MODES:
+            raise ValueError(f"Chế độ làm mượt không hợp lệ: {mode}")
+        if time_constant <= 0 or window < 1 or best_of < 1:
+            raise ValueError("time_constant phải > 0, window và best_of phải >= 1.")
+        self.shape = tuple(shape)
+        self.mode = mode
+        self.time_constant = time_constant
+        self.window = window
+        self.best_of = best_of
+        self._lock = threading.Lock()
+        self._acc = np.zeros(self.shape, dtype=np.float32)     # EMA hoặc tổng trượt
+        self._scratch = np.empty(self.shape, dtype=np.float32)
+        self._ring = np.zeros((window,) + self.shape, dtype=np.float32) if mode == SMOOTHING_WINDOW else None
+        self._recent = np.zeros((best_of,) + self.shape, dtype=np.int64) # Frame gốc cho best_frame()
+        self._diff_prev = np.full(best_of, np.inf) # Độ lệch (chưa chuẩn hóa) với frame trước
+        self._diff_next = np.full(best_of, np.inf) # ... với frame sau (inf khi chưa có frame sau)
+        self._totals = np.zeros(best_of)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._acc.fill(0)
+            if self._ring is not None:
+                self._ring.fill(0)
+            self._diff_prev.fill(np.inf)
+            self._diff_next.fill(np.inf)
+            self._totals.fill(0)
+            self.frames = 0
+            self._last_time = None
+
+    def push(self, frame: np.ndarray, timestamp: float | None = None):
+        """Thêm một frame (rows, cols). timestamp (giây, đồng hồ đơn điệu) mặc định là thời điểm gọi."""
+        if frame.shape != self.shape:
+            raise ValueError(f"Frame {frame.shape} khác kích thước {self.shape}.")
+        now = time.monotonic() if timestamp is None else timestamp
+        with self._lock:
+            slot = self.frames % self.best_of
+            if self.frames:
+                prev = (self.frames - 1) % self.best_of
+                np.subtract(frame, self._recent[prev], out=self._scratch, casting="unsafe")
+                diff = float(np.abs(self._scratch, out=self._scratch).sum())
+                self._diff_next[prev] = diff
+                self._diff_prev[slot] = diff
+            else:
+                self._diff_prev[slot] = np.inf
+            self._diff_next[slot] = np.inf
+            self._recent[slot] = frame
+            self._totals[slot] = float(frame.sum())
+
+            if self.mode == SMOOTHING_EMA:
+                if self._last_time is None:
+                    self._acc[...] = frame
+                else:
+                    alpha = 1.0 - math.exp(-max(now - self._last_time, 0.0) / self.time_constant)
+                    np.subtract(frame, self._acc, out=self._scratch, casting="unsafe")
+                    self._scratch *= alpha
+                    self._acc += self._scratch
+            elif self.mode == SMOOTHING_WINDOW:
+                ring_slot = self.frames % self.window
+                self._acc -= self._ring[ring_slot]
+                self._ring[ring_slot] = frame
+                self._acc += self._ring[ring_slot]
+            self._last_time = now
+            self.frames += 1
+
+    def average(self) -> np.ndarray | None:
+        """Frame đã làm mượt (float32, bản sao), None nếu chưa có frame hoặc chế độ 'off'."""
+        with self._lock:
+            if not self.frames or self.mode == SMOOTHING_OFF:
+                return None
+            if self.mode == SMOOTHING_WINDOW:
+                return self._acc / np.float32(min(self.frames, self.window))
+            return self._acc.copy()
+
+    def stability_scores(self) -> np.ndarray:
+        """
+        Độ lệch chuẩn hóa của các frame đang giữ (theo thứ tự slot): max(lệch với frame trước, lệch với
+        frame sau) / tổng áp lực. Frame toàn 0 (không có chân) là inf. Frame duy nhất có độ lệch 0.
+        """
+        with self._lock:
+            return self._scores()
+
+    def _scores(self) -> np.ndarray:
+        count = min(self.frames, self.best_of)
+        prev, nxt = self._diff_prev[:count], self._diff_next[:count]
+        # Frame mới nhất chưa có frame sau, frame đầu tiên không có frame trước: chỉ dùng phía còn lại
+        diffs = np.where(np.isinf(prev), nxt, np.where(np.isinf(nxt), prev, np.maximum(prev, nxt)))
+        diffs[np.isinf(diffs)] = 0
+        totals = self._totals[:count]
+        return np.where(totals > 0, diffs / np.maximum(totals, 1), np.inf)
+
+    def best_frame(self) -> tuple[np.ndarray, float] | None:
+        """(bản sao frame ổn định nhất trong best_of frame gần nhất, độ lệch chuẩn hóa), None nếu chưa có frame."""
+        with self._lock:
+            if not self.frames:
+                return None
+            scores = self._scores()
+            best = int(np.argmin(scores))
+            if np.isinf(scores[best]): # Toàn frame trống -> lấy frame mới nhất
+                best = (self.frames - 1) % self.best_of
+            return self._recent[best].copy(), float(scores[best])
+
+# --- END OF FILE components/frame_averager.py ---
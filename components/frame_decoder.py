@@ -0,0 +1,292 @@
+# --- START OF FILE components/frame_decoder.py ---
+"""
+Giải mã frame dữ liệu cảm biến gửi qua serial dạng ASCII.
+
+Firmware gửi mỗi frame là `rows` dòng CSV số nguyên, các frame cách nhau bởi dòng '-----'.
+decode_frame() chuyển cả frame sang ndarray bằng một lần np.fromstring. Dòng không đúng định dạng
+(ký tự lạ, dấu +/-, ô trống, thiếu/thừa ô) được giải mã riêng bằng parse_row() với quy tắc cũ
+(ô lỗi/thiếu -> 0, ô thừa bị bỏ qua) rồi ghép lại trước khi chuyển.
+
+AsciiFrameAssembler nhận các khối bytes đọc từ cổng serial và trả về các frame hoàn chỉnh.
+
+Chế độ nhị phân (tùy chọn, chọn bằng negotiate_protocol()): mỗi gói gồm
+    sync (4 byte AA 55 A5 5A) | số thứ tự frame (uint16) | rows (uint8) | cols (uint8)
+    | rows*cols giá trị uint16 | CRC-16/CCITT (init 0xFFFF) của phần header + payload (uint16)
+tất cả little-endian. BinaryFrameReader đọc gói bằng readinto vào một bytearray cấp sẵn
+và chuyển payload sang ndarray bằng np.frombuffer.
+"""
+
+import binascii
+import re
+import struct
+import time
+
+import numpy as np
+
+FRAME_SEPARATOR = b"-----"
+
+_INT64_MIN, _INT64_MAX = -2**63, 2**63 - 1
+_DIGITS_AND_COMMAS = b"0123456789,"
+_WHITESPACE = b" \t\r\v\f"
+# Ô trống hoặc chữ số bị ngắt bởi khoảng trắng ("1 2") -> không dùng đường nhanh
+_IRREGULAR_CELL = re.compile(rb"(?:^|,)[ \t\r\v\f]*(?:,|$)|\d[ \t\r\v\f]+\d")
+
+
+def parse_row(line: str, cols: int) -> list[int]:
+    """Tách một dòng CSV thành đúng `cols` giá trị int (ô lỗi/thiếu -> 0)."""
+    row_values = []
+    parts = line.split(',')
+    for i in range(cols):
+        value = 0
+        if i < len(parts):
+            p_stripped = parts[i].strip()
+            if p_stripped:
+                try: value = int(p_stripped)
+                except ValueError: pass # Lỗi thì value vẫn là 0
+        row_values.append(value)
+    return row_values
+
+
+def split_rows(raw: bytes) -> list[bytes]:
+    """Tách bytes của frame thành các dòng đã bỏ khoảng trắng hai đầu, bỏ dòng trống (giống readline + strip trước đây)."""
+    rows = []
+    for line in raw.split(b"\n"):
+        if line.isascii():
+            line = line.strip()
+            if line:
+                rows.append(line)
+        elif line.decode("utf-8", errors="ignore").strip():
+            rows.append(line)
+    return rows
+
+
+def _is_regular(text: bytes, cells: int) -> bool:
+    """text (một hoặc nhiều dòng đã nối bằng ',') có đúng `cells` ô số nguyên không dấu hợp lệ không."""
+    if text.count(b",") != cells - 1:
+        return False
+    rest = text.translate(None, _DIGITS_AND_COMMAS)
+    if not rest: # Chỉ có chữ số và dấu phẩy: chỉ cần kiểm tra ô trống
+        return b",," not in text and not text.startswith(b",") and not text.endswith(b",")
+    return not rest.translate(None, _WHITESPACE) and _IRREGULAR_CELL.search(text) is None
+
+
+def _canonical_row(line: bytes, cols: int) -> bytes:
+    """Giải mã dòng lỗi bằng parse_row() rồi viết lại thành đúng `cols` ô hợp lệ."""
+    row_values = parse_row(line.decode("utf-8", errors="ignore").strip(), cols)
+    # Số vượt quá int64 bị chặn ở giới hạn, giống np.fromstring
+    return b",".join(b"%d" % min(max(v, _INT64_MIN), _INT64_MAX) for v in row_values)
+
+
+def decode_frame(raw: bytes, rows: int, cols: int, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Giải mã bytes của một frame (các dòng CSV nằm giữa hai dấu '-----').
+    Args:
+        raw (bytes): Nội dung frame, các dòng cách nhau bởi '\\n' (dòng trống được bỏ qua).
+        rows, cols (int): Kích thước frame mong đợi.
+        out (np.ndarray, optional): Mảng (rows, cols) để ghi kết quả, tránh cấp phát mới.
+    Returns:
+        np.ndarray: Ma trận int64 (rows, cols); ô lỗi/thiếu là 0, ô thừa bị bỏ qua,
+                    số vượt quá int64 bị chặn ở giới hạn.
+    Raises:
+        ValueError: Nếu số dòng khác rows.
+    """
+    lines = split_rows(raw)
+    if len(lines) != rows:
+        raise ValueError(f"Frame có {len(lines)} dòng, cần {rows} dòng.")
+    return _decode_lines(lines, cols, out)
+
+
+def _decode_lines(lines: list[bytes], cols: int, out: np.ndarray | None = None) -> np.ndarray:
+    rows = len(lines)
+    if out is None:
+        out = np.zeros((rows, cols), dtype=np.int64)
+    text = b",".join(lines)
+    if not (all(line.count(b",") == cols - 1 for line in lines) and _is_regular(text, rows * cols)):
+        # Có dòng lỗi: chỉ các dòng đó được giải mã lại bằng parse_row()
+        text = b",".join(line if _is_regular(line, cols) else _canonical_row(line, cols) for line in lines)
+    out[...] = np.fromstring(text, dtype=np.int64, sep=",").reshape(rows, cols)
+    return out
+
+
+class AsciiFrameAssembler:
+    """
+    Ghép các khối bytes đọc từ serial thành frame: bắt đầu sau dòng chứa '-----', hoàn thành khi
+    đủ `rows` dòng không trống. Gặp '-----' khi frame chưa đủ dòng thì frame đó bị hủy (partial)
+    và dấu này mở frame tiếp theo.
+    """
+
+    def __init__(self, rows: int, cols: int, max_frame_bytes: int | None = None):
+        self.rows = rows
+        self.cols = cols
+        # Giới hạn bộ đệm khi dữ liệu rác không có dấu xuống dòng/dấu phân cách
+        self.max_frame_bytes = max_frame_bytes or rows * cols * 16
+        self._buffer = bytearray()
+        self._in_frame = False
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {"frames": 0, "partial": 0, "overflow": 0}
+
+    def reset(self):
+        """Bỏ dữ liệu đang đệm, chờ dấu '-----' tiếp theo."""
+        self._buffer.clear()
+        self._in_frame = False
+
+    def feed(self, data: bytes) -> list[np.ndarray]:
+        """Thêm bytes vừa đọc, trả về danh sách các frame vừa hoàn thành (có thể rỗng)."""
+        buf = self._buffer
+        buf += data
+        frames = []
+        while True:
+            sep_at = buf.find(FRAME_SEPARATOR)
+            sep_line = buf.rfind(b"\n", 0, sep_at) + 1 if sep_at >= 0 else -1
+            if not self._in_frame:
+                if sep_at < 0:
+                    del buf[:buf.rfind(b"\n") + 1] # Bỏ các dòng ngoài frame
+                    break
+                sep_end = buf.find(b"\n", sep_at)
+                if sep_end < 0:
+                    del buf[:sep_line]
+                    break
+                del buf[:sep_end + 1]
+                self._in_frame = True
+                continue
+
+            region_end = sep_line if sep_at >= 0 else len(buf)
+            complete_end = buf.rfind(b"\n", 0, region_end) + 1
+            if buf.count(b"\n", 0, complete_end) >= self.rows:
+                lines = split_rows(bytes(buf[:complete_end]))
+                if len(lines) >= self.rows:
+                    frames.append(_decode_lines(lines[:self.rows], self.cols))
+                    self.stats["frames"] += 1
+                    self._in_frame = False
+                    del buf[:complete_end] # Dòng thừa sau frame bị bỏ qua như trước
+                    continue
+            if sep_at >= 0:
+                if split_rows(bytes(buf[:sep_line])):
+                    self.stats["partial"] += 1
+                self._in_frame = False
+                del buf[:sep_line]
+                continue
+            if len(buf) > self.max_frame_bytes:
+                self.stats["overflow"] += 1
+                self.reset()
+            break
+        return frames
+
+
+# --- Binary protocol ---
+
+PROTOCOL_ASCII = "ascii"
+PROTOCOL_BINARY = "binary"
+PROTOCOL_AUTO = "auto"
+PROTOCOLS = (PROTOCOL_AUTO, PROTOCOL_ASCII, PROTOCOL_BINARY)
+
+BINARY_SYNC = b"\xaa\x55\xa5\x5a"
+BINARY_HANDSHAKE = b"MODE BIN\n" # Host gửi để yêu cầu firmware chuyển sang chế độ nhị phân
+BINARY_ACK = b"OK BIN"           # Firmware trả lời khi đã chuyển
+_BINARY_HEADER = struct.Struct("<HBB") # frame counter, rows, cols
+
+
+def binary_packet_size(rows: int, cols: int) -> int:
+    return len(BINARY_SYNC) + _BINARY_HEADER.size + rows * cols * 2 + 2
+
+
+def encode_binary_frame(matrix: np.ndarray, counter: int) -> bytes:
+    """Đóng gói một frame theo định dạng nhị phân (dùng cho giả lập firmware và kiểm thử)."""
+    rows, cols = matrix.shape
+    body = _BINARY_HEADER.pack(counter & 0xFFFF, rows, cols) + np.asarray(matrix, dtype="<u2").tobytes()
+    return BINARY_SYNC + body + struct.pack("<H", binascii.crc_hqx(body, 0xFFFF))
+
+
+def negotiate_protocol(port, timeout: float = 0.5) -> str:
+    """
+    Hỏi firmware có hỗ trợ chế độ nhị phân không: gửi BINARY_HANDSHAKE và chờ dòng BINARY_ACK.
+    Firmware cũ không hiểu lệnh, vẫn gửi CSV -> hết thời gian chờ thì dùng chế độ ASCII.
+    Args:
+        port: Cổng serial đã mở (cần write, readline, reset_input_buffer).
+        timeout (float): Thời gian chờ trả lời (giây).
+    Returns:
+        str: PROTOCOL_BINARY hoặc PROTOCOL_ASCII.
+    """
+    try:
+        port.reset_input_buffer()
+        port.write(BINARY_HANDSHAKE)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            line = port.readline()
+            if BINARY_ACK in line:
+                return PROTOCOL_BINARY
+    except Exception as e:
+        print(f"Handshake error, falling back to ASCII: {e}")
+    return PROTOCOL_ASCII
+
+
+class BinaryFrameReader:
+    """
+    Đọc gói nhị phân từ cổng serial. Cả gói (kể cả sync) được đọc bằng readinto vào một bytearray
+    cấp sẵn; gói lỗi (sai sync, sai kích thước, sai CRC) thì tìm sync tiếp theo ngay trong dữ liệu
+    đã đọc, không đọc lại từng byte.
+    """
+
+    def __init__(self, port, rows: int, cols: int):
+        self.port = port
+        self.rows = rows
+        self.cols = cols
+        self._packet = bytearray(binary_packet_size(rows, cols))
+        self._view = memoryview(self._packet)
+        self._filled = 0
+        self._payload_start = len(BINARY_SYNC) + _BINARY_HEADER.size
+        self._last_counter = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        """frames: gói hợp lệ; crc_errors: gói sai CRC/kích thước; lost: frame bị mất theo số thứ tự; resyncs: số lần mất đồng bộ."""
+        self.stats = {"frames": 0, "crc_errors": 0, "lost": 0, "resyncs": 0}
+
+    def _resync(self, count_error: bool):
+        if count_error:
+            self.stats["crc_errors"] += 1
+        self.stats["resyncs"] += 1
+        # Giữ lại phần sau, bắt đầu từ sync kế tiếp (hoặc vài byte cuối có thể là đầu của sync)
+        next_sync = self._packet.find(BINARY_SYNC, 1, self._filled)
+        keep_from = next_sync if next_sync >= 0 else max(1, self._filled - len(BINARY_SYNC) + 1)
+        remaining = self._filled - keep_from
+        self._packet[:remaining] = self._packet[keep_from:self._filled]
+        self._filled = remaining
+
+    def read_frame(self):
+        """
+        Đọc tiếp dữ liệu có sẵn (chờ tối đa timeout của cổng). Trả về ndarray int64 (rows, cols)
+        khi đủ một gói hợp lệ, ngược lại None (gọi lại để đọc tiếp).
+        """
+        size = len(self._packet)
+        while True:
+            if self._filled < size:
+                n = self.port.readinto(self._view[self._filled:])
+                if not n:
+                    return None
+                self._filled += n
+                if self._filled >= len(BINARY_SYNC) and self._packet[:len(BINARY_SYNC)] != BINARY_SYNC:
+                    self._resync(count_error=False)
+                    continue
+                if self._filled < size:
+                    continue
+
+            counter, rows, cols = _BINARY_HEADER.unpack_from(self._packet, len(BINARY_SYNC))
+            body = self._view[len(BINARY_SYNC):size - 2]
+            crc, = struct.unpack_from("<H", self._packet, size - 2)
+            if rows != self.rows or cols != self.cols or binascii.crc_hqx(body, 0xFFFF) != crc:
+                self._resync(count_error=True)
+                continue
+
+            frame = np.frombuffer(self._packet, dtype="<u2", count=rows * cols,
+                                  offset=self._payload_start).reshape(rows, cols).astype(np.int64)
+            if self._last_counter is not None:
+                self.stats["lost"] += (counter - self._last_counter - 1) & 0xFFFF
+            self._last_counter = counter
+            self.stats["frames"] += 1
+            self._filled = 0
+            return frame
+
+# --- END OF FILE components/frame_decoder.py ---
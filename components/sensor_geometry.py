@@ -0,0 +1,151 @@
+# --- START OF FILE components/sensor_geometry.py ---
+"""
+Mô tả lưới cảm biến (số hàng x số cột) của thảm đo và chuyển ma trận giữa các lưới khác nhau.
+
+SensorGeometry đi kèm mỗi lần đo (lưu trong trường "sensor" của document, xem
+database/manager_mongodb_2.py) và được dùng bởi bộ đọc serial, cửa sổ heatmap và ArchIndexPipeline.
+Các tham số của archindex (số hàng ngón chân, ngưỡng cụm pixel, midfoot_offset...) được chỉnh trên
+lưới phân tích ANALYSIS_GEOMETRY (60x60, như các file CSV mẫu); ma trận từ thảm có lưới khác được
+resample() về lưới này trước khi tính.
+
+resample() coi mỗi ô là giá trị trung bình trên diện tích của ô (area-averaging):
+    - thu nhỏ theo hệ số nguyên: cộng fh x fw ô con của mỗi khối bằng các lát cắt bước fh, fw rồi chia
+      (bằng reshape (h, fh, w, fw).mean nhưng nhanh hơn vài lần vì không rút gọn trên trục ngắn);
+    - phóng to theo hệ số nguyên: lặp mỗi ô thành khối fh x fw (như np.kron với ma trận toàn 1);
+    - tỉ lệ bất kỳ: hai ma trận trọng số diện tích chồng lấn, out = Wr @ M @ Wc.T.
+Ba cách cho cùng kết quả (sai khác làm tròn float); hai cách đầu chỉ nhanh hơn.
+Mọi hàm nhận một ma trận (H,W) hoặc chồng ma trận (N,H,W).
+"""
+
+import re
+from functools import lru_cache
+
+import numpy as np
+
+_SHAPE_PATTERN = re.compile(r"^\s*(\d+)\s*[xX×]\s*(\d+)\s*$")
+
+
+class SensorGeometry:
+    """Lưới cảm biến rows x cols, name là tên thảm (rỗng nếu chỉ biết kích thước)."""
+
+    def __init__(self, rows: int, cols: int, name: str = ""):
+        rows, cols = int(rows), int(cols)
+        if rows <= 0 or cols <= 0:
+            raise ValueError(f"Kích thước lưới cảm biến không hợp lệ: {rows}x{cols}")
+        self.rows = rows
+        self.cols = cols
+        self.name = name or f"{rows}x{cols}"
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.rows, self.cols
+
+    def __eq__(self, other):
+        return isinstance(other, SensorGeometry) and (self.rows, self.cols, self.name) == (other.rows, other.cols, other.name)
+
+    def __hash__(self):
+        return hash((self.rows, self.cols, self.name))
+
+    def __repr__(self):
+        return f"SensorGeometry({self.rows}, {self.cols}, name={self.name!r})"
+
+    def __str__(self):
+        label = f"{self.rows}x{self.cols}"
+        return label if self.name == label else f"{self.name} ({label})"
+
+    def to_dict(self) -> dict:
+        """Dạng lưu trong MongoDB."""
+        return {"name": self.name, "rows": self.rows, "cols": self.cols}
+
+    @classmethod
+    def from_dict(cls, doc: dict) -> "SensorGeometry":
+        return cls(doc["rows"], doc["cols"], doc.get("name", ""))
+
+    @classmethod
+    def from_shape(cls, shape) -> "SensorGeometry":
+        """Lưới có sẵn trong SENSOR_GEOMETRIES cùng kích thước (nếu có), không thì lưới không tên."""
+        rows, cols = (int(v) for v in shape[-2:])
+        for geometry in SENSOR_GEOMETRIES.values():
+            if geometry.shape == (rows, cols):
+                return geometry
+        return cls(rows, cols)
+
+    @classmethod
+    def parse(cls, text: str) -> "SensorGeometry":
+        """Tên trong SENSOR_GEOMETRIES hoặc chuỗi 'ROWSxCOLS' (vd. '64x128')."""
+        text = text.strip()
+        if text in SENSOR_GEOMETRIES:
+            return SENSOR_GEOMETRIES[text]
+        match = _SHAPE_PATTERN.match(text)
+        if not match:
+            raise ValueError(f"Không hiểu lưới cảm biến '{text}' (cần tên có sẵn hoặc dạng 64x128)")
+        return cls.from_shape((int(match.group(1)), int(match.group(2))))
+
+
+# Các lưới đã biết. Thảm khác dùng SensorGeometry.parse("64x128") mà không cần thêm vào đây.
+SENSOR_GEOMETRIES = {
+    "mat-30x30": SensorGeometry(30, 30, "mat-30x30"),       # thảm đo trực tiếp qua serial
+    "mat-30x16": SensorGeometry(30, 16, "mat-30x16"),       # thảm 30 dòng x 16 ô (mặc định của components/serialize.py)
+    "grid-60x60": SensorGeometry(60, 60, "grid-60x60"),     # các file CSV mẫu / lưới phân tích
+}
+DEFAULT_SENSOR = "mat-30x30"
+SERIALIZE_SENSOR = "mat-30x16" # Lưới mặc định của read_sensor_data (30 dòng x 16 ô như trước)
+ANALYSIS_GEOMETRY = SENSOR_GEOMETRIES["grid-60x60"]
+
+
+def geometry_from_doc(doc: dict | None, shape) -> SensorGeometry:
+    """Lưới cảm biến của một document lần đo; document cũ không có trường "sensor" -> theo shape ma trận."""
+    if doc and doc.get("sensor"):
+        return SensorGeometry.from_dict(doc["sensor"])
+    return SensorGeometry.from_shape(shape)
+
+
+@lru_cache(maxsize=32)
+def _area_weights(size_in: int, size_out: int) -> np.ndarray:
+    """
+    Ma trận (size_out, size_in): phần diện tích của ô vào j nằm trong ô ra i, chia cho độ rộng ô ra.
+    Tính bằng số nguyên trên đơn vị 1/size_out của ô vào nên không có sai số làm tròn ở biên.
+    """
+    out_lo = np.arange(size_out)[:, None] * size_in
+    in_lo = np.arange(size_in)[None, :] * size_out
+    overlap = np.minimum(out_lo + size_in, in_lo + size_out) - np.maximum(out_lo, in_lo)
+    weights = np.clip(overlap, 0, None) / size_in
+    weights.setflags(write=False)
+    return weights
+
+
+def _block_mean(matrix: np.ndarray, fr: int, fc: int) -> np.ndarray:
+    """Trung bình các khối fr x fc không chồng lấn (kích thước chia hết cho fr, fc)."""
+    cols = matrix[..., 0::fc].astype(np.float64)
+    for k in range(1, fc):
+        cols += matrix[..., k::fc]
+    out = cols if fr == 1 else cols[..., 0::fr, :].copy()
+    for k in range(1, fr):
+        out += cols[..., k::fr, :]
+    out /= fr * fc
+    return out
+
+
+def resample(matrix: np.ndarray, shape) -> np.ndarray:
+    """
+    Đưa ma trận (H,W) hoặc chồng (N,H,W) về lưới shape = (rows, cols) bằng trung bình theo diện tích.
+    Trả về chính matrix nếu đã đúng kích thước. Phóng to theo hệ số nguyên giữ nguyên dtype,
+    các trường hợp khác trả về float.
+    """
+    matrix = np.asarray(matrix)
+    rows, cols = matrix.shape[-2:]
+    out_rows, out_cols = (int(v) for v in shape)
+    if (rows, cols) == (out_rows, out_cols):
+        return matrix
+    if out_rows <= 0 or out_cols <= 0 or rows == 0 or cols == 0:
+        raise ValueError(f"Không resample được {rows}x{cols} -> {out_rows}x{out_cols}")
+    lead = matrix.shape[:-2]
+    if rows % out_rows == 0 and cols % out_cols == 0:
+        return _block_mean(matrix, rows // out_rows, cols // out_cols)
+    if out_rows % rows == 0 and out_cols % cols == 0:
+        fr, fc = out_rows // rows, out_cols // cols
+        blocks = np.broadcast_to(matrix[..., :, None, :, None], lead + (rows, fr, cols, fc))
+        return blocks.reshape(lead + (out_rows, out_cols))
+    return _area_weights(rows, out_rows) @ matrix @ _area_weights(cols, out_cols).T
+
+# --- END OF FILE components/sensor_geometry.py ---
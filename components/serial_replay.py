@@ -0,0 +1,326 @@
+# --- START OF FILE components/serial_replay.py ---
+"""
+Ghi lại và phát lại phiên đọc cổng serial của thảm cảm biến.
+
+File ghi (.smrec) gồm header
+    magic b"SMREC" | version (uint8) | thời điểm bắt đầu ghi (float64, unix time)
+rồi các bản ghi
+    thời điểm đọc tính từ lúc bắt đầu (float64, giây) | độ dài (uint32) | bytes thô đọc được
+tất cả little-endian. Chỉ dữ liệu đọc từ cổng được ghi; lệnh gửi xuống firmware thì không.
+
+ReplaySerial là cổng serial giả (read, readinto, readline, in_waiting, write, ...) phát lại file
+ghi theo đúng nhịp đã ghi (speed=1), nhanh hơn N lần (speed=N) hoặc nhanh nhất có thể
+(speed=0 / "max"). open_serial() mở cổng theo tên: tên dạng
+    replay:<đường dẫn file>[?speed=4&loop=1]
+trả về ReplaySerial, tên khác mở serial.Serial như trước.
+
+Ghi một phiên từ dòng lệnh:
+    python -m components.serial_replay record /dev/ttyUSB0 capture.smrec --seconds 30
+    python -m components.serial_replay info capture.smrec
+"""
+
+import argparse
+import bisect
+import struct
+import time
+from urllib.parse import parse_qs
+
+import serial
+
+REPLAY_PREFIX = "replay:"
+RECORDING_EXTENSION = ".smrec"
+SPEED_MAX = 0.0 # Phát lại không chờ: mọi dữ liệu có sẵn ngay
+
+_MAGIC = b"SMREC"
+_VERSION = 1
+_HEADER = struct.Struct("<5sBd")  # magic, version, thời điểm bắt đầu ghi
+_RECORD = struct.Struct("<dI")    # thời điểm (giây từ lúc bắt đầu), độ dài dữ liệu
+
+
+def parse_speed(value) -> float:
+    """'max' hoặc 0 -> SPEED_MAX, còn lại là hệ số tốc độ dương (1 = thời gian thực)."""
+    if isinstance(value, str) and value.strip().lower() in ("max", "inf", ""):
+        return SPEED_MAX
+    speed = float(value)
+    if speed < 0:
+        raise ValueError(f"Tốc độ phát lại không hợp lệ: {value}")
+    return speed
+
+
+def load_recording(path: str) -> tuple[list[float], bytes, list[int], float]:
+    """
+    Đọc file ghi.
+    Returns:
+        tuple: (thời điểm từng bản ghi, toàn bộ bytes nối liền, vị trí kết thúc của từng bản ghi
+                trong bytes đó, thời điểm bắt đầu ghi).
+    Raises:
+        ValueError: Nếu file không phải file ghi hợp lệ.
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    if len(content) < _HEADER.size:
+        raise ValueError(f"{path}: không phải file ghi serial.")
+    magic, version, started_at = _HEADER.unpack_from(content, 0)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError(f"{path}: không phải file ghi serial (phiên bản {_VERSION}).")
+
+    times, chunks, ends = [], [], []
+    offset, total = _HEADER.size, 0
+    while offset + _RECORD.size <= len(content):
+        t, length = _RECORD.unpack_from(content, offset)
+        offset += _RECORD.size
+        chunk = content[offset:offset + length]
+        offset += length
+        if len(chunk) < length:
+            print(f"{path}: bản ghi cuối bị cắt ngang, bỏ qua.")
+            break
+        times.append(t)
+        chunks.append(chunk)
+        total += length
+        ends.append(total)
+    return times, b"".join(chunks), ends, started_at
+
+
+def write_recording(path: str, records, started_at: float | None = None):
+    """Ghi file ghi từ các cặp (thời điểm tính từ lúc bắt đầu, bytes) (dùng cho dữ liệu giả và benchmark)."""
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, time.time() if started_at is None else started_at))
+        for t, data in records:
+            f.write(_RECORD.pack(t, len(data)))
+            f.write(data)
+
+
+class SerialRecorder:
+    """
+    Bọc một cổng serial đã mở: mọi bytes đọc được (read, readinto, readline) được ghi vào file
+    kèm thời điểm đọc. Các thuộc tính/phương thức khác được chuyển thẳng cho cổng gốc.
+    """
+
+    def __init__(self, port, path: str):
+        self._port = port
+        self.path = path
+        self._file = open(path, "wb")
+        self._start = time.monotonic()
+        self._file.write(_HEADER.pack(_MAGIC, _VERSION, time.time()))
+        self.bytes_recorded = 0
+
+    def __getattr__(self, name):
+        return getattr(self._port, name)
+
+    def _record(self, data):
+        if data and self._file is not None:
+            self._file.write(_RECORD.pack(time.monotonic() - self._start, len(data)))
+            self._file.write(data)
+            self.bytes_recorded += len(data)
+
+    def read(self, size: int = 1) -> bytes:
+        data = self._port.read(size)
+        self._record(data)
+        return data
+
+    def readinto(self, buffer) -> int:
+        n = self._port.readinto(buffer)
+        if n:
+            self._record(bytes(memoryview(buffer)[:n]))
+        return n
+
+    def readline(self, size: int = -1) -> bytes:
+        data = self._port.readline(size)
+        self._record(data)
+        return data
+
+    def close(self):
+        try:
+            self._port.close()
+        finally:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                print(f"Recorded {self.bytes_recorded} bytes to {self.path}")
+
+
+class ReplaySerial:
+    """
+    Cổng serial giả phát lại file ghi. Bytes của một bản ghi chỉ "đến" khi thời gian trôi qua kể từ
+    lúc mở (nhân với speed) đạt thời điểm đã ghi; read() chờ như cổng thật (tối đa timeout).
+    Hết dữ liệu thì cổng im lặng như thiết bị không gửi gì (read trả về b"" sau timeout),
+    hoặc phát lại từ đầu nếu loop=True. reset_input_buffer() không bỏ dữ liệu để kết quả phát lại
+    không phụ thuộc thời điểm gọi.
+    """
+
+    def __init__(self, path: str, speed: float = 1.0, loop: bool = False, timeout: float | None = 0.1,
+                 baudrate: int = 115200):
+        self.port = REPLAY_PREFIX + path
+        self.path = path
+        self.speed = parse_speed(speed)
+        self.loop = loop
+        self.timeout = timeout
+        self.baudrate = baudrate # Chỉ để tương thích, tốc độ phát lại theo thời điểm đã ghi
+        self._times, self._data, self._ends, self.started_at = load_recording(path)
+        self.duration = self._times[-1] if self._times else 0.0
+        self.size = len(self._data)
+        self.is_open = True
+        self.loops = 0
+        self._pos = 0
+        self._start = time.monotonic()
+
+    @property
+    def exhausted(self) -> bool:
+        """Đã phát hết dữ liệu (không bao giờ đúng khi loop=True)."""
+        return not self.loop and self._pos >= len(self._data)
+
+    def _elapsed(self) -> float:
+        return (time.monotonic() - self._start) * self.speed
+
+    def _available_end(self) -> int:
+        """Vị trí cuối của dữ liệu đã "đến" cổng tại thời điểm hiện tại."""
+        if self.speed == SPEED_MAX:
+            return len(self._data)
+        arrived = bisect.bisect_right(self._times, self._elapsed())
+        return self._ends[arrived - 1] if arrived else 0
+
+    def _rewind_if_done(self):
+        if self.loop and self._data and self._pos >= len(self._data):
+            self._pos = 0
+            self.loops += 1
+            self._start = time.monotonic()
+
+    def _wait_for_data(self, deadline) -> bool:
+        """Ngủ tới khi có bản ghi mới đến hoặc tới deadline. Trả về False nếu đã hết thời gian chờ."""
+        now = time.monotonic()
+        if deadline is not None and now >= deadline:
+            return False
+        if self._pos >= len(self._data):
+            wake = deadline # Không còn gì sẽ đến: chờ hết timeout như cổng im lặng
+        elif self.speed == SPEED_MAX:
+            return False # Mọi dữ liệu còn lại đã có sẵn: trả về ngay phần còn lại
+        else:
+            record = bisect.bisect_right(self._ends, self._pos) # Bản ghi chứa byte chưa đến đầu tiên
+            wake = self._start + self._times[record] / self.speed
+            if deadline is not None:
+                wake = min(wake, deadline)
+        if wake is None:
+            raise serial.SerialException(f"{self.path}: hết dữ liệu phát lại (timeout=None).")
+        time.sleep(max(0.0, wake - now))
+        return True
+
+    @property
+    def in_waiting(self) -> int:
+        self._rewind_if_done()
+        return max(0, self._available_end() - self._pos)
+
+    def read(self, size: int = 1) -> bytes:
+        if not self.is_open:
+            raise serial.PortNotOpenError()
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            self._rewind_if_done()
+            end = min(self._available_end(), self._pos + size)
+            if end - self._pos >= size or not self._wait_for_data(deadline):
+                data = self._data[self._pos:end]
+                self._pos = end
+                return data
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast("B")
+        data = self.read(len(view))
+        view[:len(data)] = data
+        return len(data)
+
+    def readline(self, size: int = -1) -> bytes:
+        if not self.is_open:
+            raise serial.PortNotOpenError()
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            self._rewind_if_done()
+            limit = self._available_end()
+            if size >= 0:
+                limit = min(limit, self._pos + size)
+            newline = self._data.find(b"\n", self._pos, limit)
+            if newline >= 0 or (size >= 0 and limit - self._pos >= size) or not self._wait_for_data(deadline):
+                end = newline + 1 if newline >= 0 else limit
+                data = self._data[self._pos:end]
+                self._pos = end
+                return data
+
+    def write(self, data) -> int:
+        return len(data) # Lệnh gửi xuống firmware (vd. MODE BIN) bị bỏ qua; câu trả lời đã có trong file ghi
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+def open_serial(port_name: str, baudrate: int = 115200, timeout: float | None = 0.1, record_path: str | None = None):
+    """
+    Mở cổng serial theo tên. 'replay:<file>[?speed=N|max&loop=1]' mở ReplaySerial, tên khác mở serial.Serial.
+    Args:
+        record_path (str, optional): Ghi mọi bytes đọc được vào file này (SerialRecorder).
+    Raises:
+        serial.SerialException: Nếu không mở được cổng hoặc file ghi.
+    """
+    if port_name.startswith(REPLAY_PREFIX):
+        path, _, query = port_name[len(REPLAY_PREFIX):].partition("?")
+        options = {key: values[-1] for key, values in parse_qs(query).items()}
+        try:
+            port = ReplaySerial(path, speed=options.get("speed", 1.0), loop=options.get("loop", "0") not in ("0", "false"),
+                                timeout=timeout, baudrate=baudrate)
+        except (OSError, ValueError) as e:
+            raise serial.SerialException(f"Cannot open replay {path}: {e}") from e
+    else:
+        port = serial.Serial(port_name, baudrate, timeout=timeout)
+    if record_path:
+        try:
+            port = SerialRecorder(port, record_path)
+        except OSError as e:
+            port.close()
+            raise serial.SerialException(f"Cannot record to {record_path}: {e}") from e
+    return port
+
+
+def _record_command(args):
+    port = open_serial(args.port, args.baudrate, timeout=0.1, record_path=args.output)
+    print(f"Recording {args.port} to {args.output} for {args.seconds:g} s (Ctrl+C to stop)...")
+    deadline = time.monotonic() + args.seconds
+    try:
+        while time.monotonic() < deadline:
+            port.read(port.in_waiting or 1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        port.close()
+
+
+def _info_command(args):
+    times, data, ends, started_at = load_recording(args.file)
+    duration = times[-1] if times else 0.0
+    print(f"{args.file}: recorded {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started_at))}")
+    print(f"  {len(times)} reads, {len(data)} bytes, {duration:.2f} s"
+          f" ({len(data) / duration if duration else 0:,.0f} B/s), {data.count(b'-----')} ASCII frame markers")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ghi / xem file ghi phiên serial của thảm cảm biến.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    record = sub.add_parser("record", help="Ghi bytes thô đọc từ cổng serial.")
+    record.add_argument("port")
+    record.add_argument("output")
+    record.add_argument("--seconds", type=float, default=30.0)
+    record.add_argument("--baudrate", type=int, default=115200)
+    record.set_defaults(func=_record_command)
+    info = sub.add_parser("info", help="Thông tin một file ghi.")
+    info.add_argument("file")
+    info.set_defaults(func=_info_command)
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
+
+# --- END OF FILE components/serial_replay.py ---
@@ -3,26 +3,32 @@ import time
 import numpy as np
 import io # Us
 
-def read_sensor_data(port: str, baudrate: int = 115200):
-    ser = serial.Serial(port, baudrate, timeout=1)
-    while True:
-        data = []
-        for _ in range(30):
-            line = ser.readline().decode('utf-8', errors='ignore').strip()
-            if "-----" in line:
-                break
-            if line == "":
-                continue
-            values = list(map(int, line.split(",")))
-            if len(values) == 16:
-                data.append(values)
-        if len(data) == 30:
-            matrix = np.array(data)
-            return matrix
+from components.frame_decoder import AsciiFrameAssembler
+from components.serial_replay import open_serial
+from components.sensor_geometry import SensorGeometry, SENSOR_GEOMETRIES, SERIALIZE_SENSOR
+
+def read_sensor_data(port: str, baudrate: int = 115200, geometry: SensorGeometry = SENSOR_GEOMETRIES[SERIALIZE_SENSOR],
+                     record_path: str | None = None):
+    # port dạng 'replay:<file>?speed=N' đọc từ phiên đã ghi (components/serial_replay.py)
+    # geometry: lưới của thảm (số dòng mỗi frame x số ô mỗi dòng), vd. SensorGeometry.parse("64x128")
+    ser = open_serial(port, baudrate, timeout=1, record_path=record_path)
+    assembler = AsciiFrameAssembler(*geometry.shape)
+    try:
+        while True:
+            # Đọc theo khối và giải mã cả frame một lần (ô lỗi/thiếu -> 0)
+            chunk = ser.read(ser.in_waiting or 1)
+            if chunk:
+                frames = assembler.feed(chunk)
+                if frames:
+                    return frames[0]
+            if getattr(ser, "exhausted", False):
+                break # Phát lại đã hết mà chưa có frame đủ (cổng thật không bao giờ hết)
+    finally:
+        ser.close()
 
     return None, "Not enough data received."
 #
 if __name__ == '__main__':
     port_to_test = '/dev/ttyUSB0'  # <-- CHANGE THIS
     data = read_sensor_data(port_to_test)
-    print(data)
\ No newline at end of file
+    print(data)
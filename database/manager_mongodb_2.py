@@ -1,6 +1,17 @@
 # --- START OF FILE manager_mongodb.py ---
 
+import hashlib
+import json
+import re
+import threading
+import unicodedata
+
+import numpy as np
 import pandas as pd
+from datetime import datetime, timezone
+import bson
+from bson.binary import Binary
+from pymongo import UpdateOne, DESCENDING
 from pymongo.errors import DuplicateKeyError # Import necessary for handling potential duplicate key errors if needed, though current logic prevents it before insertion.
 from bson import ObjectId # Useful if directly manipulating MongoDB's default _id
 
@@ -10,27 +21,206 @@ from models.connect_db import MongoDBConnection
 # Assuming models define Patient and FHIRResource correctly
 from models.patient import Patient
 from models.fhir import FHIR as FHIRResource 
+from components.sensor_geometry import SensorGeometry, geometry_from_doc
+from components.archindex import check_data, compute_height_need
+from database.patient_cache import PatientCache, MISSING, DEFAULT_CACHE_SIZE, DEFAULT_CACHE_TTL
 
 # This script quản lý kết nối và thao tác với MongoDB cho ứng dụng FHIR
 
+def matrix_from_data_dict(data_dict: dict) -> np.ndarray:
+    """
+    Chuyển trường "data" dạng {"0": [...], "1": [...], ...} về ma trận numpy (float).
+    Các khóa là chỉ số hàng dạng chuỗi nên được sắp xếp theo giá trị số.
+    Raises:
+        ValueError: Nếu dữ liệu rỗng hoặc các hàng không cùng độ dài.
+    """
+    if not data_dict:
+        raise ValueError("Dữ liệu ma trận rỗng.")
+    rows = [data_dict[key] for key in sorted(data_dict, key=int)]
+    return np.array(rows, dtype=float)
+
+# --- Lưu ma trận dạng nhị phân ---
+# Trường "matrix" = {"dtype": "<u2", "shape": [60, 60], "buffer": Binary(...)}
+# thay cho trường "data" dạng {"0": [float, ...], ...} (mỗi giá trị tốn ~12 byte BSON).
+# Trường "sensor" = {"name": "mat-30x30", "rows": 30, "cols": 30}: lưới cảm biến của thảm đo
+# (components/sensor_geometry.py); document cũ không có trường này được coi theo kích thước ma trận.
+MATRIX_DTYPES = ("auto", "uint16", "float32", "float64")
+
+def encode_matrix(matrix: np.ndarray, dtype: str = "auto") -> dict:
+    """
+    Mã hóa ma trận thành header (dtype, shape) + blob BSON Binary little-endian.
+    Args:
+        matrix: Ma trận numpy.
+        dtype: "auto" (uint16 nếu mọi giá trị là số nguyên 0-65535, ngược lại float32),
+               hoặc "uint16" / "float32" / "float64".
+    """
+    if dtype not in MATRIX_DTYPES:
+        raise ValueError(f"dtype không hợp lệ: {dtype}. Chỉ hỗ trợ {MATRIX_DTYPES}")
+    matrix = np.asarray(matrix)
+    if dtype == "auto":
+        is_uint16 = (matrix.size > 0 and np.isfinite(matrix).all() and matrix.min() >= 0
+                     and matrix.max() <= 65535 and np.array_equal(matrix, np.round(matrix)))
+        dtype = "uint16" if is_uint16 else "float32"
+    stored = np.ascontiguousarray(matrix, dtype=np.dtype(dtype).newbyteorder("<"))
+    return {"dtype": stored.dtype.str, "shape": list(stored.shape), "buffer": Binary(stored.tobytes())}
+
+def decode_matrix(data_doc: dict) -> np.ndarray:
+    """
+    Lấy ma trận từ document dữ liệu, hỗ trợ cả trường "matrix" (nhị phân) và "data" (dict-of-lists cũ).
+    Với dạng nhị phân, np.frombuffer đọc thẳng trên bytes trả về từ MongoDB (không sao chép,
+    mảng chỉ đọc).
+    Raises:
+        ValueError: Nếu document không có dữ liệu ma trận hợp lệ.
+    """
+    stored = data_doc.get("matrix")
+    if stored:
+        matrix = np.frombuffer(stored["buffer"], dtype=np.dtype(stored["dtype"]))
+        return matrix.reshape(stored["shape"])
+    if data_doc.get("data"):
+        return matrix_from_data_dict(data_doc["data"])
+    raise ValueError("Document không có dữ liệu ma trận.")
+
+# --- Khóa tìm kiếm bệnh nhân ---
+# Trường "search" = {"name": "nguyen van a", "tokens": ["nguyen", "van", "a"], "phone": "0987654321"}:
+# tên bỏ dấu, chữ thường và SĐT chỉ còn chữ số. Tìm kiếm chỉ dùng regex neo đầu chuỗi ("^...") trên các
+# trường này nên MongoDB dùng được index (tìm theo tiền tố), kể cả với hàng trăm nghìn bệnh nhân.
+SEARCH_PAGE_SIZE = 50
+SEARCH_SORT = [("search.name", 1), ("id", 1)]
+SEARCH_PROJECTION = {"_id": 0, "id": 1, "name": 1, "phone": 1, "search.name": 1}
+_SEARCH_TRANSLATION = str.maketrans({"đ": "d", "Đ": "d"}) # đ không tách được dấu bằng NFD
+
+def normalize_search_text(text: str | None) -> str:
+    """Bỏ dấu tiếng Việt, chữ thường, gộp khoảng trắng: 'Nguyễn  Văn Đức' -> 'nguyen van duc'."""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFD", text.translate(_SEARCH_TRANSLATION))
+    folded = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(folded.lower().split())
+
+def make_search_key(patient_doc: dict) -> dict:
+    """Trường "search" của một document bệnh nhân (tính từ name[0].text và phone)."""
+    names = patient_doc.get("name") or [{}]
+    name = normalize_search_text(names[0].get("text"))
+    return {"name": name, "tokens": name.split(), "phone": re.sub(r"\D", "", patient_doc.get("phone") or "")}
+
+def _prefix(value: str) -> dict:
+    return {"$regex": "^" + re.escape(value)}
+
+def _search_parts(term: str):
+    """(các từ đã chuẩn hóa, tiền tố ID, tiền tố SĐT hoặc None) của từ khóa; None nếu term rỗng."""
+    words = normalize_search_text(term).split()
+    if not words:
+        return None
+    digits = re.sub(r"\D", "", term)
+    is_phone = digits and not re.search(r"[^\d\s+().-]", term) # Chỉ gồm chữ số và ký tự phân cách của SĐT
+    return words, term.strip(), digits if is_phone else None
+
+def row_matches_search(row: dict, term: str) -> bool:
+    """
+    Kiểm tra một dòng của search_patients ({"id", "name", "phone", "sort_key"}) có khớp term không,
+    cùng điều kiện với MongoDBManager.search_query (sort_key là search.name nên tách ra được tokens).
+    """
+    parts = _search_parts(term)
+    if parts is None:
+        return True
+    words, id_prefix, phone = parts
+    tokens = (row.get("sort_key") or "").split()
+    if all(any(token.startswith(word) for token in tokens) for word in words):
+        return True
+    if (row.get("id") or "").startswith(id_prefix):
+        return True
+    return phone is not None and re.sub(r"\D", "", row.get("phone") or "").startswith(phone)
+
+def narrows_search(previous: str, term: str) -> bool:
+    """
+    True nếu mọi bệnh nhân khớp term cũng khớp previous (term gõ tiếp từ previous), khi đó kết quả của
+    term lọc được từ kết quả đầy đủ của previous bằng row_matches_search mà không cần truy vấn lại.
+    """
+    if not term.startswith(previous):
+        return False
+    old = _search_parts(previous)
+    if old is None:
+        return True
+    new = _search_parts(term)
+    # "+" -> "+0": term mới thêm điều kiện SĐT mà previous không có
+    return new[2] is None or old[2] is not None
+
+# --- Kết quả Arch Index lưu kèm lần đo ---
+# Trường "arch_index" (trong data_collection và document lần đo tương ứng của scan_collection) =
+#   {"left": {"AI", "type", "height_need"}, "right": {...}, "params": {...}, "params_hash": "...", "computed_at"}
+# height_need là đề xuất chiều cao đế của compute_height_need. Khi xem lại, get_patient_arch_index dùng
+# bản ghi này nếu params_hash khớp tham số của pipeline, không thì tính lại và ghi đè.
+
+def params_key(params: dict) -> str:
+    """Chuỗi JSON chuẩn (khóa sắp xếp) của tham số pipeline."""
+    return json.dumps(params, sort_keys=True, separators=(",", ":"))
+
+def params_hash(params: dict) -> str:
+    """Hash SHA-1 của params_key: so khớp kết quả AI đã lưu với cấu hình pipeline hiện tại."""
+    return hashlib.sha1(params_key(params).encode("utf-8")).hexdigest()
+
+def _with_height_need(side: dict) -> dict:
+    return {**side, "height_need": compute_height_need(side.get("AI"))}
+
+def make_arch_index_record(ai_results: dict, params: dict, computed_at: datetime | None = None) -> dict:
+    """
+    Tạo bản ghi kết quả Arch Index để lưu cùng dữ liệu bàn chân.
+    Args:
+        ai_results (dict): Kết quả dạng compute_arch_index ({'left': {'AI', 'type'}, 'right': {...}}).
+        params (dict): Tham số pipeline đã dùng (ArchIndexPipeline.params()).
+    """
+    return {"left": _with_height_need(ai_results["left"]), "right": _with_height_need(ai_results["right"]),
+            "params": params, "params_hash": params_hash(params),
+            "computed_at": computed_at or datetime.now(timezone.utc)}
+
+def record_params_hash(record: dict) -> str:
+    """params_hash của bản ghi đã lưu (bản ghi cũ không có trường này: tính từ "params")."""
+    return record.get("params_hash") or params_hash(record.get("params") or {})
+
 class MongoDBManager:
-    def __init__(self, patient_collection="patients", data_collection="patient_sensor_data"):
+    def __init__(self, patient_collection="patients", data_collection="patient_sensor_data",
+                 matrix_storage="binary", matrix_dtype="auto", scan_collection="patient_scans",
+                 cache_size=DEFAULT_CACHE_SIZE, cache_ttl=DEFAULT_CACHE_TTL):
         """
         Initializes the MongoDBManager.
         Args:
             patient_collection (str): Name of the collection to store patient demographic data.
             data_collection (str): Name of the collection to store patient-associated data (like CSV).
+                                   Chỉ giữ lần đo mới nhất của mỗi bệnh nhân.
+            scan_collection (str): Collection lưu lịch sử các lần đo (mỗi lần đo một document).
+            matrix_storage (str): "binary" lưu ma trận dạng BSON Binary (trường "matrix"),
+                                  "dict" lưu dạng dict-of-lists cũ (trường "data").
+            matrix_dtype (str): dtype khi lưu nhị phân ("auto", "uint16", "float32", "float64").
+            cache_size (int): Số bệnh nhân giữ trong cache đọc (Patient model, ma trận, kết quả AI); 0 để tắt.
+            cache_ttl (float, optional): Thời gian sống (giây) của mỗi mục cache; None: không hết hạn.
         """
+        if matrix_storage not in ("binary", "dict"):
+            raise ValueError("matrix_storage chỉ hỗ trợ 'binary' hoặc 'dict'")
+        if matrix_dtype not in MATRIX_DTYPES:
+            raise ValueError(f"matrix_dtype chỉ hỗ trợ {MATRIX_DTYPES}")
+        self.matrix_storage = matrix_storage
+        self.matrix_dtype = matrix_dtype
+        # Chọn lại bệnh nhân vừa xem không phải truy vấn/giải mã/tính AI lại; xem database/patient_cache.py.
+        # Thống kê hit/miss trong self.cache.stats.
+        self.cache = PatientCache(cache_size, cache_ttl)
+        self._pipeline_lock = threading.Lock() # ArchIndexPipeline dùng bộ đệm riêng, không chạy song song được
         self.db_connection = MongoDBConnection()
         self.db_connection.connect()
         self.db = self.db_connection.db
         self.patient_collection = self.db[patient_collection]
         self.data_collection = self.db[data_collection]
+        self.scan_collection = self.db[scan_collection]
         # Ensure unique index on patient_id for faster lookups and data integrity
         # Optional: Add index on name/phone for faster duplicate checks if collection is large
         self.patient_collection.create_index([("name.text", 1), ("phone", 1)], unique=False) # Index for duplicate check/lookup
         self.patient_collection.create_index("id") # Ensure patient FHIR ID is unique
+        # Tìm kiếm theo tiền tố trên khóa đã chuẩn hóa (search_patients); sắp xếp/phân trang theo (search.name, id)
+        self.patient_collection.create_index("search.tokens")
+        self.patient_collection.create_index("search.phone")
+        self.patient_collection.create_index(SEARCH_SORT)
         self.data_collection.create_index("patient_id",unique=True) # Ensure one data entry per patient_id
+        # Lịch sử đo: truy vấn theo bệnh nhân, mới nhất trước
+        self.scan_collection.create_index([("patient_id", 1), ("captured_at", DESCENDING)])
 
     # --- Patient Management ---
 
@@ -73,7 +263,8 @@ class MongoDBManager:
             # Validate data with Pydantic model before insertion (optional but recommended)
             # Patient(**patient_data) # This will raise ValidationError if data is invalid
 
-            result = self.patient_collection.insert_one(patient_data)
+            result = self.patient_collection.insert_one({**patient_data, "search": make_search_key(patient_data)})
+            self.cache.invalidate(patient_id) # Có thể đã nhớ "không tìm thấy" cho ID này
             print(f"Đã lưu bệnh nhân '{patient_name}' với MongoDB _id: {result.inserted_id} và FHIR ID: {patient_id}")
             return "Lưu thành công"
         except DuplicateKeyError:
@@ -84,13 +275,19 @@ class MongoDBManager:
             return f"Lỗi khi lưu bệnh nhân: {e}"
 
     def get_patient_by_id(self, patient_id: str):
-        """Lấy hồ sơ bệnh nhân từ MongoDB theo ID FHIR."""
+        """Lấy hồ sơ bệnh nhân từ MongoDB theo ID FHIR (qua cache; model trả về dùng chung, không được sửa)."""
+        cached = self.cache.get(patient_id, "patient")
+        if cached is not MISSING:
+            return cached
+        token = self.cache.token()
         patient_doc = self.patient_collection.find_one({"id": patient_id})
+        patient = None
         if patient_doc:
             # Convert MongoDB doc (potentially with _id) to Patient object
             patient_doc.pop('_id', None) # Remove MongoDB _id before creating Patient model
-            return Patient(**patient_doc)
-        return None
+            patient = Patient(**patient_doc)
+        self.cache.put(patient_id, "patient", patient, token)
+        return patient
 
     def get_patient_by_name(self, name: str):
         """Lấy hồ sơ bệnh nhân từ MongoDB theo tên (first match)."""
@@ -127,6 +324,63 @@ class MongoDBManager:
                  print(f"Warning: Could not parse patient document {doc.get('id', 'N/A')} into Patient model: {e}")
         return patients
 
+    @staticmethod
+    def search_query(term: str) -> dict:
+        """
+        Bộ lọc cho search_patients: mỗi từ của term (đã bỏ dấu) là tiền tố của một từ trong tên,
+        hoặc chữ số của term là tiền tố của SĐT, hoặc term là tiền tố của ID. Term rỗng -> {}.
+        """
+        parts = _search_parts(term)
+        if parts is None:
+            return {}
+        words, id_prefix, phone = parts
+        clauses = [{"search.tokens": {"$all": [re.compile("^" + re.escape(word)) for word in words]}},
+                   {"id": _prefix(id_prefix)}]
+        if phone is not None:
+            clauses.append({"search.phone": _prefix(phone)})
+        return {"$or": clauses}
+
+    def search_patients(self, term: str = "", page_size: int = SEARCH_PAGE_SIZE, after: dict | None = None) -> list:
+        """
+        Tìm bệnh nhân theo tên (không phân biệt dấu, hoa thường), SĐT hoặc ID, theo trang.
+        Chỉ tải id/tên/SĐT, không tạo Patient model.
+        Args:
+            term (str): Từ khóa; rỗng -> mọi bệnh nhân.
+            page_size (int): Số bệnh nhân tối đa mỗi trang.
+            after (dict, optional): Dòng cuối của trang trước; trang tiếp theo bắt đầu ngay sau nó.
+        Returns:
+            List[dict]: Các dòng {"id", "name", "phone", "sort_key"} sắp xếp theo tên đã chuẩn hóa rồi ID.
+        """
+        query = self.search_query(term)
+        if after is not None:
+            # Phân trang theo khóa (search.name, id) thay vì skip để không phải quét lại các trang trước
+            keyset = {"$or": [{"search.name": {"$gt": after["sort_key"]}},
+                              {"search.name": after["sort_key"], "id": {"$gt": after["id"]}}]}
+            query = {"$and": [query, keyset]} if query else keyset
+        cursor = self.patient_collection.find(query, SEARCH_PROJECTION).sort(SEARCH_SORT).limit(page_size)
+        return [self._search_row(doc) for doc in cursor]
+
+    @staticmethod
+    def _search_row(doc: dict) -> dict:
+        names = doc.get("name") or [{}]
+        return {"id": doc.get("id"), "name": names[0].get("text"), "phone": doc.get("phone"),
+                "sort_key": doc.get("search", {}).get("name", "")}
+
+    def backfill_search_keys(self, batch_size: int = 500) -> int:
+        """Tạo trường "search" cho các bệnh nhân lưu trước khi có khóa tìm kiếm. Trả về số document đã ghi."""
+        operations = []
+        written = 0
+        cursor = self.patient_collection.find({"search": {"$exists": False}}, {"name": 1, "phone": 1}).batch_size(batch_size)
+        for doc in cursor:
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"search": make_search_key(doc)}}))
+            if len(operations) >= batch_size:
+                written += self.patient_collection.bulk_write(operations, ordered=False).modified_count
+                operations = []
+        if operations:
+            written += self.patient_collection.bulk_write(operations, ordered=False).modified_count
+        print(f"Đã tạo khóa tìm kiếm cho {written} bệnh nhân.")
+        return written
+
     def load_data(self, query_type: str, query_value: str):
         """
         Truy vấn bệnh nhân theo ID, tên hoặc số điện thoại. (Simplified wrapper around find_patients)
@@ -173,9 +427,13 @@ class MongoDBManager:
             print(f"Đã xóa dữ liệu liên quan của bệnh nhân ID: {patient_id}")
         else:
             print(f"Không tìm thấy dữ liệu liên quan để xóa cho bệnh nhân ID: {patient_id}")
+        scan_deletion_result = self.scan_collection.delete_many({"patient_id": patient_id})
+        if scan_deletion_result.deleted_count > 0:
+            print(f"Đã xóa {scan_deletion_result.deleted_count} lần đo của bệnh nhân ID: {patient_id}")
 
         # Then, delete patient record
         result = self.patient_collection.delete_one({"id": patient_id})
+        self.cache.invalidate(patient_id) # Sau khi xóa: lần đọc chen vào giữa không được nhớ lại dữ liệu cũ
         if result.deleted_count > 0:
             return f"Đã xóa bệnh nhân với ID FHIR '{patient_id}' và dữ liệu liên quan khỏi database."
         else:
@@ -219,7 +477,10 @@ class MongoDBManager:
                     data_delete_result = self.data_collection.delete_many({"patient_id": {"$in": patient_ids_to_remove_data}})
                     if data_delete_result.deleted_count > 0:
                          print(f"  -> Đã xóa {data_delete_result.deleted_count} bản ghi dữ liệu liên quan.")
+                    self.scan_collection.delete_many({"patient_id": {"$in": patient_ids_to_remove_data}})
 
+        if deleted_count_total:
+            self.cache.clear()
         if deleted_count_total == 0:
              print("Không tìm thấy hồ sơ bệnh nhân trùng lặp để xóa.")
         else:
@@ -243,6 +504,8 @@ class MongoDBManager:
         """
         if "id" in update_data:
             return "Lỗi: Không thể cập nhật trường 'id' của bệnh nhân."
+        if "search" in update_data:
+            return "Lỗi: Trường 'search' được tính tự động từ tên và SĐT."
         if not update_data:
              return "Lỗi: Không có dữ liệu cập nhật được cung cấp."
 
@@ -252,6 +515,7 @@ class MongoDBManager:
             {"id": patient_id},
             {"$set": update_data}
         )
+        self.cache.invalidate(patient_id)
 
         if result.matched_count == 0:
             return f"Không tìm thấy bệnh nhân với ID FHIR '{patient_id}' để cập nhật."
@@ -264,6 +528,8 @@ class MongoDBManager:
                 # Fetch the updated patient to get current name/phone
                 updated_patient_doc = self.patient_collection.find_one({"id": patient_id})
                 if updated_patient_doc:
+                    self.patient_collection.update_one({"id": patient_id},
+                                                       {"$set": {"search": make_search_key(updated_patient_doc)}})
                     update_payload_data = {}
                     if "name" in updated_fields:
                          update_payload_data["patient_name"] = updated_patient_doc["name"][0]["text"]
@@ -282,58 +548,103 @@ class MongoDBManager:
 
     # --- Patient Data (CSV) Management ---
 
-    # --- NEW: Thêm truy vấn data của patient ---
-    # Renamed save_csv_to_mongodb to be specific to patient data
-    def save_patient_csv_data(self, patient_id: str, csv_file_path: str) -> str:
+    def save_patient_matrix(self, patient_id: str, matrix: np.ndarray, ai_record: dict | None = None,
+                            captured_at: datetime | None = None, geometry: SensorGeometry | None = None) -> str:
         """
-        Lưu dữ liệu ma trận (ví dụ 60x60) từ file CSV vào MongoDB, liên kết với patient_id.
-        Ghi đè nếu dữ liệu cho patient_id này đã tồn tại.
+        Lưu trực tiếp ma trận dữ liệu bàn chân (numpy array) vào MongoDB, liên kết với patient_id.
+        Mỗi lần gọi thêm một lần đo mới vào lịch sử (scan_collection); bản ghi trong
+        data_collection được ghi đè bằng lần đo mới nhất.
         Args:
             patient_id (str): ID FHIR của bệnh nhân liên quan.
-            csv_file_path (str): Đường dẫn đến file CSV.
+            matrix (np.ndarray): Ma trận 2D (ví dụ 60x60).
+            ai_record (dict, optional): Kết quả Arch Index của lần đo (make_arch_index_record).
+            captured_at (datetime, optional): Thời điểm đo, mặc định là thời điểm hiện tại (UTC).
+            geometry (SensorGeometry, optional): Lưới cảm biến của thảm đo, lưu vào trường "sensor";
+                mặc định suy ra từ kích thước ma trận.
         Returns:
             str: Thông báo kết quả.
         """
-        # First, check if the patient exists
-        patient = self.get_patient_by_id(patient_id)
-        if not patient:
-            return f"Lỗi: Không tìm thấy bệnh nhân với ID FHIR '{patient_id}'. Không thể lưu dữ liệu CSV."
+        matrix = np.asarray(matrix)
+        if matrix.ndim != 2 or matrix.size == 0:
+            return f"Lỗi: Dữ liệu bàn chân phải là ma trận 2D khác rỗng (nhận được kích thước {matrix.shape})."
+        geometry = geometry or SensorGeometry.from_shape(matrix.shape)
+        if geometry.shape != matrix.shape:
+            return f"Lỗi: Ma trận {matrix.shape} không khớp lưới cảm biến {geometry}."
+
+        # First, check if the patient exists (chỉ lấy các trường cần thiết)
+        patient_doc = self.patient_collection.find_one({"id": patient_id}, {"_id": 0, "id": 1, "name": 1, "phone": 1})
+        if not patient_doc:
+            return f"Lỗi: Không tìm thấy bệnh nhân với ID FHIR '{patient_id}'. Không thể lưu dữ liệu bàn chân."
 
         try:
-            df = pd.read_csv(csv_file_path, header=None)
-            # Convert DataFrame to a dictionary format suitable for MongoDB
-            # Example: { "0": [val, val, ...], "1": [val, val,...], ... }
-            # Or store as list of lists: [[row1], [row2], ...]
-            # Using dict of lists here as in the original example
-            matrix_dict = {str(i): df.iloc[i].tolist() for i in range(df.shape[0])}
-
+            captured_at = captured_at or datetime.now(timezone.utc)
+            encoded_matrix = encode_matrix(matrix, self.matrix_dtype)
             data_document = {
-                "patient_id": patient.id,
-                "patient_name": patient.name[0].text, # Store for potential simpler lookups
-                "patient_phone": patient.phone,     # Store for potential simpler lookups
-                "data": matrix_dict,
-                # Add timestamp? metadata?
-                # "last_updated": datetime.utcnow()
+                "patient_id": patient_id,
+                "patient_name": patient_doc["name"][0]["text"], # Store for potential simpler lookups
+                "patient_phone": patient_doc.get("phone"),     # Store for potential simpler lookups
+                "captured_at": captured_at,
+                "sensor": geometry.to_dict(),
             }
+            unset_fields = {}
+            if self.matrix_storage == "binary":
+                # Ma trận nhị phân + header dtype/shape, xóa trường "data" cũ nếu có
+                data_document["matrix"] = encoded_matrix
+                unset_fields["data"] = ""
+            else:
+                # Example: { "0": [val, val, ...], "1": [val, val,...], ... }
+                data_document["data"] = {str(i): row.tolist() for i, row in enumerate(matrix.astype(float))}
+                unset_fields["matrix"] = ""
+            if ai_record:
+                data_document["arch_index"] = ai_record
+            else:
+                unset_fields["arch_index"] = "" # Kết quả cũ không còn đúng với ma trận mới
+
+            # Lịch sử đo: luôn thêm một document mới (ma trận luôn lưu dạng nhị phân)
+            scan_document = {"patient_id": patient_id, "captured_at": captured_at, "sensor": geometry.to_dict(),
+                             "matrix": encoded_matrix}
+            if ai_record:
+                scan_document["arch_index"] = ai_record
+            self.scan_collection.insert_one(scan_document)
+            self.cache.invalidate(patient_id)
 
             # Use update_one with upsert=True to insert if not exist, or replace if exist
             result = self.data_collection.update_one(
-                {"patient_id": patient.id}, # Filter by patient_id
-                {"$set": data_document},     # Data to insert/update
+                {"patient_id": patient_id}, # Filter by patient_id
+                {"$set": data_document, "$unset": unset_fields}, # Data to insert/update
                 upsert=True                  # Create if doesn't exist
             )
+            self.cache.invalidate(patient_id)
 
             if result.upserted_id:
-                print(f"Đã lưu dữ liệu CSV mới cho bệnh nhân ID {patient.id} vào collection '{self.data_collection.name}' với _id: {result.upserted_id}.")
-                return "Lưu dữ liệu CSV thành công."
+                print(f"Đã lưu dữ liệu bàn chân mới cho bệnh nhân ID {patient_id} vào collection '{self.data_collection.name}' với _id: {result.upserted_id}.")
+                return "Lưu dữ liệu bàn chân thành công."
             elif result.modified_count > 0:
-                 print(f"Đã cập nhật (ghi đè) dữ liệu CSV cho bệnh nhân ID {patient.id} trong collection '{self.data_collection.name}'.")
-                 return "Cập nhật (ghi đè) dữ liệu CSV thành công."
+                 print(f"Đã cập nhật (ghi đè) dữ liệu bàn chân cho bệnh nhân ID {patient_id} trong collection '{self.data_collection.name}'.")
+                 return "Cập nhật (ghi đè) dữ liệu bàn chân thành công."
             else:
                  # This case (matched but not modified) might happen if the exact same data is saved again
-                 print(f"Dữ liệu CSV cho bệnh nhân ID {patient.id} không thay đổi.")
-                 return "Dữ liệu CSV không thay đổi."
+                 print(f"Dữ liệu bàn chân cho bệnh nhân ID {patient_id} không thay đổi.")
+                 return "Dữ liệu bàn chân không thay đổi."
+
+        except Exception as e:
+            print(f"Lỗi khi lưu dữ liệu bàn chân vào MongoDB: {e}")
+            return f"Lỗi khi lưu dữ liệu bàn chân vào MongoDB: {e}"
 
+    # --- NEW: Thêm truy vấn data của patient ---
+    # Renamed save_csv_to_mongodb to be specific to patient data
+    def save_patient_csv_data(self, patient_id: str, csv_file_path: str) -> str:
+        """
+        Lưu dữ liệu ma trận (ví dụ 60x60) từ file CSV vào MongoDB, liên kết với patient_id.
+        Đọc file rồi gọi save_patient_matrix. Ghi đè nếu dữ liệu cho patient_id này đã tồn tại.
+        Args:
+            patient_id (str): ID FHIR của bệnh nhân liên quan.
+            csv_file_path (str): Đường dẫn đến file CSV.
+        Returns:
+            str: Thông báo kết quả.
+        """
+        try:
+            matrix = pd.read_csv(csv_file_path, header=None).values
         except FileNotFoundError:
             print(f"Lỗi: Không tìm thấy file CSV tại đường dẫn: {csv_file_path}")
             return f"Lỗi: Không tìm thấy file CSV tại đường dẫn: {csv_file_path}"
@@ -341,8 +652,9 @@ class MongoDBManager:
              print(f"Lỗi: File CSV '{csv_file_path}' rỗng.")
              return f"Lỗi: File CSV '{csv_file_path}' rỗng."
         except Exception as e:
-            print(f"Lỗi khi đọc hoặc lưu CSV vào MongoDB: {e}")
-            return f"Lỗi khi đọc hoặc lưu CSV vào MongoDB: {e}"
+            print(f"Lỗi khi đọc file CSV: {e}")
+            return f"Lỗi khi đọc file CSV: {e}"
+        return self.save_patient_matrix(patient_id, matrix)
 
     def get_patient_csv_data(self, patient_id: str):
         """
@@ -353,13 +665,197 @@ class MongoDBManager:
             Optional[dict]: Dictionary chứa dữ liệu ma trận (ví dụ: {"0": [...], "1": [...]})
                            hoặc None nếu không tìm thấy.
         """
-        data_doc = self.data_collection.find_one({"patient_id": patient_id})
+        data_doc = self.data_collection.find_one({"patient_id": patient_id}, {"data": 1, "matrix": 1})
         if data_doc and "data" in data_doc:
             return data_doc["data"]
+        elif data_doc and "matrix" in data_doc:
+            # Dữ liệu đã lưu dạng nhị phân -> chuyển lại về định dạng dict cũ cho tương thích
+            matrix = decode_matrix(data_doc)
+            return {str(i): row.tolist() for i, row in enumerate(matrix)}
         else:
             print(f"Không tìm thấy dữ liệu CSV cho bệnh nhân ID: {patient_id}")
             return None
 
+    def get_patient_matrix(self, patient_id: str, with_geometry: bool = False):
+        """
+        Lấy ma trận dữ liệu bàn chân của bệnh nhân dưới dạng numpy array (qua cache).
+        Dữ liệu nhị phân được giải mã bằng np.frombuffer (không sao chép); ma trận trả về luôn chỉ đọc.
+        Args:
+            patient_id (str): ID FHIR của bệnh nhân.
+            with_geometry (bool): Trả về kèm lưới cảm biến đã lưu (dữ liệu cũ: suy ra từ kích thước).
+        Returns:
+            Optional[np.ndarray]: Ma trận (hoặc tuple (ma trận, SensorGeometry) nếu with_geometry),
+                                  None nếu không tìm thấy.
+        Raises:
+            ValueError: Nếu dữ liệu đã lưu không giải mã được.
+        """
+        loaded = self._load_latest_data(patient_id)
+        if loaded is None:
+            print(f"Không tìm thấy dữ liệu bàn chân cho bệnh nhân ID: {patient_id}")
+            return None
+        return loaded[:2] if with_geometry else loaded[0]
+
+    def _load_latest_data(self, patient_id: str):
+        """
+        (ma trận, SensorGeometry, captured_at, bản ghi arch_index đã lưu hoặc None) của lần đo mới nhất,
+        qua cache; None nếu không có dữ liệu. Một truy vấn theo index patient_id lấy cả ma trận và kết quả AI.
+        """
+        loaded = self.cache.get(patient_id, "matrix")
+        if loaded is MISSING:
+            token = self.cache.token()
+            data_doc = self.data_collection.find_one({"patient_id": patient_id},
+                                                     {"data": 1, "matrix": 1, "sensor": 1, "captured_at": 1, "arch_index": 1})
+            loaded = None
+            if data_doc and ("data" in data_doc or "matrix" in data_doc):
+                matrix = decode_matrix(data_doc)
+                matrix.setflags(write=False) # Dùng chung qua cache
+                loaded = (matrix, geometry_from_doc(data_doc, matrix.shape), data_doc.get("captured_at"),
+                          data_doc.get("arch_index"))
+            self.cache.put(patient_id, "matrix", loaded, token)
+        return loaded
+
+    def get_patient_arch_index(self, patient_id: str, pipeline):
+        """
+        Kết quả Arch Index của lần đo mới nhất của bệnh nhân với pipeline cho trước.
+        Dùng bản ghi "arch_index" đã lưu kèm lần đo nếu params_hash khớp pipeline.params(); không thì
+        tính lại (các lần chạy pipeline được tuần tự hóa, gọi được từ thread khác) và ghi đè vào
+        data_collection và document lần đo cùng captured_at. Kết quả được nhớ trong cache theo hash.
+        Args:
+            patient_id (str): ID FHIR của bệnh nhân.
+            pipeline (ArchIndexPipeline): Pipeline đã cấu hình.
+        Returns:
+            Optional[dict]: Bản ghi dạng make_arch_index_record ({'left': {'AI', 'type', 'height_need'},
+                            'right': {...}, 'params', 'params_hash', 'computed_at'}),
+                            None nếu bệnh nhân chưa có dữ liệu bàn chân.
+        Raises:
+            ValueError: Nếu ma trận có NaN/Inf hoặc rỗng.
+        """
+        params = pipeline.params()
+        key = params_hash(params)
+        slot = ("arch_index", key)
+        cached = self.cache.get(patient_id, slot)
+        if cached is not MISSING:
+            return cached
+        token = self.cache.token()
+        loaded = self._load_latest_data(patient_id)
+        if loaded is None:
+            return None
+        matrix, _geometry, captured_at, stored = loaded
+        if stored and record_params_hash(stored) == key:
+            record = {**stored, "left": _with_height_need(stored["left"]), "right": _with_height_need(stored["right"]),
+                      "params_hash": key} # Bản ghi cũ có thể thiếu height_need/params_hash
+        else:
+            if not check_data(matrix):
+                raise ValueError("Dữ liệu bàn chân không hợp lệ (rỗng, NaN hoặc Inf).")
+            with self._pipeline_lock:
+                ai_results = pipeline.process(matrix)
+            record = make_arch_index_record(ai_results, params)
+            # Chỉ ghi vào đúng lần đo đã tính (lần đo mới hơn lưu trong lúc tính không bị ghi đè)
+            scan_filter = {"patient_id": patient_id, "captured_at": captured_at}
+            self.data_collection.update_one(scan_filter, {"$set": {"arch_index": record}})
+            self.scan_collection.update_one(scan_filter, {"$set": {"arch_index": record}})
+            print(f"Đã tính lại và lưu Arch Index cho bệnh nhân ID: {patient_id}")
+        self.cache.put(patient_id, slot, record, token)
+        return record
+
+    # --- Lịch sử các lần đo ---
+
+    def _scan_projection(self, include_matrix: bool) -> dict:
+        """Projection cho truy vấn lịch sử: mặc định bỏ ma trận để chỉ tải metadata và kết quả AI."""
+        return {"patient_id": 1, "captured_at": 1, "sensor": 1, "arch_index": 1, "matrix": 1} if include_matrix \
+            else {"patient_id": 1, "captured_at": 1, "sensor": 1, "arch_index": 1}
+
+    @staticmethod
+    def _decode_scan(scan_doc: dict) -> dict:
+        """Giải mã trường matrix của document lần đo (nếu có) thành numpy array."""
+        if "matrix" in scan_doc:
+            scan_doc["matrix"] = decode_matrix(scan_doc)
+        return scan_doc
+
+    def get_latest_scan(self, patient_id: str, include_matrix: bool = False):
+        """
+        Lấy lần đo mới nhất của bệnh nhân.
+        Args:
+            patient_id (str): ID FHIR của bệnh nhân.
+            include_matrix (bool): Có tải kèm ma trận hay không.
+        Returns:
+            Optional[dict]: Document lần đo (_id, patient_id, captured_at, sensor, arch_index[, matrix]) hoặc None.
+        """
+        scan_doc = self.scan_collection.find_one({"patient_id": patient_id}, self._scan_projection(include_matrix),
+                                                 sort=[("captured_at", DESCENDING), ("_id", DESCENDING)])
+        return self._decode_scan(scan_doc) if scan_doc else None
+
+    def find_scans(self, patient_id: str, start: datetime | None = None, end: datetime | None = None,
+                   page_size: int = 20, before: dict | None = None, include_matrix: bool = False) -> list:
+        """
+        Lấy các lần đo của bệnh nhân trong khoảng thời gian [start, end), mới nhất trước, theo trang.
+        Args:
+            patient_id (str): ID FHIR của bệnh nhân.
+            start, end (datetime, optional): Giới hạn thời gian đo.
+            page_size (int): Số lần đo tối đa mỗi trang.
+            before (dict, optional): Lần đo cuối của trang trước; trang tiếp theo bắt đầu ngay sau nó.
+            include_matrix (bool): Có tải kèm ma trận hay không.
+        Returns:
+            List[dict]: Danh sách document lần đo.
+        """
+        query = {"patient_id": patient_id}
+        time_range = {}
+        if start is not None:
+            time_range["$gte"] = start
+        if end is not None:
+            time_range["$lt"] = end
+        if time_range:
+            query["captured_at"] = time_range
+        if before is not None:
+            # Phân trang theo khóa (captured_at, _id) thay vì skip để không phải quét lại các trang trước
+            query["$or"] = [{"captured_at": {"$lt": before["captured_at"]}},
+                            {"captured_at": before["captured_at"], "_id": {"$lt": before["_id"]}}]
+        cursor = (self.scan_collection.find(query, self._scan_projection(include_matrix))
+                  .sort([("captured_at", DESCENDING), ("_id", DESCENDING)])
+                  .limit(page_size))
+        return [self._decode_scan(scan_doc) for scan_doc in cursor]
+
+    def migrate_matrix_storage(self, batch_size: int = 500, dry_run: bool = False) -> dict:
+        """
+        Chuyển các document còn lưu ma trận dạng dict-of-lists ("data") sang dạng nhị phân ("matrix").
+        Args:
+            batch_size (int): Số document ghi mỗi lần bulk_write.
+            dry_run (bool): Chỉ tính dung lượng tiết kiệm, không ghi.
+        Returns:
+            dict: {"converted", "failed", "bytes_before", "bytes_after"} (dung lượng BSON của trường ma trận).
+        """
+        stats = {"converted": 0, "failed": 0, "bytes_before": 0, "bytes_after": 0}
+        operations = []
+        cursor = self.data_collection.find({"data": {"$exists": True}, "matrix": {"$exists": False}},
+                                           {"patient_id": 1, "data": 1}).batch_size(batch_size)
+        for doc in cursor:
+            try:
+                encoded = encode_matrix(matrix_from_data_dict(doc["data"]), self.matrix_dtype)
+            except Exception as e:
+                stats["failed"] += 1
+                print(f"Không thể chuyển dữ liệu của bệnh nhân ID {doc.get('patient_id', 'N/A')}: {e}")
+                continue
+            stats["converted"] += 1
+            stats["bytes_before"] += len(bson.encode({"data": doc["data"]}))
+            stats["bytes_after"] += len(bson.encode({"matrix": encoded}))
+            if dry_run:
+                continue
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"matrix": encoded}, "$unset": {"data": ""}}))
+            if len(operations) >= batch_size:
+                self.data_collection.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            self.data_collection.bulk_write(operations, ordered=False)
+        if not dry_run and stats["converted"]:
+            self.cache.clear()
+
+        saved = stats["bytes_before"] - stats["bytes_after"]
+        ratio = saved / stats["bytes_before"] if stats["bytes_before"] else 0.0
+        print(f"{'[Dry run] ' if dry_run else ''}Đã chuyển {stats['converted']} bản ghi sang dạng nhị phân "
+              f"({stats['failed']} lỗi): {stats['bytes_before']:,} -> {stats['bytes_after']:,} byte, "
+              f"tiết kiệm {saved:,} byte ({ratio:.1%}).")
+        return stats
+
     # --- NEW: Thêm yếu tố cập nhật dữ liệu csv của patient ---
     # This is effectively handled by save_patient_csv_data now, as it overwrites.
     # We can keep update_patient_csv_data as an alias for clarity if desired.
@@ -0,0 +1,96 @@
+# --- START OF FILE database/patient_cache.py ---
+"""
+Cache đọc xuyên (read-through) theo bệnh nhân cho MongoDBManager.
+
+Mỗi bệnh nhân có một mục chứa nhiều "ngăn" (slot), mỗi ngăn nạp độc lập khi được đọc lần đầu:
+    "patient"    -> Patient model (get_patient_by_id)
+    "matrix"     -> (ma trận chỉ đọc, SensorGeometry, captured_at, arch_index đã lưu) (get_patient_matrix)
+    ("arch_index", hash tham số pipeline) -> bản ghi kết quả AI (get_patient_arch_index)
+Giới hạn theo số bệnh nhân (LRU, max_entries) và theo thời gian (ttl giây kể từ lúc mục được tạo);
+ghi vào bệnh nhân (update/delete/lưu lần đo mới) gọi invalidate(patient_id) để bỏ cả mục.
+
+Giá trị được trả về nguyên đối tượng đã nhớ (không sao chép): ma trận đã được khóa ghi, các giá trị
+khác bên gọi không được sửa. An toàn khi dùng từ nhiều thread (AsyncDBManager): bên đọc lấy token()
+trước khi truy vấn MongoDB và truyền vào put(); nếu có invalidate/clear trong lúc truy vấn, giá trị
+(có thể đã cũ) không được nhớ.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+# --- Constants ---
+DEFAULT_CACHE_SIZE = 128 # Số bệnh nhân
+DEFAULT_CACHE_TTL = 300.0 # Giây
+MISSING = object() # get() không có giá trị (khác None: "không có dữ liệu" cũng được nhớ)
+
+
+class PatientCache:
+    """LRU + TTL theo patient_id, mỗi mục là dict slot -> giá trị."""
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE, ttl: float | None = DEFAULT_CACHE_TTL,
+                 clock=time.monotonic):
+        if max_entries < 0:
+            raise ValueError(f"max_entries không hợp lệ: {max_entries}")
+        self.max_entries = max_entries # 0: tắt cache
+        self.ttl = ttl # None: không hết hạn
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # patient_id -> (thời điểm tạo, {slot: giá trị})
+        self._epoch = 0 # Tăng mỗi lần invalidate/clear
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, patient_id: str, slot: str):
+        """Giá trị đã nhớ hoặc MISSING (đếm hit/miss)."""
+        with self._lock:
+            entry = self._entry(patient_id)
+            value = MISSING if entry is None else entry.get(slot, MISSING)
+            self.stats["misses" if value is MISSING else "hits"] += 1
+            return value
+
+    def token(self) -> int:
+        """Lấy trước khi đọc MongoDB, truyền vào put()."""
+        return self._epoch
+
+    def put(self, patient_id: str, slot: str, value, token: int | None = None):
+        with self._lock:
+            if self.max_entries == 0 or (token is not None and token != self._epoch):
+                return
+            entry = self._entry(patient_id)
+            if entry is None:
+                entry = {}
+                self._entries[patient_id] = (self._clock(), entry)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.stats["evictions"] += 1
+            entry[slot] = value
+
+    def invalidate(self, patient_id: str):
+        """Bỏ mọi giá trị đã nhớ của bệnh nhân."""
+        with self._lock:
+            self._epoch += 1
+            if self._entries.pop(patient_id, None) is not None:
+                self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def _entry(self, patient_id: str):
+        """Mục còn hạn của bệnh nhân (đưa lên cuối LRU) hoặc None. Gọi khi đang giữ _lock."""
+        item = self._entries.get(patient_id)
+        if item is None:
+            return None
+        created, entry = item
+        if self.ttl is not None and self._clock() - created > self.ttl:
+            del self._entries[patient_id]
+            self.stats["expired"] += 1
+            return None
+        self._entries.move_to_end(patient_id)
+        return entry
+
+# --- END OF FILE database/patient_cache.py ---
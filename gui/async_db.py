@@ -0,0 +1,164 @@
+# --- START OF FILE gui/async_db.py ---
+"""
+Gọi MongoDBManager trên thread pool để thread GUI không bao giờ chờ MongoDB.
+
+    request = async_db.call("search_patients", term, group="search")
+    request.then(on_done, on_error)   # callback chạy trên thread GUI
+
+- call() trả về DBRequest bọc một concurrent.futures.Future; kết quả được đưa về thread GUI qua
+  signal Qt (kết nối queued vì signal phát từ thread worker).
+- group: yêu cầu mới trong cùng group hủy yêu cầu cũ (vd. tìm kiếm khi người dùng đang gõ, chọn bệnh
+  nhân khác khi dữ liệu bệnh nhân trước chưa tải xong). Yêu cầu chưa chạy bị bỏ khỏi hàng đợi; yêu cầu
+  đang chạy không dừng được giữa chừng (pymongo) nhưng kết quả bị bỏ, callback không được gọi.
+- Các lệnh chỉ đọc (COALESCED_METHODS) cùng tên và tham số đang chạy được gộp: trả về cùng DBRequest,
+  chỉ một truy vấn tới MongoDB. Các yêu cầu đã gộp dùng chung trạng thái hủy.
+- Sau mỗi lệnh ghi (WRITE_METHODS) signal data_changed(tên lệnh) được phát trên thread GUI, trước các
+  callback của lệnh đó, để các cache phía giao diện (vd. kết quả tìm kiếm) bị xóa.
+MongoClient của pymongo an toàn khi dùng từ nhiều thread.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+# --- Constants ---
+DEFAULT_WORKERS = 4
+COALESCED_METHODS = frozenset({"search_patients", "get_patient_by_id", "get_patient_matrix",
+                               "get_patient_arch_index", "get_latest_scan", "find_scans"})
+WRITE_METHODS = frozenset({"save_patient", "update_patient", "delete_patient", "remove_duplicate_patients",
+                           "backfill_search_keys", "save_patient_matrix"})
+
+
+def _freeze(value):
+    """Dạng hashable của tham số để so khớp các yêu cầu trùng (dict/list lồng nhau -> tuple)."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class DBRequest:
+    """Một lời gọi MongoDBManager đang chờ kết quả."""
+
+    def __init__(self, name: str, key, group: str | None):
+        self.name = name
+        self.key = key     # Khóa gộp yêu cầu trùng (None nếu không gộp)
+        self.group = group
+        self.future = None
+        self.cancelled = False
+        self._callbacks = [] # (on_done, on_error)
+        self._delivered = False # Kết quả đã được đưa về thread GUI
+
+    def then(self, on_done=None, on_error=None) -> "DBRequest":
+        """
+        Đăng ký callback (chạy trên thread GUI): on_done(kết quả), on_error(ngoại lệ).
+        Nếu kết quả đã được đưa về thread GUI, callback được gọi ngay.
+        """
+        if self._delivered:
+            self._run_callback(on_done, on_error)
+        else:
+            self._callbacks.append((on_done, on_error))
+        return self
+
+    def cancel(self):
+        """Bỏ yêu cầu: hủy nếu chưa chạy, không gọi callback nếu đang chạy."""
+        self.cancelled = True
+        if self.future is not None:
+            self.future.cancel()
+
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    def _run_callback(self, on_done, on_error):
+        if self.cancelled or self.future.cancelled():
+            return
+        error = self.future.exception()
+        if error is None:
+            if on_done is not None:
+                on_done(self.future.result())
+        elif on_error is not None:
+            on_error(error)
+        else:
+            print(f"Database request {self.name} failed: {error}")
+
+    def _deliver(self):
+        self._delivered = True
+        callbacks, self._callbacks = self._callbacks, []
+        for on_done, on_error in callbacks:
+            self._run_callback(on_done, on_error)
+
+
+class AsyncDBManager(QObject):
+    """Mặt tiền bất đồng bộ cho MongoDBManager, dùng chung bởi các trang của ứng dụng."""
+    _finished = pyqtSignal(object) # DBRequest đã xong, phát từ thread worker
+    data_changed = pyqtSignal(str) # Tên lệnh ghi vừa chạy xong (thành công hay lỗi)
+
+    def __init__(self, db_manager, max_workers: int = DEFAULT_WORKERS, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mongodb")
+        self._in_flight = {} # key -> DBRequest (chỉ các lệnh gộp được)
+        self._groups = {}    # group -> DBRequest mới nhất
+        self.stats = {"submitted": 0, "coalesced": 0, "cancelled": 0}
+        self._finished.connect(self._on_finished)
+
+    def call(self, method: str, *args, group: str | None = None, **kwargs) -> DBRequest:
+        """Gọi db_manager.<method>(*args, **kwargs) trên thread pool."""
+        key = None
+        if method in COALESCED_METHODS:
+            key = (method, _freeze(args), _freeze(kwargs))
+        return self._submit(method, key, group, getattr(self.db_manager, method), args, kwargs)
+
+    def submit(self, func, *args, group: str | None = None, **kwargs) -> DBRequest:
+        """Chạy func(*args, **kwargs) bất kỳ trên thread pool (vd. nhiều lệnh database nối tiếp nhau)."""
+        return self._submit(getattr(func, "__name__", repr(func)), None, group, func, args, kwargs)
+
+    def _submit(self, name, key, group, func, args, kwargs) -> DBRequest:
+        previous = self._groups.get(group) if group is not None else None
+        request = self._in_flight.get(key) if key is not None else None
+        if request is not None:
+            self.stats["coalesced"] += 1
+        else:
+            request = DBRequest(name, key, group)
+            if key is not None:
+                self._in_flight[key] = request
+            self.stats["submitted"] += 1
+            request.future = self._executor.submit(func, *args, **kwargs)
+            # Phát từ thread worker -> Qt chuyển về thread GUI (queued connection)
+            request.future.add_done_callback(lambda _future: self._finished.emit(request))
+        if group is not None:
+            if previous is not None and previous is not request:
+                self._cancel(previous)
+            self._groups[group] = request
+        return request
+
+    def cancel_group(self, group: str):
+        """Hủy yêu cầu đang chờ của một group (vd. khi bắt đầu tìm kiếm mới)."""
+        request = self._groups.pop(group, None)
+        if request is not None:
+            self._cancel(request)
+
+    def _cancel(self, request: DBRequest):
+        if not request.done():
+            self.stats["cancelled"] += 1
+        request.cancel()
+        self._forget(request)
+
+    def _forget(self, request: DBRequest):
+        if request.key is not None and self._in_flight.get(request.key) is request:
+            del self._in_flight[request.key]
+
+    def _on_finished(self, request: DBRequest):
+        self._forget(request)
+        if request.group is not None and self._groups.get(request.group) is request:
+            del self._groups[request.group]
+        if request.name in WRITE_METHODS and not request.future.cancelled():
+            self.data_changed.emit(request.name)
+        request._deliver()
+
+    def shutdown(self):
+        """Hủy các yêu cầu chưa chạy và chờ các yêu cầu đang chạy (trước khi đóng kết nối)."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+# --- END OF FILE gui/async_db.py ---
@@ -17,13 +17,15 @@ from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 
 # --- THÊM IMPORT CỬA SỔ HEATMAP MỚI ---
 from gui.serial_heatmap import SerialHeatmapWindow # Đảm bảo đường dẫn đúng
+from components.sensor_geometry import SensorGeometry, SENSOR_GEOMETRIES, DEFAULT_SENSOR, ANALYSIS_GEOMETRY
 
 try:
     # <<< KIỂM TRA LẠI TÊN FILE MANAGER CỦA BẠN >>>
     # Nếu bạn dùng file gốc là manager_mongodb.py thì đổi lại ở đây
-    from database.manager_mongodb_2 import MongoDBManager
+    from database.manager_mongodb_2 import MongoDBManager, make_arch_index_record
     # <<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<
     from components import archindex
+    from gui.async_db import AsyncDBManager
     # Bỏ import serial ở đây nếu không dùng trực tiếp nữa
     # from components import serial
 except ImportError as e:
@@ -32,10 +34,12 @@ except ImportError as e:
 
 
 class CreatePatientPage(QWidget):
-    def __init__(self, stacked_widget, db_manager: MongoDBManager):
+    def __init__(self, stacked_widget, db_manager: MongoDBManager, async_db: AsyncDBManager | None = None):
         super().__init__()
         self.stacked_widget = stacked_widget
         self.db_manager = db_manager
+        # Ghi database trên thread pool để giao diện không bị treo khi lưu
+        self.async_db = async_db or AsyncDBManager(db_manager, parent=self)
         self.setWindowTitle("Tạo Hồ Sơ Bệnh Nhân Mới")
         # Tăng kích thước cửa sổ mặc định để có chỗ cho heatmap cao hơn
         self.setGeometry(100, 100, 1050, 800)
@@ -91,17 +95,18 @@ class CreatePatientPage(QWidget):
         self.setStyleSheet("QLabel { color: white; }")
 
         # --- Khai báo biến ---
-        self.expected_rows = 60 # Số hàng mong đợi
-        self.expected_cols = 60# Số cột mong đợi
-        self.sensor_rows = 60   # Giả định cửa sổ heatmap trả về 60x60
-        self.sensor_cols = 60
+        self.sensor_geometry = SENSOR_GEOMETRIES[DEFAULT_SENSOR] # Thảm mặc định của cửa sổ cảm biến
+        self.min_rows = self.min_cols = 3 # Lưới nhỏ hơn không lọc nhiễu được (cửa sổ 3x3)
 
         self.current_data_matrix = None
+        self.current_geometry = None # SensorGeometry của dữ liệu hiện tại, lưu kèm lần đo
         self.current_data_is_compatible = False
         self.current_data_origin = None
-        self.temp_csv_path = None
         self.heatmap_window = None
         self.cbar = None # <<< THÊM: Biến lưu trữ colorbar
+        # Pipeline Arch Index cấu hình một lần (profile "clinic": input 0-5V, ngưỡng ngón chân 15, cùng trang Load
+        # để kết quả lưu kèm lần đo được dùng lại); dữ liệu từ thảm có lưới khác được resample về lưới 60x60
+        self.ai_pipeline = archindex.ArchIndexPipeline.from_profile(archindex.CLINIC_PROFILE)
 
         # --- Layout chính ---
         main_layout = QHBoxLayout(self)
@@ -153,10 +158,10 @@ class CreatePatientPage(QWidget):
         # === KẾT THÚC THÊM HÌNH ẢNH ===
         # --- Action Buttons ---
         btn_layout = QGridLayout()
-        self.btn_load_csv = QPushButton("1. Load CSV (60x60)")
-        self.btn_load_sensor = QPushButton(f"1. Mở Cửa Sổ Cảm Biến ({self.sensor_rows}x{self.sensor_cols})")
-        self.btn_calculate_ai = QPushButton("2. Tính Arch Index (Yêu cầu 60x60)")
-        self.btn_save_patient = QPushButton("3. Lưu Bệnh Nhân (Yêu cầu 60x60)")
+        self.btn_load_csv = QPushButton("1. Load CSV")
+        self.btn_load_sensor = QPushButton(f"1. Mở Cửa Sổ Cảm Biến ({self.sensor_geometry})")
+        self.btn_calculate_ai = QPushButton("2. Tính Arch Index")
+        self.btn_save_patient = QPushButton("3. Lưu Bệnh Nhân")
         self.btn_clear_form = QPushButton("Xóa Form")
         self.btn_back = QPushButton("⬅ Quay lại Home")
 
@@ -216,7 +221,7 @@ class CreatePatientPage(QWidget):
 
         # <<< KHỞI TẠO HEATMAP VÀ COLORBAR >>>
         # Dùng dữ liệu NaN để không vẽ gì ban đầu
-        initial_data = np.full((self.expected_rows, self.expected_cols), np.nan)
+        initial_data = np.full(ANALYSIS_GEOMETRY.shape, np.nan)
         self.heatmap_im = self.ax.imshow(initial_data, cmap='jet', interpolation='gaussian', origin='lower', vmin=0, vmax=1) # vmax=1 ban đầu
         self.cbar = self.figure.colorbar(self.heatmap_im, ax=self.ax)
         self.cbar.ax.yaxis.set_tick_params(color='white')
@@ -288,17 +293,13 @@ class CreatePatientPage(QWidget):
         self.address_input.clear()
 
         self.current_data_matrix = None # <<< Đặt lại data = None
+        self.current_geometry = None
         self.current_data_origin = None
         self.current_data_is_compatible = False
         # <<< Gọi display_heatmap để reset plot >>>
         self.display_heatmap()
         # <<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<
 
-        if self.temp_csv_path and os.path.exists(self.temp_csv_path):
-             try: os.remove(self.temp_csv_path)
-             except OSError as e: print(f"Could not remove temp file {self.temp_csv_path}: {e}")
-        self.temp_csv_path = None
-
         self.ai_result_label.setText("Chỉ số Arch Index: Chưa tính")
         # Sửa status label ở đây thay vì trong timer timeout
         self.status_label.setStyleSheet("color: white;")
@@ -309,25 +310,26 @@ class CreatePatientPage(QWidget):
         self.btn_save_patient.setEnabled(False)
 
     def load_csv_data(self):
-        """Loads data from CSV (60x60)."""
+        """Loads data from CSV (any grid; the pipeline resamples it to the analysis grid)."""
         options = QFileDialog.Options()
-        file_name, _ = QFileDialog.getOpenFileName(self, "Chọn file CSV 60x60", "", "CSV Files (*.csv);;All Files (*)", options=options)
+        file_name, _ = QFileDialog.getOpenFileName(self, "Chọn file CSV ma trận cảm biến", "", "CSV Files (*.csv);;All Files (*)", options=options)
         if file_name:
             try:
                 # Đọc dữ liệu (có thể dùng pandas hoặc numpy)
                 # Giả sử đọc thành công vào df
                 df = pd.read_csv(file_name, header=None) # Hoặc np.loadtxt
-                if df.shape <=(self.expected_rows, self.expected_cols):
+                if df.shape[0] >= self.min_rows and df.shape[1] >= self.min_cols:
                     self.current_data_matrix = df.values.astype(float)
+                    self.current_geometry = SensorGeometry.from_shape(self.current_data_matrix.shape)
                     self.current_data_origin = 'csv'
                     self.current_data_is_compatible = True
                     self.display_heatmap() # <<< Gọi display_heatmap để cập nhật plot
-                    self.update_status(f"Tải thành công file CSV ({self.expected_rows}x{self.expected_cols}): {os.path.basename(file_name)}")
+                    self.update_status(f"Tải thành công file CSV ({self.current_geometry}): {os.path.basename(file_name)}")
                     self.ai_result_label.setText("Chỉ số Arch Index: Chưa tính (Nhấn nút 2)")
                     self.btn_calculate_ai.setEnabled(True)
                     self.btn_save_patient.setEnabled(True)
                 else:
-                    QMessageBox.warning(self, "Lỗi Kích Thước", f"File CSV phải có kích thước {self.expected_rows}x{self.expected_cols}. File đã chọn có kích thước {df.shape}.")
+                    QMessageBox.warning(self, "Lỗi Kích Thước", f"File CSV phải có ít nhất {self.min_rows}x{self.min_cols} ô. File đã chọn có kích thước {df.shape}.")
                     self.current_data_matrix = None # Đặt lại data nếu lỗi
                     self.current_data_origin = None
                     self.current_data_is_compatible = False
@@ -346,7 +348,7 @@ class CreatePatientPage(QWidget):
     def open_sensor_window(self):
         """Mở cửa sổ hiển thị heatmap trực tiếp từ cảm biến."""
         if self.heatmap_window is None or not self.heatmap_window.isVisible():
-            self.heatmap_window = SerialHeatmapWindow()
+            self.heatmap_window = SerialHeatmapWindow(geometry=self.sensor_geometry)
             self.heatmap_window.data_captured.connect(self.handle_sensor_data_captured)
             self.heatmap_window.show()
             self.update_status("Đã mở cửa sổ cảm biến. Vui lòng chọn cổng và kết nối.", duration=0)
@@ -356,20 +358,23 @@ class CreatePatientPage(QWidget):
 
     # Sửa lại handle_sensor_data_captured
     def handle_sensor_data_captured(self, captured_matrix):
-        """Xử lý dữ liệu ma trận 60x60 nhận được từ cửa sổ SerialHeatmapWindow."""
+        """Xử lý ma trận nhận được từ cửa sổ SerialHeatmapWindow (theo lưới của thảm đã chọn trong cửa sổ)."""
         if captured_matrix is not None and isinstance(captured_matrix, np.ndarray):
-             if captured_matrix.shape == (self.sensor_rows, self.sensor_cols):
+             geometry = self.heatmap_window.geometry if self.heatmap_window is not None else self.sensor_geometry
+             if captured_matrix.shape == geometry.shape:
+                 self.sensor_geometry = geometry # Lần mở cửa sổ sau dùng lại thảm này
                  self.current_data_matrix = captured_matrix
+                 self.current_geometry = geometry
                  self.current_data_origin = 'sensor_capture'
-                 self.current_data_is_compatible = True # Dữ liệu 60x60 từ sensor giờ tương thích
+                 self.current_data_is_compatible = True # pipeline resample về lưới phân tích khi tính AI
                  self.display_heatmap() # <<< Gọi display_heatmap để cập nhật plot
-                 self.update_status(f"Đã nhận dữ liệu {self.sensor_rows}x{self.sensor_cols} từ cảm biến.")
+                 self.update_status(f"Đã nhận dữ liệu {geometry} từ cảm biến.")
                  self.ai_result_label.setText("Chỉ số Arch Index: Chưa tính (Nhấn nút 2)")
                  self.btn_calculate_ai.setEnabled(True)
                  self.btn_save_patient.setEnabled(True)
              else:
                  # ... (xử lý lỗi kích thước như cũ) ...
-                 print(f"Warning: Received captured data with unexpected shape {captured_matrix.shape}. Expected {(self.sensor_rows, self.sensor_cols)}")
+                 print(f"Warning: Received captured data with unexpected shape {captured_matrix.shape}. Expected {geometry.shape}")
                  self.update_status("Lỗi: Dữ liệu chụp từ cảm biến có kích thước không đúng.", is_error=True)
                  self.current_data_matrix = None # Reset data
                  self.display_heatmap() # Reset plot
@@ -394,7 +399,7 @@ class CreatePatientPage(QWidget):
             if self.current_data_matrix is not None and self.current_data_matrix.size > 0:
                 rows, cols = self.current_data_matrix.shape
                 # --- Xác định tiêu đề plot ---
-                heatmap_display_title = f"Heatmap Dữ liệu ({rows}x{cols})"
+                heatmap_display_title = f"Heatmap Dữ liệu ({self.current_geometry or f'{rows}x{cols}'})"
                 plot_title = f"Dữ liệu ({rows}x{cols})"
                 if self.current_data_is_compatible:
                     if self.current_data_origin == 'csv':
@@ -405,6 +410,7 @@ class CreatePatientPage(QWidget):
 
                 # --- Cập nhật dữ liệu và màu sắc ---
                 self.heatmap_im.set_data(np.flip(self.current_data_matrix,axis = 0 ))
+                self.heatmap_im.set_extent((-0.5, cols - 0.5, -0.5, rows - 0.5)) # Lưới của dữ liệu (30x30, 60x60, ...)
                 # Tính min/max, xử lý NaN nếu có
                 min_val = np.nanmin(self.current_data_matrix) if np.any(np.isnan(self.current_data_matrix)) else np.min(self.current_data_matrix)
                 max_val = np.nanmax(self.current_data_matrix) if np.any(np.isnan(self.current_data_matrix)) else np.max(self.current_data_matrix)
@@ -436,8 +442,9 @@ class CreatePatientPage(QWidget):
 
             else: # Trường hợp không có dữ liệu (None hoặc rỗng)
                  # --- Reset Heatmap về trạng thái rỗng ---
-                 nan_data = np.full((self.expected_rows, self.expected_cols), np.nan)
+                 nan_data = np.full(ANALYSIS_GEOMETRY.shape, np.nan)
                  self.heatmap_im.set_data(nan_data)
+                 self.heatmap_im.set_extent((-0.5, ANALYSIS_GEOMETRY.cols - 0.5, -0.5, ANALYSIS_GEOMETRY.rows - 0.5))
                  # Reset clim về mặc định nhỏ
 
                  self.heatmap_im.set_clim(vmin=0, vmax=1)
@@ -464,9 +471,9 @@ class CreatePatientPage(QWidget):
     # Chỉ cần đảm bảo nó kiểm tra self.current_data_is_compatible
     def calculate_and_display_arch_index(self):
         if not self.current_data_is_compatible or self.current_data_matrix is None:
-            QMessageBox.warning(self, "Dữ Liệu Không Phù Hợp", "Chức năng này yêu cầu dữ liệu 60x60 hợp lệ.")
+            QMessageBox.warning(self, "Dữ Liệu Không Phù Hợp", "Chức năng này yêu cầu dữ liệu cảm biến hợp lệ.")
             # Đặt lại label AI về trạng thái chưa tính
-            self.ai_result_label.setText("Chỉ số Arch Index: Yêu cầu dữ liệu 60x60")
+            self.ai_result_label.setText("Chỉ số Arch Index: Yêu cầu dữ liệu cảm biến")
             return
         try:
             self.update_status("Đang xử lý và tính Arch Index...", duration=0) # Hiển thị trạng thái
@@ -477,15 +484,8 @@ class CreatePatientPage(QWidget):
                  self.update_status("Lỗi dữ liệu không hợp lệ (NaN, Inf).", is_error=True)
                  self.ai_result_label.setText("Chỉ số Arch Index: Lỗi dữ liệu")
                  return
-            # Chuyển đổi giá trị (giả sử đầu vào 0-5V?) -> Chỉnh input_max nếu cần
-            #processed_matrix = archindex.spin_matrix(self.current_data_matrix)
-            processed_matrix = archindex.convert_values(self.current_data_matrix, input_max=5.0)
-            processed_matrix = archindex.Isolated_point_removal(processed_matrix)
-            processed_matrix = archindex.toes_remove(processed_matrix, threshold=15)
-            processed_matrix = archindex.toes_remain_removes(processed_matrix)
-
-            # --- Tính AI cho cả hai chân ---
-            ai_results = archindex.compute_arch_index(processed_matrix)
+            # convert_values -> lọc nhiễu -> bỏ ngón chân -> tính AI cho cả hai chân trong một lần
+            ai_results = self.ai_pipeline.process(self.current_data_matrix)
 
             # --- Hiển thị kết quả ---
             if ai_results and ai_results['left']['AI'] is not None and ai_results['right']['AI'] is not None:
@@ -520,7 +520,7 @@ class CreatePatientPage(QWidget):
 
         # Kiểm tra dữ liệu tương thích
         if not self.current_data_is_compatible or self.current_data_matrix is None:
-            QMessageBox.warning(self, "Dữ Liệu Không Phù Hợp", "Chức năng Lưu Bệnh Nhân yêu cầu dữ liệu 60x60 hợp lệ.")
+            QMessageBox.warning(self, "Dữ Liệu Không Phù Hợp", "Chức năng Lưu Bệnh Nhân yêu cầu dữ liệu cảm biến hợp lệ.")
             return
 
         # ... (Phần còn lại của save_patient giữ nguyên) ...
@@ -531,56 +531,58 @@ class CreatePatientPage(QWidget):
             **({"birthDate": self.birthdate_input.text().strip()} if self.birthdate_input.text().strip() else {}),
             **({"address": self.address_input.text().strip()} if self.address_input.text().strip() else {}),
         }
-        try: # Lưu thông tin bệnh nhân
-            self.update_status(f"Đang lưu thông tin bệnh nhân ID: {patient_id}...")
-            QApplication.processEvents()
-            save_result = self.db_manager.save_patient(patient_data)
-            # ... (Xử lý kết quả save_result) ...
-            if "thành công" not in save_result.lower():
-                 self.update_status(f"Lỗi lưu thông tin: {save_result}", is_error=True, duration=10000)
-                 QMessageBox.critical(self, "Lỗi Lưu Bệnh Nhân", save_result)
-                 return
-            else:
-                 self.update_status(f"Lưu thông tin BN {patient_id} thành công. Đang lưu dữ liệu bàn chân (60x60)...")
-                 QApplication.processEvents()
-
-        except Exception as e: # Xử lý lỗi lưu bệnh nhân
-            self.update_status(f"Lỗi nghiêm trọng khi gọi save_patient: {e}", is_error=True, duration=10000)
-            QMessageBox.critical(self, "Lỗi Database", f"Lỗi kết nối hoặc lưu database: {e}")
-            return
-
-        # Lưu dữ liệu CSV (60x60)
-        self.temp_csv_path = None
-        try: # Lưu file CSV tạm và gọi manager
-            temp_dir = "temp_sensor_data"
-            os.makedirs(temp_dir, exist_ok=True)
-            self.temp_csv_path = os.path.join(temp_dir, f"data_{patient_id}_60x60.csv")
-            np.savetxt(self.temp_csv_path, self.current_data_matrix, delimiter=',')
-            data_file_to_save = self.temp_csv_path
-            print(f"Saved 60x60 data temporarily to: {self.temp_csv_path} for DB")
-
-            data_save_result = self.db_manager.save_patient_csv_data(patient_id, data_file_to_save)
-            # ... (Xử lý kết quả data_save_result) ...
-            if "thành công" in data_save_result.lower():
-                self.update_status(f"Lưu bệnh nhân ({patient_id}) và dữ liệu 60x60 thành công!", duration=8000)
-                QMessageBox.information(self, "Thành Công", f"Đã lưu thành công bệnh nhân:\nTên: {name}\nID: {patient_id}\nvà dữ liệu bàn chân 60x60 liên quan.")
-                self.clear_all() # Xóa form sau khi lưu thành công
-            else:
-                self.update_status(f"Lỗi lưu dữ liệu CSV (60x60): {data_save_result}", is_error=True, duration=10000)
-                QMessageBox.critical(self, "Lỗi Lưu Dữ Liệu", f"Lưu thông tin bệnh nhân thành công, nhưng lưu dữ liệu CSV 60x60 thất bại:\n{data_save_result}")
-
-            # ... (Xóa file tạm) ...
-            if self.temp_csv_path and os.path.exists(self.temp_csv_path):
-                try:
-                    os.remove(self.temp_csv_path)
-                    print(f"Removed temporary file: {self.temp_csv_path}")
-                    self.temp_csv_path = None
-                except OSError as e:
-                    print(f"Warning: Could not remove temporary file {self.temp_csv_path}: {e}")
-
-        except Exception as e: # Xử lý lỗi lưu CSV
-            self.update_status(f"Lỗi khi lưu dữ liệu CSV 60x60 vào DB: {e}", is_error=True, duration=10000)
-            QMessageBox.critical(self, "Lỗi Lưu Dữ Liệu", f"Đã xảy ra lỗi khi chuẩn bị hoặc lưu dữ liệu CSV 60x60: {e}")
+        # Ghi database trên thread pool: lưu thông tin bệnh nhân rồi mới lưu dữ liệu bàn chân.
+        # Ma trận/geometry được giữ lại ở đây vì form có thể bị xóa hoặc đổi dữ liệu trong lúc chờ.
+        matrix, geometry = self.current_data_matrix, self.current_geometry
+        self.btn_save_patient.setEnabled(False)
+        self.update_status(f"Đang lưu thông tin bệnh nhân ID: {patient_id}...", duration=0)
+        self.async_db.call("save_patient", patient_data).then(
+            lambda save_result: self.handle_patient_saved(patient_id, name, matrix, geometry, save_result),
+            self.handle_patient_save_failed)
+
+    def handle_patient_saved(self, patient_id, name, matrix, geometry, save_result):
+        """Kết quả save_patient: lưu tiếp ma trận bàn chân nếu thành công."""
+        # ... (Xử lý kết quả save_result) ...
+        if "thành công" not in save_result.lower():
+             self.update_status(f"Lỗi lưu thông tin: {save_result}", is_error=True, duration=10000)
+             QMessageBox.critical(self, "Lỗi Lưu Bệnh Nhân", save_result)
+             self.btn_save_patient.setEnabled(self.current_data_is_compatible)
+             return
+        self.update_status(f"Lưu thông tin BN {patient_id} thành công. Đang lưu dữ liệu bàn chân ({geometry})...", duration=0)
+
+        # Lưu ma trận dữ liệu bàn chân (theo lưới gốc của thảm, kèm geometry) trực tiếp vào DB, không qua file CSV tạm
+        try:
+            # Kết quả AI được lưu cùng lần đo để lần khám sau không phải tính lại
+            ai_record = None
+            if archindex.check_data(matrix):
+                ai_record = make_arch_index_record(self.ai_pipeline.process(matrix), self.ai_pipeline.params())
+        except Exception as e:
+            print(f"Error computing Arch Index before save: {e}")
+            ai_record = None
+        self.async_db.call("save_patient_matrix", patient_id, matrix, ai_record=ai_record, geometry=geometry).then(
+            lambda data_save_result: self.handle_patient_data_saved(patient_id, name, geometry, data_save_result),
+            lambda error: self.handle_patient_data_save_failed(geometry, error))
+
+    def handle_patient_save_failed(self, error): # Xử lý lỗi lưu bệnh nhân
+        self.update_status(f"Lỗi nghiêm trọng khi gọi save_patient: {error}", is_error=True, duration=10000)
+        QMessageBox.critical(self, "Lỗi Database", f"Lỗi kết nối hoặc lưu database: {error}")
+        self.btn_save_patient.setEnabled(self.current_data_is_compatible)
+
+    def handle_patient_data_saved(self, patient_id, name, geometry, data_save_result):
+        # ... (Xử lý kết quả data_save_result) ...
+        if "thành công" in data_save_result.lower():
+            self.update_status(f"Lưu bệnh nhân ({patient_id}) và dữ liệu {geometry} thành công!", duration=8000)
+            QMessageBox.information(self, "Thành Công", f"Đã lưu thành công bệnh nhân:\nTên: {name}\nID: {patient_id}\nvà dữ liệu bàn chân {geometry} liên quan.")
+            self.clear_all() # Xóa form sau khi lưu thành công
+        else:
+            self.update_status(f"Lỗi lưu dữ liệu bàn chân ({geometry}): {data_save_result}", is_error=True, duration=10000)
+            QMessageBox.critical(self, "Lỗi Lưu Dữ Liệu", f"Lưu thông tin bệnh nhân thành công, nhưng lưu dữ liệu bàn chân {geometry} thất bại:\n{data_save_result}")
+            self.btn_save_patient.setEnabled(self.current_data_is_compatible)
+
+    def handle_patient_data_save_failed(self, geometry, error): # Xử lý lỗi lưu dữ liệu bàn chân
+        self.update_status(f"Lỗi khi lưu dữ liệu bàn chân {geometry} vào DB: {error}", is_error=True, duration=10000)
+        QMessageBox.critical(self, "Lỗi Lưu Dữ Liệu", f"Đã xảy ra lỗi khi lưu dữ liệu bàn chân {geometry}: {error}")
+        self.btn_save_patient.setEnabled(self.current_data_is_compatible)
 
 
 # --- END OF FILE gui/create.py ---
\ No newline at end of file
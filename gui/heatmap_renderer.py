@@ -0,0 +1,85 @@
+# --- START OF FILE gui/heatmap_renderer.py ---
+
+import time
+
+import numpy as np
+
+# --- Constants ---
+DEFAULT_HYSTERESIS = 0.25     # vmax chỉ đổi khi max của frame vượt vmax hoặc giảm quá 25%
+BLIT_INTERPOLATION = "bilinear" # 'gaussian' tốn ~4x thời gian vẽ ảnh 30x30 lên canvas
+FPS_SMOOTHING = 0.1           # Hệ số EMA cho thời gian giữa hai lần vẽ
+
+
+class BlitHeatmapRenderer:
+    """
+    Vẽ heatmap trực tiếp bằng blitting: nền tĩnh (trục, colorbar, tiêu đề) được chụp lại sau mỗi
+    lần vẽ toàn bộ figure, mỗi frame chỉ vẽ lại ảnh và dòng chữ FPS rồi blit vùng của trục.
+    Colorbar chỉ vẽ lại (vẽ toàn bộ figure) khi max của frame ra khỏi dải trễ quanh vmax hiện tại.
+    """
+
+    def __init__(self, canvas, ax, image, cbar, hysteresis: float = DEFAULT_HYSTERESIS):
+        self.canvas = canvas
+        self.ax = ax
+        self.image = image
+        self.cbar = cbar
+        self.hysteresis = hysteresis
+        self.vmax = max(1, image.get_clim()[1])
+        self.background = None
+        self.fps = 0.0
+        self.frames_drawn = 0
+        self.full_redraws = 0
+        self._last_draw_time = None
+
+        self.image.set_animated(True)
+        self.image.set_interpolation(BLIT_INTERPOLATION)
+        self.fps_text = ax.text(0.02, 0.98, "", transform=ax.transAxes, va="top", ha="left",
+                                color="white", fontsize=9, animated=True,
+                                bbox={"facecolor": "black", "alpha": 0.5, "pad": 2, "edgecolor": "none"})
+        self._draw_cid = canvas.mpl_connect("draw_event", self._on_draw)
+        self.canvas.draw_idle()
+
+    def disconnect(self):
+        """Trả các artist về chế độ vẽ thường (khi chuyển sang renderer cũ)."""
+        self.canvas.mpl_disconnect(self._draw_cid)
+        self.image.set_animated(False)
+        self.fps_text.remove()
+        self.background = None
+
+    def _on_draw(self, event):
+        # Sau khi vẽ toàn bộ figure (không có artist animated): chụp nền, rồi vẽ lại ảnh lên trên
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self):
+        self.ax.draw_artist(self.image)
+        self.ax.draw_artist(self.fps_text)
+
+    def _needs_rescale(self, frame_max) -> bool:
+        return frame_max > self.vmax or frame_max < self.vmax * (1 - self.hysteresis)
+
+    def update(self, matrix: np.ndarray):
+        """Vẽ một frame mới. Trả về True nếu phải vẽ lại toàn bộ figure (đổi thang màu)."""
+        now = time.perf_counter()
+        if self._last_draw_time is not None:
+            instant_fps = 1.0 / max(now - self._last_draw_time, 1e-6)
+            self.fps = instant_fps if self.fps == 0 else self.fps + FPS_SMOOTHING * (instant_fps - self.fps)
+        self._last_draw_time = now
+        self.frames_drawn += 1
+
+        frame_max = max(1, int(np.max(matrix)))
+        self.image.set_data(matrix)
+        self.fps_text.set_text(f"{self.fps:5.1f} FPS | max {frame_max}")
+
+        if self._needs_rescale(frame_max) or self.background is None:
+            self.vmax = frame_max
+            self.image.set_clim(vmin=0, vmax=self.vmax) # colorbar dùng chung norm với ảnh
+            self.full_redraws += 1
+            self.canvas.draw_idle() # _on_draw sẽ chụp nền mới và vẽ ảnh
+            return True
+
+        self.canvas.restore_region(self.background)
+        self._draw_animated()
+        self.canvas.blit(self.ax.bbox)
+        return False
+
+# --- END OF FILE gui/heatmap_renderer.py ---
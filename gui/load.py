@@ -6,21 +6,27 @@ import pandas as pd
 import matplotlib.pyplot as plt
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
                              QLineEdit, QListWidget, QListWidgetItem, QMessageBox,
-                             QTableWidget, QTableWidgetItem, QAbstractItemView,
-                             QHeaderView, QDialog, QFormLayout, QDialogButtonBox, QApplication)
+                             QTableView, QAbstractItemView, QCheckBox,
+                             QHeaderView, QDialog, QFormLayout, QDialogButtonBox)
 from PyQt5.QtGui import QPixmap, QImage
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 
 # Assuming database and components are accessible
 try:
     from database.manager_mongodb_2 import MongoDBManager
+    from gui.async_db import AsyncDBManager
+    from gui.patient_table_model import PatientTableModel
     from models.patient import Patient # Import the Patient model
     from components import archindex # Import archindex functions
 except ImportError as e:
      print(f"Import Error in load.py: {e}. Make sure paths are correct.")
      sys.exit(1)
 
+# Group của AsyncDBManager cho chi tiết + dữ liệu bàn chân: chọn bệnh nhân khác hủy yêu cầu cũ
+PATIENT_GROUP = "patient-details"
+SEARCH_DEBOUNCE_MS = 250 # Tìm khi gõ: chờ người dùng ngừng gõ chừng này ms mới tìm
+
 
 # --- Update Patient Dialog ---
 class UpdatePatientDialog(QDialog):
@@ -92,16 +98,18 @@ class UpdatePatientDialog(QDialog):
 
 # --- Load Patient Page ---
 class LoadPatientPage(QWidget):
-    def __init__(self, stacked_widget, db_manager: MongoDBManager):
+    def __init__(self, stacked_widget, db_manager: MongoDBManager, async_db: AsyncDBManager | None = None):
         super().__init__()
         self.stacked_widget = stacked_widget
         self.db_manager = db_manager
+        # Đọc database trên thread pool (tìm kiếm, chi tiết, dữ liệu bàn chân) để giao diện không bị treo
+        self.async_db = async_db or AsyncDBManager(db_manager, parent=self)
         self.setWindowTitle("Load Hồ Sơ Bệnh Nhân")
         self.setGeometry(100, 100, 1000, 700) # Adjusted size
 
         self.setStyleSheet("""
             QLabel { color: white; }
-            QTableWidget { color: white; } /* Chữ trong ô bảng màu trắng */
+            QTableView { color: white; } /* Chữ trong ô bảng màu trắng */
             QHeaderView::section { /* Giữ lại style header cho dễ đọc */
                 background-color: #e0e0e0;
                 color: black;
@@ -116,6 +124,10 @@ class LoadPatientPage(QWidget):
         self.selected_patient_id = None
         self.current_patient_data = None # Store full data dict of selected patient
         self.current_foot_data = None # Store numpy array of selected patient's foot data
+        self.current_foot_geometry = None # SensorGeometry lưu kèm lần đo
+        # Pipeline Arch Index cấu hình một lần (profile "clinic", như trang Create), resample về lưới 60x60.
+        # Kết quả đã lưu kèm lần đo với cùng tham số được dùng lại thay vì tính lại.
+        self.ai_pipeline = archindex.ArchIndexPipeline.from_profile(archindex.CLINIC_PROFILE)
 
         main_layout = QHBoxLayout(self)
         
@@ -129,14 +141,22 @@ class LoadPatientPage(QWidget):
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("Tìm kiếm theo Tên, SĐT...")
         self.search_button = QPushButton("Tìm")
+        self.live_search_checkbox = QCheckBox("Tìm khi gõ")
+        self.live_search_checkbox.setChecked(True)
         search_layout.addWidget(self.search_input)
         search_layout.addWidget(self.search_button)
+        search_layout.addWidget(self.live_search_checkbox)
         list_layout.addLayout(search_layout)
-
-        # Patient List (Using QTableWidget for more columns)
-        self.patient_table = QTableWidget()
-        self.patient_table.setColumnCount(3) # ID, Name, Phone
-        self.patient_table.setHorizontalHeaderLabels(["ID Bệnh Nhân", "Họ Tên", "Số Điện Thoại"])
+        # Debounce: mỗi phím gõ khởi động lại timer, chỉ tìm khi người dùng ngừng gõ
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+
+        # Patient List: model tải từng trang khi cuộn tới (ID, Name, Phone)
+        self.patient_model = PatientTableModel(self.async_db, parent=self)
+        self.patient_table = QTableView()
+        self.patient_table.setModel(self.patient_model)
+        self.patient_table.setSelectionMode(QAbstractItemView.SingleSelection)
         self.patient_table.setSelectionBehavior(QAbstractItemView.SelectRows) # Select whole row
         self.patient_table.setEditTriggers(QAbstractItemView.NoEditTriggers) # Read-only
         self.patient_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch) # Stretch Name column
@@ -191,7 +211,11 @@ class LoadPatientPage(QWidget):
         # --- Connect Signals ---
         self.search_button.clicked.connect(self.search_patients)
         self.search_input.returnPressed.connect(self.search_patients) # Search on Enter
-        self.patient_table.itemSelectionChanged.connect(self.patient_selected)
+        self.search_input.textChanged.connect(self.handle_search_text_changed)
+        self.search_timer.timeout.connect(self.run_live_search)
+        self.patient_table.selectionModel().selectionChanged.connect(self.patient_selected)
+        self.patient_model.fetch_failed.connect(self.handle_fetch_failed)
+        self.patient_model.loading_changed.connect(self.handle_loading_changed)
         self.btn_update.clicked.connect(self.update_patient)
         self.btn_delete.clicked.connect(self.delete_patient)
         self.btn_back.clicked.connect(self.go_home)
@@ -205,6 +229,7 @@ class LoadPatientPage(QWidget):
 
     def clear_details(self):
         """Clears the patient details, heatmap, and disables action buttons."""
+        self.async_db.cancel_group(PATIENT_GROUP)
         self.selected_patient_id = None
         self.current_patient_data = None
         self.current_foot_data = None
@@ -222,96 +247,76 @@ class LoadPatientPage(QWidget):
         self.btn_delete.setEnabled(False)
 
 
+    def handle_search_text_changed(self, _text):
+        if self.live_search_checkbox.isChecked():
+            self.search_timer.start() # Khởi động lại nếu đang chờ
+
+    def run_live_search(self):
+        """Tìm khi gõ: bỏ qua nếu từ khóa không đổi (vd. chỉ thêm khoảng trắng cuối)."""
+        if self.search_input.text().strip() != self.patient_model.term:
+            self.search_patients()
+
     def search_patients(self):
         """Searches patients based on the input field and populates the table."""
+        self.search_timer.stop()
         search_term = self.search_input.text().strip()
         self.clear_details() # Clear details before new search
-        self.patient_table.setRowCount(0) # Clear table
-
-        try:
-            if not search_term:
-                # Load all patients if search term is empty
-                query = {}
-                patients = self.db_manager.find_patients(query)
-            else:
-                # Simple search: Check name or phone containing the term (case-insensitive)
-                # More complex searches might require different query structures
-                query = {
-                    "$or": [
-                        {"name.text": {"$regex": search_term, "$options": "i"}},
-                        {"phone": {"$regex": search_term, "$options": "i"}}
-                        # Add more fields to search here if needed (e.g., ID, gender)
-                        # {"id": {"$regex": search_term, "$options": "i"}},
-                        # {"gender": {"$regex": search_term, "$options": "i"}},
-                    ]
-                }
-                patients = self.db_manager.find_patients(query)
-
-            self.populate_patient_table(patients)
-
-        except Exception as e:
-            QMessageBox.critical(self, "Lỗi Database", f"Không thể tìm kiếm bệnh nhân: {e}")
-            print(f"Database search error: {e}")
-
-
-    def populate_patient_table(self, patients: list[Patient]):
-        """Fills the QTableWidget with patient data."""
-        self.patient_table.setRowCount(len(patients))
-        for row, patient in enumerate(patients):
-             # Ensure patient has the expected structure (especially name list)
-            patient_id = patient.id
-            name = patient.name[0].text if patient.name else "N/A"
-            phone = patient.phone if patient.phone else "N/A"
-
-            # Create table items
-            id_item = QTableWidgetItem(patient_id)
-            id_item.setData(Qt.UserRole, patient_id) # Store ID for later retrieval
-            name_item = QTableWidgetItem(name)
-            phone_item = QTableWidgetItem(phone)
-
-            # Add items to table
-            self.patient_table.setItem(row, 0, id_item)
-            self.patient_table.setItem(row, 1, name_item)
-            self.patient_table.setItem(row, 2, phone_item)
-
-        # self.patient_table.resizeColumnsToContents() # Adjust columns based on content
+        # Tìm theo tiền tố trên tên đã bỏ dấu / SĐT / ID (MongoDBManager.search_patients); từ khóa rỗng ->
+        # mọi bệnh nhân. Chỉ trang đầu được tải ngay, các trang sau tải khi cuộn tới cuối bảng.
+        # Từ khóa đã tìm gần đây hoặc gõ tiếp từ kết quả đã tải hết được lấy từ cache của model.
+        self.patient_model.set_search(search_term)
+        self.patient_model.fetchMore()
+
+    def handle_loading_changed(self, loading):
+        """Báo đang tải trang bệnh nhân trên nút tìm kiếm."""
+        self.search_button.setText("Đang tìm..." if loading else "Tìm")
+
+    def handle_fetch_failed(self, message):
+        """Lỗi database khi model tải một trang bệnh nhân."""
+        QMessageBox.critical(self, "Lỗi Database", f"Không thể tìm kiếm bệnh nhân: {message}")
+        print(f"Database search error: {message}")
 
 
     def patient_selected(self):
         """Handles the selection of a patient in the table."""
-        selected_items = self.patient_table.selectedItems()
-        if not selected_items:
+        selected_rows = self.patient_table.selectionModel().selectedRows()
+        patient_id = self.patient_model.patient_id(selected_rows[0].row()) if selected_rows else None
+        if not patient_id:
+            self.async_db.cancel_group(PATIENT_GROUP)
             self.clear_details()
             return
 
-        # Get the patient ID from the first column's UserRole data
-        selected_row = self.patient_table.currentRow()
-        id_item = self.patient_table.item(selected_row, 0)
-        if not id_item:
-            self.clear_details()
-            return
-
-        self.selected_patient_id = id_item.data(Qt.UserRole)
+        self.selected_patient_id = patient_id
         print(f"Selected Patient ID: {self.selected_patient_id}")
+        self.current_patient_data = None
+        self.btn_update.setEnabled(False)
+        self.btn_delete.setEnabled(False)
+        self.details_label.setText(f"Chi Tiết Bệnh Nhân: Đang tải ({patient_id})...")
 
-        # Fetch full patient details
-        try:
-             # Use get_patient_by_id which returns the Pydantic model
-             patient_model = self.db_manager.get_patient_by_id(self.selected_patient_id)
-             if patient_model:
-                 # Convert model to dict for easier handling and dialog passing
-                 self.current_patient_data = patient_model.model_dump(mode='json') # Use model_dump for Pydantic v2+
-                 self.display_patient_details()
-                 self.load_and_display_foot_data() # Load associated foot data
-                 self.btn_update.setEnabled(True)
-                 self.btn_delete.setEnabled(True)
-             else:
-                  QMessageBox.warning(self, "Không Tìm Thấy", f"Không tìm thấy chi tiết cho bệnh nhân ID: {self.selected_patient_id}")
-                  self.clear_details()
-        except Exception as e:
-             QMessageBox.critical(self, "Lỗi Database", f"Lỗi khi lấy chi tiết bệnh nhân: {e}")
-             print(f"Error fetching patient details: {e}")
-             self.clear_details()
+        # Fetch full patient details (chọn bệnh nhân khác trước khi xong -> yêu cầu này bị hủy)
+        self.async_db.call("get_patient_by_id", patient_id, group=PATIENT_GROUP).then(
+            lambda patient_model: self.handle_patient_loaded(patient_id, patient_model),
+            self.handle_patient_load_failed)
+
+    def handle_patient_loaded(self, patient_id, patient_model):
+        """Kết quả get_patient_by_id của bệnh nhân đang chọn."""
+        if patient_id != self.selected_patient_id:
+            return
+        if patient_model:
+            # Convert model to dict for easier handling and dialog passing
+            self.current_patient_data = patient_model.model_dump(mode='json') # Use model_dump for Pydantic v2+
+            self.display_patient_details()
+            self.load_and_display_foot_data() # Load associated foot data
+            self.btn_update.setEnabled(True)
+            self.btn_delete.setEnabled(True)
+        else:
+            QMessageBox.warning(self, "Không Tìm Thấy", f"Không tìm thấy chi tiết cho bệnh nhân ID: {self.selected_patient_id}")
+            self.clear_details()
+
+    def handle_patient_load_failed(self, error):
+        QMessageBox.critical(self, "Lỗi Database", f"Lỗi khi lấy chi tiết bệnh nhân: {error}")
+        print(f"Error fetching patient details: {error}")
+        self.clear_details()
 
 
     def display_patient_details(self):
@@ -345,51 +350,52 @@ class LoadPatientPage(QWidget):
         self.ax.clear()
         self.ax.set_title("Đang tải dữ liệu...")
         self.canvas.draw()
-        QApplication.processEvents() # Update UI
-
-        try:
-             data_dict = self.db_manager.get_patient_csv_data(self.selected_patient_id)
-             if data_dict:
-                 # Convert the dictionary format back to numpy array
-                 # Assumes format is {"0": [r0v0, r0v1,...], "1": [r1v0, r1v1,...]}
-                 try:
-                     # Use pandas to easily convert dict of lists (indexed by string numbers)
-                     df = pd.DataFrame.from_dict(data_dict, orient='index')
-                     # Ensure numeric type and correct sorting if keys were "0", "1", ...
-                     df.index = df.index.astype(int)
-                     df = df.sort_index()
-                     self.current_foot_data = df.values.astype(float)
-                     print(f"Successfully converted loaded data dict to numpy array, shape: {self.current_foot_data.shape}")
-
-                     if self.current_foot_data.shape == (60, 60):
-                        self.display_heatmap()
-                        self.calculate_and_display_arch_index() # Calculate AI after loading
-                     else:
-                         raise ValueError(f"Dữ liệu tải về có kích thước không đúng: {self.current_foot_data.shape}")
-
-                 except Exception as convert_e:
-                     print(f"Error converting stored data dict to numpy array: {convert_e}")
-                     QMessageBox.critical(self, "Lỗi Dữ Liệu", f"Không thể chuyển đổi dữ liệu bàn chân đã lưu: {convert_e}")
-                     self.ai_result_label.setText("Chỉ số Arch Index: Lỗi dữ liệu")
-                     self.ax.clear()
-                     self.ax.set_title("Lỗi định dạng dữ liệu")
-                     self.canvas.draw()
-
-             else:
-                 print(f"Không tìm thấy dữ liệu bàn chân cho bệnh nhân ID: {self.selected_patient_id}")
-                 self.ai_result_label.setText("Chỉ số Arch Index: Không có dữ liệu")
-                 self.ax.clear()
-                 self.ax.set_title("Không có dữ liệu bàn chân")
-                 self.canvas.draw()
-
-        except Exception as e:
-            QMessageBox.critical(self, "Lỗi Database", f"Lỗi khi lấy dữ liệu bàn chân: {e}")
-            print(f"Error fetching foot data: {e}")
-            self.ai_result_label.setText("Chỉ số Arch Index: Lỗi tải dữ liệu")
+
+        patient_id = self.selected_patient_id
+        self.async_db.call("get_patient_matrix", patient_id, with_geometry=True, group=PATIENT_GROUP).then(
+            lambda loaded: self.handle_foot_data_loaded(patient_id, loaded),
+            self.handle_foot_data_failed)
+
+    def handle_foot_data_loaded(self, patient_id, loaded):
+        """Kết quả get_patient_matrix: hiển thị heatmap và tính Arch Index."""
+        if patient_id != self.selected_patient_id:
+            return
+        if loaded is not None:
+            try:
+                # Ma trận được giải mã trực tiếp từ database (dạng nhị phân hoặc dict cũ)
+                foot_matrix, self.current_foot_geometry = loaded
+                self.current_foot_data = foot_matrix.astype(float)
+                print(f"Successfully loaded foot data, sensor: {self.current_foot_geometry}")
+
+                if self.current_foot_data.ndim == 2 and min(self.current_foot_data.shape) >= 3:
+                    self.display_heatmap()
+                    self.calculate_and_display_arch_index() # Calculate AI after loading
+                else:
+                    raise ValueError(f"Dữ liệu tải về có kích thước không đúng: {self.current_foot_data.shape}")
+
+            except Exception as convert_e:
+                print(f"Error converting stored foot data to numpy array: {convert_e}")
+                QMessageBox.critical(self, "Lỗi Dữ Liệu", f"Không thể chuyển đổi dữ liệu bàn chân đã lưu: {convert_e}")
+                self.ai_result_label.setText("Chỉ số Arch Index: Lỗi dữ liệu")
+                self.ax.clear()
+                self.ax.set_title("Lỗi định dạng dữ liệu")
+                self.canvas.draw()
+
+        else:
+            print(f"Không tìm thấy dữ liệu bàn chân cho bệnh nhân ID: {self.selected_patient_id}")
+            self.ai_result_label.setText("Chỉ số Arch Index: Không có dữ liệu")
             self.ax.clear()
-            self.ax.set_title("Lỗi tải dữ liệu")
+            self.ax.set_title("Không có dữ liệu bàn chân")
             self.canvas.draw()
 
+    def handle_foot_data_failed(self, error):
+        QMessageBox.critical(self, "Lỗi Database", f"Lỗi khi lấy dữ liệu bàn chân: {error}")
+        print(f"Error fetching foot data: {error}")
+        self.ai_result_label.setText("Chỉ số Arch Index: Lỗi tải dữ liệu")
+        self.ax.clear()
+        self.ax.set_title("Lỗi tải dữ liệu")
+        self.canvas.draw()
+
     def display_heatmap(self):
         """Updates the matplotlib canvas with the current foot data."""
         if self.current_foot_data is not None:
@@ -397,42 +403,51 @@ class LoadPatientPage(QWidget):
             im = self.ax.imshow(self.current_foot_data, cmap='jet', interpolation='nearest')
             self.ax.set_xticks([])
             self.ax.set_yticks([])
-            self.ax.set_title("Dữ liệu Bàn Chân")
+            self.ax.set_title(f"Dữ liệu Bàn Chân ({self.current_foot_geometry})")
             self.figure.tight_layout()
             self.canvas.draw()
         # No else needed, handled by caller
 
     def calculate_and_display_arch_index(self):
-        """Calculates Arch Index from self.current_foot_data."""
+        """
+        Arch Index của bệnh nhân đang chọn (MongoDBManager.get_patient_arch_index): kết quả đã lưu kèm lần đo
+        nếu cùng tham số pipeline, không thì tính lại trên thread worker và lưu lại.
+        """
         if self.current_foot_data is None:
             # This case should be handled by the caller, but double-check
             self.ai_result_label.setText("Chỉ số Arch Index: Không có dữ liệu để tính")
             return
 
-        try:
-            # --- Reuse calculation logic from CreatePatientPage ---
-            if not archindex.check_data(self.current_foot_data):
-                 self.ai_result_label.setText("Chỉ số Arch Index: Lỗi dữ liệu (NaN/Inf)")
-                 return
+        # --- Reuse calculation logic from CreatePatientPage ---
+        if not archindex.check_data(self.current_foot_data):
+             self.ai_result_label.setText("Chỉ số Arch Index: Lỗi dữ liệu (NaN/Inf)")
+             return
 
-            processed_matrix = archindex.convert_values(self.current_data_matrix, input_max = 5.0)
-            processed_matrix = archindex.Isolated_point_removal(processed_matrix)
-            processed_matrix = archindex.toes_remove(processed_matrix, threshold=30)
-            processed_matrix = archindex.toes_remain_removes(processed_matrix)
-            AI= archindex.compute_arch_index(processed_matrix)
+        self.ai_result_label.setText("Chỉ số Arch Index: Đang tính...")
+        patient_id = self.selected_patient_id
+        # Pipeline chạy trên thread worker (manager tuần tự hóa các lần chạy); chọn lại bệnh nhân -> lấy từ cache
+        self.async_db.call("get_patient_arch_index", patient_id, self.ai_pipeline, group=PATIENT_GROUP).then(
+            lambda AI: self.display_arch_index(patient_id, AI), self.handle_arch_index_failed)
 
-            if AI is not None:
-                result_text = f"Chỉ số Arch Index chân trái: {AI["left"]["AI"]:.4f} ({AI["left"]["type"]})\n"
-                result_text += f"Chỉ số Arch Index chân phải: {AI["right"]["AI"]:.4f} ({AI["right"]["type"]})"
-                self.ai_result_label.setText(result_text)
-            else:
-                 result_text = f"Chỉ số Arch Index: Không thể tính ({foot_type})"
-                 self.ai_result_label.setText(result_text)
-
-        except Exception as e:
-            self.ai_result_label.setText("Chỉ số Arch Index: Lỗi tính toán")
-            print(f"Error during Arch Index calculation on load page: {e}")
-            # QMessageBox.warning(self, "Lỗi Tính Toán AI", f"Lỗi khi tính Arch Index: {e}") # Avoid excessive popups
+    def display_arch_index(self, patient_id, AI):
+        if patient_id != self.selected_patient_id:
+            return
+        if AI is None:
+            self.ai_result_label.setText("Chỉ số Arch Index: Không có dữ liệu để tính")
+        elif AI["left"]["AI"] is not None and AI["right"]["AI"] is not None:
+            result_text = f"Chỉ số Arch Index chân trái: {AI['left']['AI']:.4f} ({AI['left']['type']})\n"
+            result_text += f"  {AI['left']['height_need']}\n"
+            result_text += f"Chỉ số Arch Index chân phải: {AI['right']['AI']:.4f} ({AI['right']['type']})\n"
+            result_text += f"  {AI['right']['height_need']}"
+            self.ai_result_label.setText(result_text)
+        else:
+             result_text = f"Chỉ số Arch Index: Không thể tính ({AI['left']['type']} | {AI['right']['type']})"
+             self.ai_result_label.setText(result_text)
+
+    def handle_arch_index_failed(self, error):
+        self.ai_result_label.setText("Chỉ số Arch Index: Lỗi tính toán")
+        print(f"Error during Arch Index calculation on load page: {error}")
+        # QMessageBox.warning(self, "Lỗi Tính Toán AI", f"Lỗi khi tính Arch Index: {e}") # Avoid excessive popups
 
 
     def update_patient(self):
@@ -452,29 +467,40 @@ class LoadPatientPage(QWidget):
                 QMessageBox.information(self, "Không Thay Đổi", "Không có thông tin nào được thay đổi.")
                 return
 
-            try:
-                print(f"Attempting to update patient {self.selected_patient_id} with data: {updated_data}")
-                result = self.db_manager.update_patient(self.selected_patient_id, updated_data)
-                QMessageBox.information(self, "Kết Quả Cập Nhật", result)
-
-                # Refresh the list and details
-                self.search_patients() # Refresh the entire list/search results
-                # Re-select the same patient if they still exist after update/refresh
-                self.find_and_select_patient(self.selected_patient_id)
-
-            except Exception as e:
-                QMessageBox.critical(self, "Lỗi Cập Nhật", f"Đã xảy ra lỗi khi cập nhật bệnh nhân: {e}")
-                print(f"Error updating patient in DB: {e}")
+            patient_id = self.selected_patient_id
+            print(f"Attempting to update patient {patient_id} with data: {updated_data}")
+            self.btn_update.setEnabled(False)
+            self.btn_delete.setEnabled(False)
+            # Lệnh ghi xong -> AsyncDBManager.data_changed xóa cache tìm kiếm trước khi callback chạy
+            self.async_db.call("update_patient", patient_id, updated_data).then(
+                lambda result: self.handle_patient_updated(patient_id, result),
+                self.handle_patient_update_failed)
+
+    def handle_patient_updated(self, patient_id, result):
+        QMessageBox.information(self, "Kết Quả Cập Nhật", result)
+        # Refresh the list and details
+        self.search_patients() # Refresh the entire list/search results
+        # Re-select the same patient if they still exist after update/refresh
+        self.find_and_select_patient(patient_id)
+
+    def handle_patient_update_failed(self, error):
+        QMessageBox.critical(self, "Lỗi Cập Nhật", f"Đã xảy ra lỗi khi cập nhật bệnh nhân: {error}")
+        print(f"Error updating patient in DB: {error}")
+        self.btn_update.setEnabled(self.selected_patient_id is not None)
+        self.btn_delete.setEnabled(self.selected_patient_id is not None)
 
 
     def find_and_select_patient(self, patient_id_to_select):
         """Tries to find and select a patient row by ID after a refresh."""
-        for row in range(self.patient_table.rowCount()):
-            item = self.patient_table.item(row, 0) # ID is in column 0
-            if item and item.data(Qt.UserRole) == patient_id_to_select:
-                self.patient_table.selectRow(row)
-                # self.patient_selected() # Selection change signal should handle the rest
-                return
+        # Tải thêm vài trang nếu bệnh nhân chưa hiện; handle_patient_located được gọi khi có kết quả
+        self.patient_model.locate(patient_id_to_select, self.handle_patient_located)
+
+    def handle_patient_located(self, row):
+        if row >= 0:
+            self.patient_table.selectRow(row)
+            self.patient_table.scrollTo(self.patient_model.index(row, 0))
+            # self.patient_selected() # Selection change signal should handle the rest
+            return
         # If not found (maybe deleted or ID changed - though ID shouldn't change)
         self.clear_details()
 
@@ -491,14 +517,19 @@ class LoadPatientPage(QWidget):
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
 
         if reply == QMessageBox.Yes:
-            try:
-                print(f"Attempting to delete patient {self.selected_patient_id}")
-                result = self.db_manager.delete_patient(self.selected_patient_id)
-                QMessageBox.information(self, "Kết Quả Xóa", result)
-
-                # Refresh the list after deletion
-                self.search_patients() # This also calls clear_details
-
-            except Exception as e:
-                QMessageBox.critical(self, "Lỗi Xóa", f"Đã xảy ra lỗi khi xóa bệnh nhân: {e}")
-                print(f"Error deleting patient from DB: {e}")
\ No newline at end of file
+            print(f"Attempting to delete patient {self.selected_patient_id}")
+            self.btn_update.setEnabled(False)
+            self.btn_delete.setEnabled(False)
+            self.async_db.call("delete_patient", self.selected_patient_id).then(
+                self.handle_patient_deleted, self.handle_patient_delete_failed)
+
+    def handle_patient_deleted(self, result):
+        QMessageBox.information(self, "Kết Quả Xóa", result)
+        # Refresh the list after deletion
+        self.search_patients() # This also calls clear_details
+
+    def handle_patient_delete_failed(self, error):
+        QMessageBox.critical(self, "Lỗi Xóa", f"Đã xảy ra lỗi khi xóa bệnh nhân: {error}")
+        print(f"Error deleting patient from DB: {error}")
+        self.btn_update.setEnabled(self.selected_patient_id is not None)
+        self.btn_delete.setEnabled(self.selected_patient_id is not None)
\ No newline at end of file
@@ -0,0 +1,194 @@
+# --- START OF FILE gui/patient_table_model.py ---
+
+from collections import OrderedDict
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt, pyqtSignal
+
+from database.manager_mongodb_2 import SEARCH_PAGE_SIZE, narrows_search, row_matches_search
+
+# --- Constants ---
+COLUMNS = (("id", "ID Bệnh Nhân"), ("name", "Họ Tên"), ("phone", "Số Điện Thoại"))
+MAX_LOCATE_PAGES = 20 # locate() tải thêm tối đa chừng này trang khi tìm một bệnh nhân chưa hiện
+SEARCH_GROUP = "patient-search" # Group của AsyncDBManager: trang mới hủy trang của từ khóa cũ
+SEARCH_CACHE_SIZE = 32 # Số từ khóa gần nhất được giữ kết quả
+
+
+class PatientTableModel(QAbstractTableModel):
+    """
+    Model bảng bệnh nhân tải dữ liệu theo trang khi cần (canFetchMore/fetchMore).
+
+    QTableView gọi fetchMore khi cuộn gần cuối các dòng đã tải; mỗi lần tải một trang
+    MongoDBManager.search_patients tiếp theo sau dòng cuối (phân trang theo khóa, không giữ cursor mở
+    nên không lo cursor hết hạn khi người dùng ngừng cuộn). Chỉ các dòng đã tải (dict id/tên/SĐT)
+    được giữ trong bộ nhớ; QTableView chỉ gọi data() cho các ô đang hiện.
+
+    Trang được tải trên thread pool của AsyncDBManager (group "patient-search"): fetchMore trả về ngay,
+    các dòng được thêm khi có kết quả. Trong lúc chờ canFetchMore() là False để view không gửi lại
+    cùng yêu cầu; set_search() hủy trang của từ khóa cũ đang tải dở.
+
+    Khi tìm kiếm lúc đang gõ, set_search() tránh truy vấn lại MongoDB nếu có thể:
+        - các dòng đã tải của SEARCH_CACHE_SIZE từ khóa gần nhất được giữ (LRU), quay lại từ khóa cũ
+          (vd. xóa bớt ký tự) hiện ngay các dòng đó, các trang sau vẫn tải tiếp theo khóa như thường;
+        - nếu từ khóa mới gõ tiếp từ từ khóa trước (narrows_search) và kết quả trước đã tải hết,
+          kết quả mới được lọc từ đó bằng row_matches_search (cùng điều kiện với search_query).
+    Cache bị xóa mỗi khi AsyncDBManager báo có lệnh ghi (data_changed): lưu/sửa/xóa bệnh nhân.
+    """
+    fetch_failed = pyqtSignal(str) # Lỗi database khi tải trang
+    loading_changed = pyqtSignal(bool) # Đang/hết chờ một trang
+
+    def __init__(self, async_db, page_size: int = SEARCH_PAGE_SIZE, parent=None):
+        super().__init__(parent)
+        self.async_db = async_db
+        self.page_size = page_size
+        self.term = ""
+        self._rows = []
+        self._exhausted = True # Chưa có tìm kiếm nào
+        self._complete = False # _rows là toàn bộ kết quả (mới) của term -> lọc được cho từ khóa gõ tiếp
+        self._pending = None # DBRequest của trang đang tải
+        self._locating = None # (patient_id, số trang còn được tải, callback) của locate() đang chờ
+        self._cache = OrderedDict() # term -> (các dòng đã tải, đã tải hết chưa); list dùng chung với _rows
+        self.cache_stats = {"hits": 0, "filtered": 0, "misses": 0}
+        self.async_db.data_changed.connect(self.invalidate_cache)
+
+    def set_search(self, term: str):
+        """
+        Bắt đầu tìm kiếm mới: lấy kết quả từ cache hoặc lọc từ kết quả trước nếu được, không thì
+        xóa các dòng đã tải và trang đầu được tải khi view cần.
+        """
+        self.async_db.cancel_group(SEARCH_GROUP)
+        self._set_pending(None)
+        self._finish_locate(-1)
+        rows, complete = [], False
+        if term in self._cache:
+            self._cache.move_to_end(term)
+            rows, complete = self._cache[term]
+            self.cache_stats["hits"] += 1
+        elif self._complete and narrows_search(self.term, term):
+            rows = [row for row in self._rows if row_matches_search(row, term)]
+            complete = True
+            self.cache_stats["filtered"] += 1
+            self._remember(term, rows, complete)
+        else:
+            self.cache_stats["misses"] += 1
+        self.beginResetModel()
+        self.term = term
+        self._rows = rows
+        self._exhausted = self._complete = complete
+        self.endResetModel()
+
+    def refresh(self):
+        """Tải lại từ đầu với từ khóa hiện tại (sau khi thêm/sửa/xóa bệnh nhân)."""
+        self.invalidate_cache()
+        self.set_search(self.term)
+
+    def invalidate_cache(self, *_reason):
+        """Bỏ mọi kết quả đã nhớ (dữ liệu bệnh nhân vừa thay đổi)."""
+        self._cache.clear()
+        self._complete = False # Các dòng đang hiện có thể đã cũ: không lọc từ đó
+
+    def _remember(self, term: str, rows: list, complete: bool):
+        self._cache[term] = (rows, complete)
+        self._cache.move_to_end(term)
+        while len(self._cache) > SEARCH_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    # --- QAbstractTableModel ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        if role == Qt.DisplayRole:
+            return row[COLUMNS[index.column()][0]] or "N/A"
+        if role == Qt.UserRole:
+            return row["id"]
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section][1]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted and self._pending is None
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        after = self._rows[-1] if self._rows else None
+        request = self.async_db.call("search_patients", self.term, self.page_size, after=after,
+                                     group=SEARCH_GROUP)
+        self._set_pending(request)
+        request.then(lambda page: self._page_loaded(request, page),
+                     lambda error: self._page_failed(request, error))
+
+    def _page_loaded(self, request, page: list):
+        if request is not self._pending:
+            return
+        self._set_pending(None)
+        if len(page) < self.page_size:
+            self._exhausted = self._complete = True
+        if page:
+            self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows) + len(page) - 1)
+            self._rows.extend(page)
+            self.endInsertRows()
+        self._remember(self.term, self._rows, self._complete)
+        if self._locating is not None:
+            self._continue_locate(len(self._rows) - len(page))
+
+    def _page_failed(self, request, error):
+        if request is not self._pending:
+            return
+        self._set_pending(None)
+        self._exhausted = True
+        self._finish_locate(-1)
+        self.fetch_failed.emit(str(error))
+
+    def _set_pending(self, request):
+        was_loading = self._pending is not None
+        self._pending = request
+        if was_loading != (request is not None):
+            self.loading_changed.emit(request is not None)
+
+    # --- Helpers ---
+
+    def patient_id(self, row: int):
+        """ID bệnh nhân của dòng row (None nếu ngoài phạm vi)."""
+        return self._rows[row]["id"] if 0 <= row < len(self._rows) else None
+
+    def locate(self, patient_id: str, callback, max_pages: int = MAX_LOCATE_PAGES):
+        """
+        Tìm dòng của bệnh nhân, tải thêm tối đa max_pages trang nếu chưa có; callback(chỉ số dòng)
+        được gọi khi tìm xong (-1 nếu không thấy hoặc bị hủy bởi set_search/locate mới).
+        """
+        self._finish_locate(-1)
+        self._locating = (patient_id, max_pages, callback)
+        self._continue_locate(0)
+
+    def _continue_locate(self, start: int):
+        patient_id, pages_left, callback = self._locating
+        for row in range(start, len(self._rows)):
+            if self._rows[row]["id"] == patient_id:
+                self._finish_locate(row)
+                return
+        if self._pending is not None: # Trang đang tải -> chờ _page_loaded
+            return
+        if pages_left <= 0 or not self.canFetchMore():
+            self._finish_locate(-1)
+            return
+        self._locating = (patient_id, pages_left - 1, callback)
+        self.fetchMore()
+
+    def _finish_locate(self, row: int):
+        if self._locating is not None:
+            callback = self._locating[2]
+            self._locating = None
+            callback(row)
+
+# --- END OF FILE gui/patient_table_model.py ---
@@ -8,30 +8,42 @@ from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 from matplotlib.animation import FuncAnimation
 import serial.tools.list_ports
+import glob
+import os
 import time
 
+from gui.serial_reader import SerialReaderThread, DEFAULT_GEOMETRY, DEFAULT_BAUDRATE
+from gui.heatmap_renderer import BlitHeatmapRenderer
+from components.frame_decoder import PROTOCOLS
+from components.serial_replay import REPLAY_PREFIX, RECORDING_EXTENSION
+from components.frame_averager import FrameAverager, SMOOTHING_MODES, SMOOTHING_OFF
+from components.sensor_geometry import SensorGeometry, SENSOR_GEOMETRIES
+
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QComboBox,
-                             QLabel, QMessageBox, QApplication)
+                             QLabel, QMessageBox, QApplication, QCheckBox)
 from PyQt5.QtCore import pyqtSignal, QTimer, Qt
 
 # --- Constants ---
-EXPECTED_ROWS = 30
-EXPECTED_COLS = 30
-DEFAULT_BAUDRATE = 115200
+RENDER_MODES = ("blit", "classic") # blit: chỉ vẽ lại ảnh mỗi frame; classic: vẽ lại toàn bộ figure (cách cũ)
+CLASSIC_INTERPOLATION = 'gaussian'
+STATS_REFRESH_S = 0.5 # Chu kỳ cập nhật dòng thống kê frame ở chế độ blit
+RECORDINGS_DIR = "recordings" # Phiên serial đã ghi, hiện trong danh sách cổng để phát lại
+CAPTURE_MODES = ("current", "best of last frames") # current: frame đang hiển thị (đã làm mượt nếu bật)
 
 class SerialHeatmapWindow(QWidget):
     data_captured = pyqtSignal(object)
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, geometry: SensorGeometry = DEFAULT_GEOMETRY):
         super().__init__(parent)
-        self.setWindowTitle(f"Live Sensor Heatmap ({EXPECTED_ROWS}x{EXPECTED_COLS})")
+        self.geometry = geometry # Lưới cảm biến của thảm, chọn lại được trước khi kết nối
+        self.setWindowTitle(f"Live Sensor Heatmap ({self.geometry})")
         self.setGeometry(150, 150, 700, 650)
 
-        self.serial_connection = None
+        self.reader = None # SerialReaderThread giữ cổng serial và ghép frame
         self.animation = None
-        self.latest_matrix = np.zeros((EXPECTED_ROWS, EXPECTED_COLS), dtype=int)
-        self.reading_frame = False
-        self.data_buffer = []
+        self.renderer = None # BlitHeatmapRenderer khi chạy ở chế độ blit
+        self._last_stats_update = 0.0
+        self.latest_matrix = np.zeros(self.geometry.shape, dtype=int)
         self.is_running = False
         # === THÊM: Biến lưu giá trị max của frame trước ===
         self.last_frame_max = 1 # Khởi tạo là 1 để tránh lỗi chia cho 0 hoặc range màu quá hẹp ban đầu
@@ -41,11 +53,32 @@ class SerialHeatmapWindow(QWidget):
         # -- Serial control section --
         control_layout = QHBoxLayout()
         self.port_combo = QComboBox()
+        self.port_combo.setEditable(True) # Cho phép gõ tên cổng hoặc 'replay:<file>?speed=N|max'
         self.refresh_button = QPushButton("Refresh Ports")
+        self.protocol_combo = QComboBox() # auto: hỏi firmware chế độ nhị phân, không được thì dùng ASCII
+        self.protocol_combo.addItems(PROTOCOLS)
+        self.geometry_combo = QComboBox() # Thảm có sẵn hoặc gõ lưới dạng '64x128'
+        self.geometry_combo.setEditable(True)
+        self.geometry_combo.addItems(SENSOR_GEOMETRIES)
+        self.geometry_combo.setCurrentText(self.geometry.name)
         self.connect_button = QPushButton("Connect & Start")
         control_layout.addWidget(QLabel("Select Serial Port:"))
         control_layout.addWidget(self.port_combo)
         control_layout.addWidget(self.refresh_button)
+        control_layout.addWidget(QLabel("Protocol:"))
+        control_layout.addWidget(self.protocol_combo)
+        control_layout.addWidget(QLabel("Mat:"))
+        control_layout.addWidget(self.geometry_combo)
+        self.record_checkbox = QCheckBox("Record") # Ghi bytes serial vào recordings/ để phát lại sau
+        control_layout.addWidget(self.record_checkbox)
+        self.render_combo = QComboBox()
+        self.render_combo.addItems(RENDER_MODES)
+        control_layout.addWidget(QLabel("Render:"))
+        control_layout.addWidget(self.render_combo)
+        self.smoothing_combo = QComboBox() # Làm mượt theo thời gian (components/frame_averager.py)
+        self.smoothing_combo.addItems(SMOOTHING_MODES)
+        control_layout.addWidget(QLabel("Smoothing:"))
+        control_layout.addWidget(self.smoothing_combo)
         control_layout.addWidget(self.connect_button)
         main_layout.addLayout(control_layout)
 
@@ -54,19 +87,25 @@ class SerialHeatmapWindow(QWidget):
         self.canvas = FigureCanvas(self.figure)
         self.ax = self.figure.add_subplot(111)
         # Khởi tạo heatmap, đặt vmin=0, vmax ban đầu là giá trị nhỏ > 0
-        self.heatmap_im = self.ax.imshow(self.latest_matrix, cmap='jet', interpolation='gaussian', origin='lower', vmin=0, vmax=self.last_frame_max)
+        self.heatmap_im = self.ax.imshow(self.latest_matrix, cmap='jet', interpolation=CLASSIC_INTERPOLATION, origin='lower', vmin=0, vmax=self.last_frame_max)
         # Lưu tham chiếu đến colorbar để cập nhật sau
         self.cbar = self.figure.colorbar(self.heatmap_im, ax=self.ax)
-        self.ax.set_title(f"Waiting for connection... ({EXPECTED_ROWS}x{EXPECTED_COLS})")
+        self.ax.set_title(f"Waiting for connection... ({self.geometry})")
         self.ax.set_xticks([])
         self.ax.set_yticks([])
         self.figure.tight_layout()
         main_layout.addWidget(self.canvas)
+        self.stats_label = QLabel("")
+        main_layout.addWidget(self.stats_label)
 
         # -- Action buttons section --
         action_layout = QHBoxLayout()
         self.capture_button = QPushButton("Capture Current Heatmap")
         self.close_button = QPushButton("Close Window")
+        self.capture_mode_combo = QComboBox()
+        self.capture_mode_combo.addItems(CAPTURE_MODES)
+        action_layout.addWidget(QLabel("Capture:"))
+        action_layout.addWidget(self.capture_mode_combo)
         action_layout.addWidget(self.capture_button)
         action_layout.addWidget(self.close_button)
         main_layout.addLayout(action_layout)
@@ -86,13 +125,17 @@ class SerialHeatmapWindow(QWidget):
         """Fetches available serial ports and updates the ComboBox."""
         self.port_combo.clear()
         ports = serial.tools.list_ports.comports()
-        if not ports:
+        recordings = sorted(glob.glob(os.path.join(RECORDINGS_DIR, "*" + RECORDING_EXTENSION)))
+        if not ports and not recordings:
             self.port_combo.addItem("No ports found")
             self.port_combo.setEnabled(False)
             self.connect_button.setEnabled(False)
         else:
             for port in sorted(ports):
                 self.port_combo.addItem(f"{port.device} - {port.description if port.description != 'n/a' else 'Unknown Device'}")
+            for path in recordings:
+                # Phát lại theo nhịp đã ghi; sửa thành '?speed=4' hoặc '?speed=max' khi cần
+                self.port_combo.addItem(f"{REPLAY_PREFIX}{path}?speed=1 - Recorded session")
             self.port_combo.setEnabled(True)
             self.connect_button.setEnabled(True)
             if self.port_combo.count() > 0:
@@ -100,47 +143,95 @@ class SerialHeatmapWindow(QWidget):
 
     def toggle_connection(self):
         """Connects/Disconnects from the selected serial port and starts/stops the animation."""
-        if self.serial_connection is None:
+        if self.reader is None:
             selected_text = self.port_combo.currentText()
             if "No ports found" in selected_text or not selected_text:
                 QMessageBox.warning(self, "Connection Error", "No serial port selected or available.")
                 return
             port_name = selected_text.split(" - ")[0]
             try:
-                self.serial_connection = serial.Serial(port_name, DEFAULT_BAUDRATE, timeout=0.1)
-                print(f"Successfully connected to {port_name} at {DEFAULT_BAUDRATE} baud.")
-                self.connect_button.setText("Disconnect & Stop")
-                self.port_combo.setEnabled(False)
-                self.refresh_button.setEnabled(False)
-                self.capture_button.setEnabled(True)
-                self.start_animation()
+                self.set_geometry(SensorGeometry.parse(self.geometry_combo.currentText()))
+            except ValueError as e:
+                QMessageBox.warning(self, "Sensor Geometry", str(e))
+                return
+            record_path = None
+            if self.record_checkbox.isChecked():
+                os.makedirs(RECORDINGS_DIR, exist_ok=True)
+                record_path = os.path.join(RECORDINGS_DIR, f"serial_{time.strftime('%Y%m%d_%H%M%S')}{RECORDING_EXTENSION}")
+            reader = SerialReaderThread(port_name, DEFAULT_BAUDRATE, self.geometry,
+                                        protocol=self.protocol_combo.currentText(), record_path=record_path)
+            try:
+                reader.open()
             except serial.SerialException as e:
                 QMessageBox.critical(self, "Serial Connection Error", f"Failed to open port {port_name}:\n{e}")
-                self.serial_connection = None
+                return
+            print(f"Successfully connected to {port_name} at {DEFAULT_BAUDRATE} baud.")
+            self.reader = reader
+            # Mọi frame (kể cả frame không được vẽ) đi qua bộ làm mượt trên thread đọc
+            self.reader.averager = FrameAverager(self.geometry.shape, self.smoothing_combo.currentText())
+            self.reader.error_occurred.connect(self.handle_serial_error)
+            self.reader.start()
+            self.connect_button.setText("Disconnect & Stop")
+            self.port_combo.setEnabled(False)
+            self.protocol_combo.setEnabled(False)
+            self.geometry_combo.setEnabled(False)
+            self.record_checkbox.setEnabled(False)
+            self.smoothing_combo.setEnabled(False)
+            self.render_combo.setEnabled(False)
+            self.refresh_button.setEnabled(False)
+            self.capture_button.setEnabled(True)
+            self.start_animation()
         else:
             self.stop_animation()
-            try:
-                self.serial_connection.close()
-                print(f"Closed serial port {self.serial_connection.port}")
-            except Exception as e:
-                print(f"Error closing serial port: {e}")
-            finally:
-                 self.serial_connection = None
-                 self.connect_button.setText("Connect & Start")
-                 self.port_combo.setEnabled(True)
-                 self.refresh_button.setEnabled(True)
-                 self.capture_button.setEnabled(False)
-                 self.ax.set_title(f"Disconnected ({EXPECTED_ROWS}x{EXPECTED_COLS})")
-                 self.canvas.draw_idle()
+            self.stop_reader()
+            self.connect_button.setText("Connect & Start")
+            self.port_combo.setEnabled(True)
+            self.protocol_combo.setEnabled(True)
+            self.geometry_combo.setEnabled(True)
+            self.record_checkbox.setEnabled(True)
+            self.smoothing_combo.setEnabled(True)
+            self.render_combo.setEnabled(True)
+            self.refresh_button.setEnabled(True)
+            self.capture_button.setEnabled(False)
+            self.ax.set_title(f"Disconnected ({self.geometry})")
+            self.canvas.draw_idle()
+
+    def set_geometry(self, geometry: SensorGeometry):
+        """Đổi lưới cảm biến (khi chưa kết nối): ảnh heatmap được tạo lại theo kích thước mới."""
+        if geometry == self.geometry:
+            return
+        self.geometry = geometry
+        rows, cols = geometry.shape
+        self.latest_matrix = np.zeros(geometry.shape, dtype=int)
+        self.heatmap_im.set_data(self.latest_matrix)
+        self.heatmap_im.set_extent((-0.5, cols - 0.5, -0.5, rows - 0.5)) # origin='lower'
+        self.setWindowTitle(f"Live Sensor Heatmap ({geometry})")
+        self.canvas.draw_idle()
+
+    def stop_reader(self):
+        """Dừng thread đọc serial (thread tự đóng cổng) và in thống kê frame."""
+        if self.reader is not None:
+            self.reader.stop()
+            print(f"Serial reader stats: {self.reader.stats}")
+            self.reader = None
+
+    def handle_serial_error(self, message):
+        """Nhận lỗi serial từ thread đọc (thread đã dừng)."""
+        QMessageBox.critical(self, "Serial Error", f"Communication error:\n{message}")
+        if self.reader is not None:
+            self.toggle_connection()
 
     def start_animation(self):
         """Starts the Matplotlib animation to update the heatmap."""
-        if self.serial_connection and not self.is_running:
+        if self.reader and not self.is_running:
             self.is_running = True
-            self.reading_frame = False
-            self.data_buffer = []
-            self.serial_connection.reset_input_buffer()
-            print("Waiting for frame marker '-----'...")
+            if self.render_combo.currentText() == "blit":
+                # Vẽ ngay khi có frame mới thay vì theo chu kỳ cố định của FuncAnimation
+                self.ax.set_title(f"Live Heatmap ({self.geometry})")
+                self.renderer = BlitHeatmapRenderer(self.canvas, self.ax, self.heatmap_im, self.cbar)
+                self.reader.frame_ready.connect(self.render_latest_frame)
+                print("Blit renderer started.")
+                return
             self.animation = FuncAnimation(self.figure, self.update_heatmap,
                                            interval=50, # Thay đổi khoảng thời gian nếu cần
                                            blit=False,
@@ -150,6 +241,15 @@ class SerialHeatmapWindow(QWidget):
 
     def stop_animation(self):
         """Stops the Matplotlib animation."""
+        if self.renderer is not None:
+            if self.reader is not None:
+                self.reader.frame_ready.disconnect(self.render_latest_frame)
+            print(f"Blit renderer stopped: {self.renderer.frames_drawn} frames, "
+                  f"{self.renderer.full_redraws} full redraws, {self.renderer.fps:.1f} FPS.")
+            self.renderer.disconnect()
+            self.heatmap_im.set_interpolation(CLASSIC_INTERPOLATION)
+            self.renderer = None
+            self.is_running = False
         if self.animation is not None:
             self.animation.event_source.stop()
             self.animation = None
@@ -157,131 +257,96 @@ class SerialHeatmapWindow(QWidget):
             print("Animation stopped.")
 
 
+    def render_latest_frame(self, _frame=None):
+        """Chế độ blit: vẽ frame mới nhất (các signal frame_ready dồn lại chỉ vẽ một lần)."""
+        if self.reader is None or self.renderer is None:
+            return
+        new_matrix = self._take_display_frame()
+        if new_matrix is None:
+            return
+        self.latest_matrix = new_matrix
+        self.last_frame_max = max(1, np.max(new_matrix))
+        self.renderer.update(new_matrix)
+
+        now = time.perf_counter()
+        if now - self._last_stats_update >= STATS_REFRESH_S:
+            self._last_stats_update = now
+            stats = self.reader.stats
+            self.stats_label.setText(f"{self.renderer.fps:.1f} FPS | frames {stats['frames']} | dropped {stats['dropped']} | "
+                                     f"partial {stats['partial']} | crc {stats['crc_errors']} | lost {stats['lost']} | "
+                                     f"colorbar redraws {self.renderer.full_redraws}")
+
+    def _take_display_frame(self):
+        """Frame mới nhất từ thread đọc, hoặc frame đã làm mượt nếu bật smoothing. None nếu chưa có frame mới."""
+        new_matrix = self.reader.take_latest()
+        if new_matrix is None:
+            return None
+        averager = self.reader.averager
+        if averager is not None and averager.mode != SMOOTHING_OFF:
+            smoothed = averager.average()
+            if smoothed is not None:
+                return smoothed
+        return new_matrix
+
     def update_heatmap(self, frame):
-        """Reads serial data, processes it, updates plot with dynamic vmax."""
-        if self.serial_connection is None or not self.serial_connection.is_open or not self.is_running:
+        """Lấy frame mới nhất từ thread đọc serial và cập nhật plot với vmax động."""
+        if self.reader is None or not self.is_running:
             return
 
-        lines_processed_this_call = 0
-        max_lines_per_call = 70 # Giới hạn số dòng đọc trong mỗi lần gọi để tránh treo GUI
-        frame_completed = False # Cờ kiểm tra xem có frame nào hoàn thành trong lần gọi này không
+        new_matrix = self._take_display_frame() # Các frame cũ hơn bị bỏ qua, không dồn lại khi vẽ chậm
+        if new_matrix is None:
+            return
+        self.latest_matrix = new_matrix
 
-        while lines_processed_this_call < max_lines_per_call:
-            try:
-                if self.serial_connection.in_waiting > 0:
-                    line_bytes = self.serial_connection.readline()
-                    if not line_bytes: break
-                else: break
-
-                lines_processed_this_call += 1
-
-                try:
-                    line = line_bytes.decode('utf-8', errors='ignore').strip()
-                except Exception as decode_err:
-                    print(f"Decode error: {decode_err}")
-                    continue
-
-                if "-----" in line:
-                    if self.reading_frame:
-                        if self.data_buffer:
-                            print(f"Warning: Separator found mid-frame ({len(self.data_buffer)}/{EXPECTED_ROWS} rows). Discarding.")
-                        self.reading_frame = False
-                        self.data_buffer = []
-                    else:
-                        self.reading_frame = True
-                        self.data_buffer = []
-                    continue
-
-                if not self.reading_frame or not line:
-                    continue
-
-                # --- Process Data Row (Target: 60 columns, replace errors/missing with 0) ---
-                row_values = []
-                parts = line.split(',')
-                for i in range(EXPECTED_COLS):
-                    value = 0
-                    if i < len(parts):
-                        p_stripped = parts[i].strip()
-                        if p_stripped:
-                            try: value = int(p_stripped)
-                            except ValueError: pass # Lỗi thì value vẫn là 0
-                    row_values.append(value)
-
-                self.data_buffer.append(row_values)
-
-                # --- Check if frame is complete ---
-                if len(self.data_buffer) == EXPECTED_ROWS:
-                    # print(f"Complete frame received ({EXPECTED_ROWS} rows). Processing...")
-                    self.latest_matrix = np.array(self.data_buffer, dtype=int)
-                    frame_completed = True # Đánh dấu frame hoàn thành
-
-                    # === TÍNH TOÁN VÀ CẬP NHẬT VMAX ===
-                    current_max = np.max(self.latest_matrix)
-                    # Chỉ cập nhật vmax nếu max mới > 0 (tránh trường hợp toàn 0)
-                    # và khác biệt đáng kể so với max cũ (tránh cập nhật liên tục nếu nhiễu nhỏ)
-                    # hoặc nếu last_frame_max vẫn là giá trị khởi tạo
-                    if current_max > 0 :
-                         # Có thể thêm điều kiện lọc nhiễu ở đây nếu muốn
-                         # Ví dụ: chỉ cập nhật nếu current_max > self.last_frame_max * 0.1
-                         self.last_frame_max = current_max
-                    elif np.sum(self.latest_matrix) == 0:
-                         # Nếu cả frame toàn 0, đặt vmax=1 để tránh lỗi range màu
-                         self.last_frame_max = 1
-
-                    # Đảm bảo vmax luôn lớn hơn vmin (là 0)
-                    vmax_to_set = max(1, self.last_frame_max)
-
-                    self.heatmap_im.set_data(self.latest_matrix)
-                    self.heatmap_im.set_clim(vmin=0, vmax=vmax_to_set) # Cập nhật giới hạn màu
-                    # ====================================
-
-                    self.ax.set_title(f"Live Heatmap ({EXPECTED_ROWS}x{EXPECTED_COLS}) - Max: {vmax_to_set}") # Hiển thị max hiện tại
-
-                    # Reset cho frame tiếp theo
-                    self.reading_frame = False
-                    self.data_buffer = []
-                    # Không break ở đây, tiếp tục đọc nếu còn data trong buffer
-
-                elif len(self.data_buffer) > EXPECTED_ROWS:
-                    print(f"Warning: Buffer overflow ({len(self.data_buffer)} rows). Resetting.")
-                    self.reading_frame = False
-                    self.data_buffer = []
-
-            except serial.SerialException as se:
-                print(f"Serial error during read: {se}")
-                QMessageBox.critical(self, "Serial Error", f"Communication error:\n{se}")
-                self.stop_animation()
-                self.toggle_connection()
-                break
-            except Exception as e:
-                 print(f"Unexpected error in update loop: {e}")
-                 import traceback
-                 traceback.print_exc()
-                 self.stop_animation()
-                 break
-
-        # Chỉ yêu cầu vẽ lại canvas nếu có frame hoàn thành trong lần gọi này
-        if frame_completed:
-             # === CẬP NHẬT COLORBAR ===
-             # Cập nhật giới hạn của colorbar để khớp với heatmap
-             self.cbar.mappable.set_clim(vmin=0, vmax=max(1, self.last_frame_max))
-             self.cbar._draw_all() # Vẽ lại colorbar
-             # =========================
-             self.figure.canvas.draw_idle()
+        # === TÍNH TOÁN VÀ CẬP NHẬT VMAX ===
+        current_max = np.max(self.latest_matrix)
+        # Chỉ cập nhật vmax nếu max mới > 0 (tránh trường hợp toàn 0)
+        if current_max > 0 :
+             self.last_frame_max = current_max
+        elif np.sum(self.latest_matrix) == 0:
+             # Nếu cả frame toàn 0, đặt vmax=1 để tránh lỗi range màu
+             self.last_frame_max = 1
+
+        # Đảm bảo vmax luôn lớn hơn vmin (là 0)
+        vmax_to_set = max(1, self.last_frame_max)
+
+        self.heatmap_im.set_data(self.latest_matrix)
+        self.heatmap_im.set_clim(vmin=0, vmax=vmax_to_set) # Cập nhật giới hạn màu
+        # ====================================
+
+        stats = self.reader.stats
+        self.ax.set_title(f"Live Heatmap ({self.geometry}) - Max: {vmax_to_set}\n"
+                          f"frames {stats['frames']} | dropped {stats['dropped']} | "
+                          f"partial {stats['partial']} | crc {stats['crc_errors']} | lost {stats['lost']}", fontsize=9)
+
+        # === CẬP NHẬT COLORBAR ===
+        # Cập nhật giới hạn của colorbar để khớp với heatmap
+        self.cbar.mappable.set_clim(vmin=0, vmax=vmax_to_set)
+        self.cbar._draw_all() # Vẽ lại colorbar
+        # =========================
+        self.figure.canvas.draw_idle()
 
 
     def capture_data(self):
-        """Captures the current 60x60 heatmap data and emits the signal."""
+        """Captures the current heatmap data (in the mat's own geometry) and emits the signal."""
         # Nên cho phép chụp ngay cả khi animation không chạy, miễn là có dữ liệu hợp lệ
         if self.latest_matrix is not None:
-             if self.latest_matrix.shape == (EXPECTED_ROWS, EXPECTED_COLS):
-                 print(f"Capturing heatmap data (Max value: {self.last_frame_max})...")
-                 captured_matrix = self.latest_matrix.copy()
+             if self.latest_matrix.shape == self.geometry.shape:
+                 captured_matrix = self.latest_matrix
+                 if self.capture_mode_combo.currentText() == CAPTURE_MODES[1] and self.reader is not None:
+                     # Frame ít thay đổi nhất so với frame trước/sau trong các frame gần nhất
+                     best = self.reader.averager.best_frame()
+                     if best is not None:
+                         captured_matrix, score = best
+                         print(f"Best frame of last {self.reader.averager.best_of}: relative change {score:.3f}")
+                 print(f"Capturing heatmap data (Max value: {np.max(captured_matrix)})...")
+                 # Frame đã làm mượt là float32 -> làm tròn về số nguyên như dữ liệu cảm biến
+                 captured_matrix = np.rint(captured_matrix).astype(np.int64)
                  self.data_captured.emit(captured_matrix)
-                 QMessageBox.information(self, "Capture Successful", f"Data ({EXPECTED_ROWS}x{EXPECTED_COLS}) captured.")
+                 QMessageBox.information(self, "Capture Successful", f"Data ({self.geometry}) captured.")
                  self.close()
              else:
-                  QMessageBox.warning(self, "Capture Error", f"Internal error: Matrix shape is not {EXPECTED_ROWS}x{EXPECTED_COLS}.")
+                  QMessageBox.warning(self, "Capture Error", f"Internal error: Matrix shape is not {self.geometry.rows}x{self.geometry.cols}.")
         else:
              QMessageBox.warning(self, "Capture Error", "No valid heatmap data available to capture.")
 
@@ -290,12 +355,7 @@ class SerialHeatmapWindow(QWidget):
         """Ensures resources are released when the window is closed."""
         print("Closing heatmap window...")
         self.stop_animation()
-        if self.serial_connection and self.serial_connection.is_open:
-            try:
-                self.serial_connection.close()
-                print(f"Serial port {self.serial_connection.port} closed on exit.")
-            except Exception as e:
-                print(f"Error closing serial port on exit: {e}")
+        self.stop_reader()
         super().closeEvent(event)
 
 # Optional: Main block for testing this window independently
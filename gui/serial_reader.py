@@ -0,0 +1,145 @@
+# --- START OF FILE gui/serial_reader.py ---
+
+import threading
+from collections import deque
+
+import numpy as np
+import serial
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from components.frame_decoder import (AsciiFrameAssembler, BinaryFrameReader, FRAME_SEPARATOR, negotiate_protocol,
+                                      PROTOCOL_AUTO, PROTOCOL_BINARY)
+from components.serial_replay import open_serial
+from components.sensor_geometry import SensorGeometry, SENSOR_GEOMETRIES, DEFAULT_SENSOR
+
+# --- Constants ---
+DEFAULT_GEOMETRY = SENSOR_GEOMETRIES[DEFAULT_SENSOR] # Lưới của thảm đo mặc định (30x30)
+DEFAULT_BAUDRATE = 115200
+DEFAULT_BUFFER_FRAMES = 8
+
+
+class SerialReaderThread(QThread):
+    """
+    Thread đọc cổng serial, ghép các dòng giữa hai dấu '-----' thành frame hoàn chỉnh
+    (hoặc đọc gói nhị phân nếu firmware hỗ trợ, xem components/frame_decoder.py).
+
+    Thread giữ cổng serial trong suốt thời gian chạy. Mỗi frame hoàn chỉnh (ndarray theo lưới geometry)
+    được đẩy vào một ring buffer có giới hạn và phát qua signal frame_ready; GUI chỉ cần lấy
+    frame mới nhất bằng take_latest() khi vẽ, nên việc vẽ chậm không làm dồn dữ liệu serial.
+    """
+    frame_ready = pyqtSignal(object)     # ndarray (rows, cols) của frame vừa hoàn thành
+    error_occurred = pyqtSignal(str)     # Lỗi serial, thread dừng sau khi phát
+
+    def __init__(self, port_name: str, baudrate: int = DEFAULT_BAUDRATE, geometry: SensorGeometry = DEFAULT_GEOMETRY,
+                 buffer_frames: int = DEFAULT_BUFFER_FRAMES, protocol: str = PROTOCOL_AUTO,
+                 record_path: str | None = None, parent=None):
+        super().__init__(parent)
+        self.port_name = port_name
+        self.baudrate = baudrate
+        self.geometry = geometry # Số dòng/ô mỗi frame ASCII và kích thước gói nhị phân phải khớp lưới này
+        self.rows, self.cols = geometry.shape
+        self.protocol = protocol # "auto": hỏi firmware khi bắt đầu, không trả lời thì dùng ASCII
+        self.record_path = record_path # Ghi bytes thô đọc được để phát lại sau (components/serial_replay.py)
+        self.serial_connection = None
+        self.binary_reader = None
+        self.assembler = AsciiFrameAssembler(self.rows, self.cols)
+        self._frames = deque(maxlen=buffer_frames)
+        self._lock = threading.Lock()
+        self._stop_requested = False
+        self.averager = None # FrameAverager (tùy chọn): nhận mọi frame, kể cả frame GUI bỏ qua khi vẽ
+        self.reset_stats()
+
+    def reset_stats(self):
+        """
+        frames: số frame hoàn chỉnh đã nhận.
+        dropped: frame bị đẩy ra khỏi ring buffer hoặc bị bỏ qua vì đã có frame mới hơn.
+        partial: frame bị hủy vì gặp dấu '-----' khi chưa đủ số dòng.
+        overflow: dữ liệu rác quá dài không tạo được frame, bộ đệm bị xóa.
+        crc_errors, lost: gói nhị phân sai CRC / frame bị mất theo số thứ tự (chế độ nhị phân).
+        """
+        self.stats = {"frames": 0, "dropped": 0, "partial": 0, "overflow": 0, "crc_errors": 0, "lost": 0}
+        self.assembler.reset_stats()
+
+    def open(self):
+        """
+        Mở cổng serial trên thread gọi (GUI) để lỗi kết nối được báo ngay. Ném serial.SerialException nếu lỗi.
+        port_name dạng 'replay:<file>?speed=N' phát lại một phiên đã ghi thay cho thiết bị thật.
+        """
+        self.serial_connection = open_serial(self.port_name, self.baudrate, timeout=0.1, record_path=self.record_path)
+        self.serial_connection.reset_input_buffer()
+
+    def stop(self, timeout_ms: int = 2000):
+        """Yêu cầu thread dừng và chờ thread đóng cổng serial."""
+        self._stop_requested = True
+        if self.isRunning():
+            self.wait(timeout_ms)
+
+    def take_latest(self):
+        """Lấy frame mới nhất và bỏ các frame cũ hơn trong buffer. Trả về None nếu chưa có frame mới."""
+        with self._lock:
+            if not self._frames:
+                return None
+            self.stats["dropped"] += len(self._frames) - 1
+            frame = self._frames.pop()
+            self._frames.clear()
+        return frame
+
+    def _push_frame(self, frame: np.ndarray):
+        if self.averager is not None:
+            self.averager.push(frame)
+        with self._lock:
+            if len(self._frames) == self._frames.maxlen:
+                self.stats["dropped"] += 1
+            self._frames.append(frame)
+            self.stats["frames"] += 1
+        self.frame_ready.emit(frame)
+
+    def _run_ascii(self):
+        print(f"Waiting for frame marker '{FRAME_SEPARATOR.decode()}'...")
+        while not self._stop_requested:
+            # Đọc hết những gì đang có trong bộ đệm (chờ tối đa timeout nếu chưa có gì)
+            chunk = self.serial_connection.read(self.serial_connection.in_waiting or 1)
+            if not chunk:
+                continue # Hết timeout mà không có dữ liệu -> kiểm tra lại cờ dừng
+            for frame in self.assembler.feed(chunk):
+                self._push_frame(frame)
+            self.stats["partial"] = self.assembler.stats["partial"]
+            self.stats["overflow"] = self.assembler.stats["overflow"]
+
+    def _run_binary(self):
+        self.binary_reader = BinaryFrameReader(self.serial_connection, self.rows, self.cols)
+        while not self._stop_requested:
+            frame = self.binary_reader.read_frame()
+            if frame is None:
+                continue
+            self._push_frame(frame)
+            self.stats["crc_errors"] = self.binary_reader.stats["crc_errors"]
+            self.stats["lost"] = self.binary_reader.stats["lost"]
+
+    def run(self):
+        if self.serial_connection is None:
+            try:
+                self.open()
+            except serial.SerialException as e:
+                self.error_occurred.emit(str(e))
+                return
+
+        try:
+            if self.protocol == PROTOCOL_AUTO:
+                self.protocol = negotiate_protocol(self.serial_connection)
+            print(f"Serial protocol: {self.protocol}")
+            if self.protocol == PROTOCOL_BINARY:
+                self._run_binary()
+            else:
+                self._run_ascii()
+        except serial.SerialException as se:
+            print(f"Serial error during read: {se}")
+            self.error_occurred.emit(str(se))
+        finally:
+            try:
+                self.serial_connection.close()
+                print(f"Closed serial port {self.port_name}")
+            except Exception as e:
+                print(f"Error closing serial port: {e}")
+
+# --- END OF FILE gui/serial_reader.py ---
@@ -11,6 +11,7 @@ try:
     from gui.create import CreatePatientPage
     from gui.load import LoadPatientPage
     from database.manager_mongodb_2 import MongoDBManager
+    from gui.async_db import AsyncDBManager
 except ImportError as e:
     # ... (xử lý lỗi import giữ nguyên) ...
     sys.exit(1)
@@ -30,6 +31,8 @@ class MainApp(QMainWindow):
         self.db_manager = self.setup_database()
         if not self.db_manager:
             sys.exit(1)
+        # Thread pool dùng chung cho các lời gọi database từ giao diện
+        self.async_db = AsyncDBManager(self.db_manager, parent=self)
 
         # --- Central Widget and Layout ---
         self.central_widget = QWidget()
@@ -56,8 +59,8 @@ class MainApp(QMainWindow):
 
         # --- Instantiate Pages ---
         self.home_page = HomePage(self.stacked_widget, self.db_manager)
-        self.create_page = CreatePatientPage(self.stacked_widget, self.db_manager)
-        self.load_page = LoadPatientPage(self.stacked_widget, self.db_manager)
+        self.create_page = CreatePatientPage(self.stacked_widget, self.db_manager, self.async_db)
+        self.load_page = LoadPatientPage(self.stacked_widget, self.db_manager, self.async_db)
 
         # --- Add Pages to Stack ---
         self.stacked_widget.addWidget(self.home_page)
@@ -90,6 +93,7 @@ class MainApp(QMainWindow):
         # ... (hàm closeEvent giữ nguyên) ...
         print("Closing application...")
         if self.db_manager:
+            self.async_db.shutdown() # Chờ các lệnh đang ghi xong trước khi đóng kết nối
             self.db_manager.close_connection()
         temp_dir = "temp_sensor_data"
         # ... (xóa temp_dir giữ nguyên) ...
@@ -0,0 +1,229 @@
+# --- START OF FILE maintenance.py ---
+"""
+Các lệnh bảo trì chạy không cần giao diện (headless).
+
+    python maintenance.py reanalyze --toes-threshold 30 --workers 4
+
+    python maintenance.py migrate-storage --dry-run
+
+    python maintenance.py index-search
+
+reanalyze: tính lại Arch Index cho toàn bộ dữ liệu bàn chân trong collection
+patient_sensor_data với bộ tham số mới và ghi kết quả vào trường "arch_index".
+migrate-storage: chuyển ma trận lưu dạng dict-of-lists sang dạng nhị phân.
+index-search: tạo khóa tìm kiếm (trường "search") cho bệnh nhân lưu trước khi có search_patients.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timezone
+
+import numpy as np
+from pymongo import UpdateOne
+
+from components import archindex
+from database.manager_mongodb_2 import MongoDBManager, decode_matrix, make_arch_index_record
+
+# --- Reanalyze ---
+
+_worker_pipeline = None # Mỗi process worker giữ một pipeline (và bộ đệm) riêng
+
+
+def _init_worker(pipeline_params: dict):
+    global _worker_pipeline
+    _worker_pipeline = archindex.ArchIndexPipeline(**pipeline_params)
+
+
+def _analyze_chunk(docs: list[dict]) -> tuple[list[tuple], list[tuple], dict]:
+    """
+    Chạy trong process worker: giải mã ma trận và tính AI cho một nhóm document.
+    Args:
+        docs: Danh sách document (_id, patient_id, data/matrix) lấy từ data_collection.
+    Returns:
+        tuple: (results, errors, timings)
+            results: (_id, dict kết quả AI) cho mỗi document tính được.
+            errors: (patient_id, thông báo lỗi) cho document không giải mã được.
+            timings: thời gian giải mã và từng bước pipeline (giây).
+    """
+    pipeline = _worker_pipeline
+    pipeline.reset_stats()
+    t0 = time.perf_counter()
+    by_shape = {}
+    errors = []
+    for doc in docs:
+        try:
+            matrix = decode_matrix(doc)
+        except Exception as e:
+            errors.append((doc.get("patient_id"), str(e)))
+            continue
+        by_shape.setdefault(matrix.shape, []).append((doc["_id"], matrix))
+    timings = {"decode": time.perf_counter() - t0}
+
+    results = []
+    for items in by_shape.values():
+        table = pipeline.process_batch(np.stack([matrix for _, matrix in items]))
+        results.extend((doc_id, archindex.result_to_dict(row)) for (doc_id, _), row in zip(items, table))
+    timings.update(pipeline.stage_times)
+    return results, errors, timings
+
+
+# Tham số mặc định của reanalyze khi không chọn --profile (cùng profile với gui/create.py, gui/load.py)
+REANALYZE_DEFAULTS = dict(archindex.ANALYSIS_PROFILES[archindex.CLINIC_PROFILE])
+
+
+def reanalyze(args) -> int:
+    pipeline_params = dict(archindex.ANALYSIS_PROFILES[args.profile] if args.profile else REANALYZE_DEFAULTS)
+    for name in pipeline_params:
+        if getattr(args, name) is not None:
+            pipeline_params[name] = getattr(args, name)
+    params_record = archindex.ArchIndexPipeline(**pipeline_params).params()
+    manager = MongoDBManager()
+    if manager.db_connection.client is None:
+        print("Không thể kết nối tới MongoDB.")
+        return 1
+
+    timings = {"fetch": 0.0, "decode": 0.0, "write": 0.0}
+    timings.update(dict.fromkeys(archindex.PIPELINE_STAGES, 0.0))
+    processed = written = 0
+    failed = []
+
+    def collect(future):
+        nonlocal processed, written
+        results, errors, chunk_timings = future.result()
+        for stage, elapsed in chunk_timings.items():
+            timings[stage] += elapsed
+        failed.extend(errors)
+        processed += len(results)
+        if not results or args.dry_run:
+            return
+        computed_at = datetime.now(timezone.utc)
+        operations = [UpdateOne({"_id": doc_id},
+                                {"$set": {"arch_index": make_arch_index_record(ai_results, params_record, computed_at)}})
+                      for doc_id, ai_results in results]
+        t_write = time.perf_counter()
+        result = manager.data_collection.bulk_write(operations, ordered=False)
+        timings["write"] += time.perf_counter() - t_write
+        written += result.modified_count
+
+    start = time.perf_counter()
+    max_in_flight = args.workers * 2 # Giới hạn số nhóm đang chờ để không giữ cả collection trong RAM
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                 initargs=(pipeline_params,)) as executor:
+            cursor = manager.data_collection.find({}, {"patient_id": 1, "data": 1, "matrix": 1}).batch_size(args.batch_size)
+            if args.limit:
+                cursor = cursor.limit(args.limit)
+
+            pending = set()
+            chunk = []
+            t_fetch = time.perf_counter()
+            for doc in cursor:
+                chunk.append(doc)
+                if len(chunk) < args.chunk_size:
+                    continue
+                timings["fetch"] += time.perf_counter() - t_fetch
+                pending.add(executor.submit(_analyze_chunk, chunk))
+                chunk = []
+                if len(pending) >= max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future)
+                t_fetch = time.perf_counter()
+            timings["fetch"] += time.perf_counter() - t_fetch
+            if chunk:
+                pending.add(executor.submit(_analyze_chunk, chunk))
+            for future in pending:
+                collect(future)
+    finally:
+        manager.close_connection()
+    elapsed = time.perf_counter() - start
+
+    print(f"\n--- Reanalyze: {params_record} ---")
+    print(f"Đã xử lý {processed} bản ghi trong {elapsed:.2f} s ({processed / elapsed if elapsed else 0:,.0f} bản ghi/s), "
+          f"ghi {written} bản ghi{' (dry run, không ghi)' if args.dry_run else ''}.")
+    if failed:
+        print(f"{len(failed)} bản ghi không giải mã được:")
+        for patient_id, message in failed[:20]:
+            print(f"  - {patient_id}: {message}")
+    print("Thời gian theo bước (tổng trên các worker cho decode/pipeline):")
+    for stage, elapsed_stage in timings.items():
+        per_doc = elapsed_stage / processed * 1e6 if processed else 0.0
+        print(f"  {stage:<12} {elapsed_stage:8.3f} s  ({per_doc:8.1f} µs/bản ghi)")
+    return 0
+
+
+# --- Migrate storage ---
+
+def migrate_storage(args) -> int:
+    manager = MongoDBManager(matrix_dtype=args.dtype)
+    if manager.db_connection.client is None:
+        print("Không thể kết nối tới MongoDB.")
+        return 1
+    try:
+        stats = manager.migrate_matrix_storage(batch_size=args.batch_size, dry_run=args.dry_run)
+    finally:
+        manager.close_connection()
+    return 0 if stats["failed"] == 0 else 2
+
+
+# --- Search keys ---
+
+def index_search(args) -> int:
+    manager = MongoDBManager()
+    if manager.db_connection.client is None:
+        print("Không thể kết nối tới MongoDB.")
+        return 1
+    try:
+        manager.backfill_search_keys(batch_size=args.batch_size)
+    finally:
+        manager.close_connection()
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Lệnh bảo trì dữ liệu SoleMate.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p_reanalyze = subparsers.add_parser("reanalyze", help="Tính lại Arch Index cho toàn bộ dữ liệu bàn chân đã lưu.")
+    p_reanalyze.add_argument("--profile", choices=list(archindex.ANALYSIS_PROFILES),
+                             help="Bộ tham số có sẵn (archindex.ANALYSIS_PROFILES); các tùy chọn dưới đây ghi đè từng tham số.")
+    p_reanalyze.add_argument("--input-max", type=float)
+    p_reanalyze.add_argument("--toes-threshold", type=int)
+    p_reanalyze.add_argument("--rows-to-check", type=int)
+    p_reanalyze.add_argument("--start-row", type=int)
+    p_reanalyze.add_argument("--end-row", type=int)
+    p_reanalyze.add_argument("--connectivity-threshold", type=int)
+    p_reanalyze.add_argument("--midfoot-offset", type=int, help="Số pixel trừ vào diện tích vùng giữa.")
+    p_reanalyze.add_argument("--segmentation", choices=archindex.SEGMENTATIONS,
+                             help="Cách tách hai bàn chân (halves: chia đôi theo cột như trước).")
+    p_reanalyze.add_argument("--analysis-shape", type=int, nargs=2, metavar=("ROWS", "COLS"),
+                             help="Lưới phân tích; ma trận có lưới khác được resample về lưới này (mặc định 60 60).")
+    p_reanalyze.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Số process xử lý song song.")
+    p_reanalyze.add_argument("--batch-size", type=int, default=500, help="batch_size của cursor MongoDB.")
+    p_reanalyze.add_argument("--chunk-size", type=int, default=256, help="Số bản ghi gửi cho mỗi worker một lần.")
+    p_reanalyze.add_argument("--limit", type=int, default=0, help="Chỉ xử lý N bản ghi đầu (0 = tất cả).")
+    p_reanalyze.add_argument("--dry-run", action="store_true", help="Chỉ tính, không ghi kết quả vào database.")
+    p_reanalyze.set_defaults(func=reanalyze)
+
+    p_migrate = subparsers.add_parser("migrate-storage", help="Chuyển ma trận dạng dict-of-lists sang dạng nhị phân.")
+    p_migrate.add_argument("--dtype", choices=["auto", "uint16", "float32", "float64"], default="auto",
+                           help="dtype lưu trữ (auto: uint16 nếu dữ liệu là số nguyên, ngược lại float32).")
+    p_migrate.add_argument("--batch-size", type=int, default=500)
+    p_migrate.add_argument("--dry-run", action="store_true", help="Chỉ báo cáo dung lượng tiết kiệm, không ghi.")
+    p_migrate.set_defaults(func=migrate_storage)
+
+    p_search = subparsers.add_parser("index-search", help="Tạo khóa tìm kiếm (tên bỏ dấu, SĐT) cho bệnh nhân lưu trước đây.")
+    p_search.add_argument("--batch-size", type=int, default=500)
+    p_search.set_defaults(func=index_search)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# --- END OF FILE maintenance.py ---